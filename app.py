@@ -1,7 +1,7 @@
 from flask import Flask, render_template, session, redirect, url_for, flash, request
 from flask_login import LoginManager, current_user, logout_user
 from config import Config
-from dao.dao import SupabaseDAO
+from dao.dao import get_dao
 
 from utils.advanced_logger import logger, setup_request_logging, log_startup_info
 from utils.session_manager import get_session_manager
@@ -10,8 +10,9 @@ from utils.session_manager import get_session_manager
 from controllers.auth_controller import auth_bp
 from controllers.chat_controller import chat_bp
 from controllers.admin_controller import admin_bp
-from controllers.project_controller import project_bp
+from controllers.project_controller import project_bp, pool_ideias
 from controllers.orientador_controller import orientador_bp
+from controllers.job_controller import job_bp
 
 # Inicializa aplicação
 app = Flask(__name__)
@@ -29,7 +30,7 @@ login_manager.login_message = 'Por favor, faça login para acessar esta página.
 login_manager.login_message_category = 'info'
 
 # DAO para carregar usuários
-dao = SupabaseDAO()
+dao = get_dao()
 
 @login_manager.user_loader
 def load_user(user_id):
@@ -64,6 +65,12 @@ logger.debug("✅ project_bp registrado em /projetos")
 app.register_blueprint(orientador_bp, url_prefix='/orientador')
 logger.debug("✅ orientador_bp registrado em /orientador")
 
+app.register_blueprint(job_bp, url_prefix='/jobs')
+logger.debug("✅ job_bp registrado em /jobs")
+
+# Estoque de ideias: agendador em segundo plano desde o startup (um ciclo por vez entre os workers)
+pool_ideias.iniciar_agendador()
+
 @app.before_request
 def check_session_validity():
     """Verifica validade da sessão antes de cada request"""
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Carrega variáveis de ambiente do arquivo .env
@@ -14,6 +15,13 @@ class Config:
     # Supabase
     SUPABASE_URL = os.getenv('SUPABASE_URL')
     SUPABASE_KEY = os.getenv('SUPABASE_KEY')  
+    SUPABASE_POOL_SIZE = int(os.getenv('SUPABASE_POOL_SIZE', '20'))            # Conexões HTTP simultâneas
+    SUPABASE_POOL_KEEPALIVE = int(os.getenv('SUPABASE_POOL_KEEPALIVE', '10'))  # Conexões ociosas mantidas abertas
+    SUPABASE_KEEPALIVE_EXPIRY = 30.0     # Segundos até fechar uma conexão ociosa
+    SUPABASE_TIMEOUT = float(os.getenv('SUPABASE_TIMEOUT', '15'))
+    SUPABASE_CONNECT_TIMEOUT = 5.0
+    SUPABASE_PAGINA = 1000               # Linhas por resposta do PostgREST (max-rows padrão); consultas grandes paginam com .range()
+    SUPABASE_LOTE_IN = 200               # Ids por filtro .in_() (cada lote vira uma consulta; limita o tamanho da URL)
  
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')  
     
@@ -24,6 +32,112 @@ class Config:
     
     # Contexto da IA
     CONTEXT_FILES_PATH = 'context_files'
+    BRAGANTEC_TOP_K = 6                  # Resumos da Bragantec enviados por mensagem no Modo Bragantec
+    BRAGANTEC_TOP_K_IDEIAS = 24          # Resumos enviados no "Gerar ideias" (precisa de mais variedade)
+    BRAGANTEC_MAX_CHARS_RESUMO = 2500    # Corta resumos muito longos
+    
+    CONTEXTO_PROJETOS_MAX = 5000         # Usuários com o contexto de projetos guardado por worker (sai o usado há mais tempo)
+    CONTEXTO_VERSOES_DB_PATH = os.getenv('CONTEXTO_VERSOES_DB_PATH', os.path.join(tempfile.gettempdir(), 'apbia_contexto.sqlite3'))  # Versões compartilhadas entre os workers
+    
+    # Histórico do chat enviado à IA
+    HISTORICO_MAX_TOKENS = 12000         # Orçamento por turno (resumo + mensagens recentes)
+    HISTORICO_MAX_TOKENS_MENSAGEM = 4000 # Mensagens maiores que isso vão cortadas
+    HISTORICO_MIN_MENSAGENS = 2          # Últimas mensagens que sempre vão (mesmo estourando o orçamento)
+    HISTORICO_MAX_MENSAGENS = 40         # Mensagens ainda não resumidas lidas por turno
+    HISTORICO_RESUMO_LOTE = 20           # Mensagens incorporadas ao resumo por compactação
+    HISTORICO_COMPACTAR_PARA = 0.5       # Fração do orçamento que a janela ocupa logo após compactar
+    HISTORICO_RESUMO_MAX_TOKENS = 1200   # Tamanho máximo do resumo acumulado
+    
+    # Estoque de ideias do "Gerar ideias" (gerado em segundo plano, compartilhado entre workers)
+    IDEIAS_POOL_DB_PATH = os.getenv('IDEIAS_POOL_DB_PATH', os.path.join(tempfile.gettempdir(), 'apbia_ideias.sqlite3'))
+    IDEIAS_POR_GERACAO = 3               # Ideias por categoria em cada chamada à IA
+    IDEIAS_POOL_MINIMO = 2               # Abaixo disso (em qualquer categoria) gera mais
+    IDEIAS_POOL_VALIDADE = 7 * 86400     # Ideias não servidas mais velhas que isso são descartadas
+    IDEIAS_POOL_HISTORICO = 180 * 86400  # Por quanto tempo lembrar das ideias servidas (para não repetir)
+    IDEIAS_POOL_INTERVALO = 600          # Segundos entre verificações do estoque
+    IDEIAS_POOL_LEASE = 300              # Segundos máximos de uma geração (trava entre workers)
+    IDEIAS_TENTATIVAS_JOB = 5            # Lotes no máximo por pedido com o estoque vazio (cada lote atende IDEIAS_POR_GERACAO alunos)
+    
+    # Autocompletar: um pedido pequeno por campo, em paralelo (cada campo chega ao formulário ao ficar pronto)
+    AUTOCOMPLETAR_PARALELO = os.getenv('AUTOCOMPLETAR_PARALELO', 'true').lower() == 'true'
+    AUTOCOMPLETAR_WORKERS = int(os.getenv('AUTOCOMPLETAR_WORKERS', '8'))
+    AUTOCOMPLETAR_THINKING_BUDGET = 1024  # Thinking de cada campo (o pedido único usa o padrão do chat)
+    
+    # Arquivos do chat já enviados ao Gemini (reaproveitados pelo hash do conteúdo)
+    GEMINI_ARQUIVO_MARGEM = 600          # Segundos antes de expirar em que o upload já é considerado vencido
+    CHAT_MAX_ANEXOS = 3                  # Arquivos mais recentes do chat anexados a cada mensagem
+    
+    # Uploads para o Gemini (pool limitado + consulta do processamento com backoff exponencial)
+    GEMINI_UPLOAD_CONCORRENTES = int(os.getenv('GEMINI_UPLOAD_CONCORRENTES', '4'))
+    GEMINI_UPLOAD_POLL_INICIAL = 0.25    # Primeira consulta de um arquivo em PROCESSING (segundos)
+    GEMINI_UPLOAD_POLL_MAX = 2           # Intervalo máximo entre consultas (dobra a cada uma até aqui)
+    GEMINI_UPLOAD_TIMEOUT = 600          # Desiste de arquivos que não ficam prontos nesse tempo
+    
+    # Cache explícito de contexto do Gemini (system prompt)
+    GEMINI_CONTEXT_CACHE = os.getenv('GEMINI_CONTEXT_CACHE', 'true').lower() == 'true'
+    GEMINI_CACHE_TTL = 3600              # Segundos de vida de cada cached-content
+    GEMINI_CACHE_REFRESH_MARGIN = 300    # Renova o TTL quando faltar menos que isso
+    GEMINI_CACHE_RETRY_AFTER = 600       # Após falha ao criar, espera antes de tentar de novo
+    
+    # Fila de jobs da IA (chamadas lentas rodam fora das threads do servidor web)
+    AI_JOB_WORKERS = int(os.getenv('AI_JOB_WORKERS', '8'))
+    AI_JOB_TTL = 600                     # Segundos que um job finalizado fica disponível para consulta
+    AI_JOB_ABANDONADO = 3600             # Jobs sem atualização há mais que isso (worker morreu) são apagados
+    AI_JOB_DB_PATH = os.getenv('AI_JOB_DB_PATH', os.path.join(tempfile.gettempdir(), 'apbia_jobs.sqlite3'))  # Compartilhado entre os workers
+    
+    # Cotas da IA (RPM/TPM/RPD) compartilhadas entre os workers do gunicorn
+    QUOTA_BACKEND = os.getenv('QUOTA_BACKEND', 'sqlite')     # sqlite | memory
+    QUOTA_DB_PATH = os.getenv('QUOTA_DB_PATH', os.path.join(tempfile.gettempdir(), 'apbia_quota.sqlite3'))
+    QUOTA_SQLITE_TIMEOUT = 10.0          # Segundos esperando o lock do SQLite
+    
+    # Fila justa na frente da API (limites da GEMINI_API_KEY, somando todos os usuários)
+    GEMINI_GLOBAL_RPM = int(os.getenv('GEMINI_GLOBAL_RPM', '10'))
+    GEMINI_GLOBAL_TPM = int(os.getenv('GEMINI_GLOBAL_TPM', '250000'))
+    GEMINI_FILA_MAX_ESPERA = 90          # Segundos máximos esperando vaga antes de devolver erro
+    GEMINI_FILA_INTERVALO = 0.5          # Segundos entre tentativas quando a API key está no limite
+    GEMINI_FILA_CANDIDATOS = 4           # Pedidos tentados por rodada (o da vez + menores que ele) quando o da vez não cabe no TPM
+    GEMINI_FILA_MAX_PULOS = 8            # Vezes que o pedido da vez pode ser passado para trás antes de só ele ser tentado
+
+    # Resiliência das chamadas ao Gemini (repetição de erros passageiros, circuit breaker e hedge)
+    GEMINI_RETRY_TENTATIVAS = 3          # Tentativas por chamada (a primeira + repetições)
+    GEMINI_RETRY_BASE = 1.0              # Backoff: até base * 2^tentativa segundos, sorteado (jitter)
+    GEMINI_RETRY_ESPERA_MAX = 8          # Teto de cada espera do backoff
+    GEMINI_RETRY_ORCAMENTO = 30          # Segundos máximos gastos repetindo (retry-after maior que isso desiste)
+    GEMINI_CIRCUITO_FALHAS = 5           # Falhas passageiras seguidas que abrem o circuito
+    GEMINI_CIRCUITO_ABERTO = 30          # Segundos com o circuito aberto antes da sonda
+    GEMINI_HEDGE_APOS = 8                # Segundos antes do hedge enquanto não há latências medidas
+    GEMINI_HEDGE_WORKERS = int(os.getenv('GEMINI_HEDGE_WORKERS', '16'))
+    
+    # Pedidos idênticos ao Gemini (coalescidos enquanto em andamento; cache curto para endpoints determinísticos)
+    GEMINI_RESULTADO_TTL = 60            # Segundos que o resultado de um endpoint determinístico fica em cache
+    GEMINI_RESULTADO_CACHE_MAX = 256     # Resultados guardados no máximo (LRU)
+
+    # Degradação gradual do chat conforme a pressão no RPM/TPM global (fração do limite)
+    DEGRADACAO_LIMIARES = (0.6, 0.75, 0.85, 0.95)  # sem Bragantec, sem ferramentas, thinking reduzido, histórico curto
+    DEGRADACAO_HISTERESE = 0.1           # Só volta um nível quando a pressão cai essa fração abaixo do limiar
+    DEGRADACAO_INTERVALO = 1.0           # Segundos entre medições da pressão
+    DEGRADACAO_THINKING_MAX = 2048       # Teto de thinking no nível 3+
+    DEGRADACAO_SAIDA_MAX = 8192          # Teto de saída no nível 3+
+    DEGRADACAO_HISTORICO_FRACAO = 0.4    # Fração do HISTORICO_MAX_TOKENS no nível 4
+
+    # Cache de respostas das perguntas frequentes (similaridade TF-IDF, compartilhado entre workers)
+    RESPOSTAS_CACHE = os.getenv('RESPOSTAS_CACHE', 'true').lower() == 'true'
+    RESPOSTAS_CACHE_DB_PATH = os.getenv('RESPOSTAS_CACHE_DB_PATH', os.path.join(tempfile.gettempdir(), 'apbia_respostas.sqlite3'))
+    RESPOSTAS_CACHE_TTL = 12 * 3600          # Segundos até uma resposta não fixada vencer
+    RESPOSTAS_CACHE_SIMILARIDADE = 0.8       # Cosseno mínimo para responder do cache
+    RESPOSTAS_CACHE_SIMILARIDADE_FIXADA = 0.7  # Cosseno mínimo para as respostas fixadas pelo admin
+    RESPOSTAS_CACHE_MAX_PALAVRAS = 40        # Perguntas maiores são específicas demais para reaproveitar
+    RESPOSTAS_CACHE_MAX = 500                # Respostas não fixadas por escopo (tipo de usuário + modo)
+
+    # Classificador local de pedidos (thinking, ferramentas e teto de saída por mensagem do chat)
+    CLASSIFICADOR_PEDIDOS = os.getenv('CLASSIFICADOR_PEDIDOS', 'true').lower() == 'true'
+
+    # Estimador local de tokens (contador da interface e reserva do TPM)
+    TOKEN_ESTIMATOR_ALPHA = 0.1          # Peso de cada chamada na calibração do estimador local de tokens
+    
+    # Sessão
+    SESSION_CACHE_TTL = 30                   # Segundos que uma validação de sessão fica em cache
+    SESSION_ACTIVITY_FLUSH_INTERVAL = 60     # Intervalo de gravação do last_activity no banco
     
     # Sistema
     IA_STATUS = True  # IA ativa por padrão
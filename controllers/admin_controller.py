@@ -1,9 +1,10 @@
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, Response
 from flask_login import login_required, current_user
 from functools import wraps
-from dao.dao import SupabaseDAO
+from dao.dao import get_dao
 from config import Config
 from services.gemini_stats import gemini_stats  
+from services.answer_cache import get_answer_cache
 from utils.advanced_logger import logger
 from utils.decorators import admin_required
 from utils.helpers import validate_bp, format_bp
@@ -17,7 +18,7 @@ admin_bp = Blueprint('admin', __name__, url_prefix='/admin') # Blueprint para ro
 #o __name__ é usado para o flask indenntificar de onde é o blueprint, por exemplo, o nome desse blueprint sera "controllers.admin_controller"
 # porem o nome em si é diferente do __name__,
 # o nome dessa blueprint é "admin"
-dao = SupabaseDAO()
+dao = get_dao()
 
 
 @admin_bp.route('/dashboard')
@@ -565,7 +566,8 @@ def test_gemini():
             tipo_usuario='participante',
             usar_contexto_bragantec=False,
             usar_pesquisa=False,
-            usar_code_execution=False
+            usar_code_execution=False,
+            cache_ttl=Config.GEMINI_RESULTADO_TTL  # Vários admins testando seguidos: uma chamada só
         )
         
         if response.get('error'):
@@ -630,6 +632,9 @@ def gemini_stats_api():
     """
     try:
         from services.gemini_stats import gemini_stats
+        from services.gemini_resilience import resiliencia
+        from services.degradation import degradacao
+        from services.single_flight import coalescedor
         
         logger.info("📊 Buscando estatísticas do Gemini...")
         
@@ -695,7 +700,17 @@ def gemini_stats_api():
                 'requests_24h': global_stats.get('requests_24h', 0),
                 'tokens_24h': global_stats.get('tokens_24h', 0),
             },
-            'limits': limits_info
+            'limits': limits_info,
+            # Retries, circuit breaker e hedge (contadores por resultado)
+            'resiliencia': resiliencia.get_stats(),
+            # Pedidos idênticos atendidos por uma chamada só (em andamento ou cache curto)
+            'coalescencia': coalescedor.get_stats(),
+            # Perguntas frequentes respondidas do cache (taxa de acerto)
+            'respostas_frequentes': get_answer_cache().get_stats(),
+            # Classificador de pedidos: uso e economia por classe
+            'perfis': gemini_stats.get_perfis_stats(),
+            # Nível de degradação pela pressão na cota
+            'degradacao': degradacao.get_stats()
         })
         
     except Exception as e:
@@ -807,11 +822,7 @@ def remover_participante_projeto():
             }), 400
         
         # Remove
-        dao.supabase.table('participantes_projetos')\
-            .delete()\
-            .eq('projeto_id', projeto_id)\
-            .eq('participante_id', participante_id)\
-            .execute()
+        dao.remover_participante_projeto(participante_id, projeto_id)
         
         logger.info(f"🗑️ Participante {participante_id} removido do projeto {projeto_id}")
         
@@ -825,4 +836,121 @@ def remover_participante_projeto():
         return jsonify({
             'error': True,
             'message': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+# ===== Perguntas frequentes (cache de respostas por similaridade) =====
+
+@admin_bp.route('/respostas-frequentes')
+@admin_required
+def respostas_frequentes():
+    """
+    Página de curadoria do cache de perguntas frequentes
+    """
+    try:
+        cache = get_answer_cache()
+        return render_template('admin/respostas_frequentes.html',
+                             entradas=cache.listar(),
+                             stats=cache.get_stats())
+        
+    except Exception as e:
+        logger.error(f"Erro ao carregar perguntas frequentes: {e}")
+        flash('Erro ao carregar dados', 'error')
+        return redirect(url_for('admin.dashboard'))
+
+
+@admin_bp.route('/respostas-frequentes/criar', methods=['POST'])
+@admin_required
+def criar_resposta_frequente():
+    """
+    Cria (ou substitui) uma resposta fixada para uma pergunta
+    """
+    try:
+        data = request.json or {}
+        pergunta = (data.get('pergunta') or '').strip()
+        resposta = (data.get('resposta') or '').strip()
+        tipo_usuario = data.get('tipo_usuario')
+        
+        if not pergunta or not resposta or tipo_usuario not in ('participante', 'orientador', 'administrador'):
+            return jsonify({
+                'error': True,
+                'message': 'Pergunta, resposta e tipo de usuário são obrigatórios'
+            }), 400
+        
+        get_answer_cache().criar_fixada(pergunta, resposta, tipo_usuario, bool(data.get('bragantec')))
+        
+        logger.info(f"📌 Resposta frequente fixada: \"{pergunta[:60]}\" ({tipo_usuario})")
+        
+        return jsonify({
+            'success': True,
+            'message': 'Resposta fixada!'
+        })
+        
+    except ValueError as e:
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Erro ao criar resposta frequente: {e}")
+        return jsonify({
+            'error': True,
+            'message': f'Erro: {str(e)}'
+        }), 500
+
+
+@admin_bp.route('/respostas-frequentes/<int:entrada_id>/fixar', methods=['POST'])
+@admin_required
+def fixar_resposta_frequente(entrada_id):
+    """
+    Fixa (não vence) ou desafixa uma resposta guardada
+    """
+    try:
+        fixada = bool((request.json or {}).get('fixada', True))
+        
+        if not get_answer_cache().fixar(entrada_id, fixada):
+            return jsonify({
+                'error': True,
+                'message': 'Resposta não encontrada'
+            }), 404
+        
+        logger.info(f"📌 Resposta frequente {entrada_id} {'fixada' if fixada else 'desafixada'}")
+        
+        return jsonify({
+            'success': True,
+            'message': 'Resposta fixada!' if fixada else 'Resposta desafixada!'
+        })
+        
+    except Exception as e:
+        logger.error(f"Erro ao fixar resposta frequente: {e}")
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 500
+
+
+@admin_bp.route('/respostas-frequentes/<int:entrada_id>', methods=['DELETE'])
+@admin_required
+def remover_resposta_frequente(entrada_id):
+    """
+    Remove uma resposta do cache (ex.: resposta errada ou desatualizada)
+    """
+    try:
+        if not get_answer_cache().remover(entrada_id):
+            return jsonify({
+                'error': True,
+                'message': 'Resposta não encontrada'
+            }), 404
+        
+        logger.info(f"🗑️ Resposta frequente {entrada_id} removida")
+        
+        return jsonify({
+            'success': True,
+            'message': 'Resposta removida!'
+        })
+        
+    except Exception as e:
+        logger.error(f"Erro ao remover resposta frequente: {e}")
+        return jsonify({
+            'error': True,
+            'message': str(e)
+        }), 500
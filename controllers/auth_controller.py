@@ -1,6 +1,6 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, make_response
 from flask_login import login_user, logout_user, login_required, current_user
-from dao.dao import SupabaseDAO
+from dao.dao import get_dao
 from utils.session_manager import get_session_manager
 from utils.advanced_logger import logger
 from utils.helpers import validate_bp, format_bp
@@ -10,7 +10,7 @@ auth_bp = Blueprint('auth', __name__)
 # sem prefixo, rotas como /login, /logout, etc.
 # o __name__ desse blueprint sera "controllers.auth_controller"
 #o nome sera "auth"
-dao = SupabaseDAO()
+dao = get_dao()
 
 @auth_bp.route('/login', methods=['GET', 'POST']) # rota de login, aceita GET (retorna dados, como html) e POST (envia dados, como form)
 def login():
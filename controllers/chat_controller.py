@@ -1,24 +1,37 @@
-from flask import Blueprint, render_template, request, jsonify, session, send_file
+from flask import Blueprint, render_template, request, jsonify, session, send_file, Response, stream_with_context
 from flask_login import login_required, current_user
-from dao.dao import SupabaseDAO
+from dao.dao import get_dao
 from services.gemini_service import GeminiService
 from config import Config
-from werkzeug.utils import secure_filename
 import os
-import uuid
+import re
+import json
 import mimetypes
 from datetime import datetime
+from threading import Lock
+from collections import OrderedDict
 from utils.rate_limiter import rate_limiter
+from services.job_queue import job_queue
+from services.history_manager import HistoryManager
+from services.file_registry import FileRegistry, expiracao_iso
+from services.gemini_resilience import resiliencia
+from services.request_classifier import classificar_pedido
+from services.degradation import degradacao
+from services.answer_cache import get_answer_cache
+from services.bragantec_retriever import STOPWORDS, normalizar_texto
 from utils.advanced_logger import logger
-from utils.helpers import generate_chat_title, detect_mime_type, save_uploaded_file, get_file_extension
+from utils.helpers import generate_chat_title, save_uploaded_file, get_file_extension
 
 chat_bp = Blueprint('chat', __name__)
 # sem prefixo, rotas como /chat/, /chat/send, etc.
 # o __name__ desse blueprint sera "controllers.chat_controller"
 # o nome sera "chat"
 
-dao = SupabaseDAO()
+dao = get_dao()
 gemini = GeminiService()
+historico = HistoryManager(dao, gemini)
+arquivos_gemini = FileRegistry(gemini, dao)
+respostas_frequentes = get_answer_cache()
 
 # Diretório para arquivos permanentes
 CHAT_FILES_DIR = os.path.join(Config.UPLOAD_FOLDER, 'chat_files')
@@ -42,16 +55,353 @@ def index():
                          ia_offline=False)
 
 
+def _tipo_usuario_atual():
+    """Tipo de usuário usado no prompt da IA"""
+    if current_user.is_participante():
+        return 'participante'
+    elif current_user.is_orientador():
+        return 'orientador'
+    elif current_user.is_admin(): 
+        return 'administrador'
+    return None
+
+
+# Contexto de projetos já montado, por usuário: user_id -> (versao_contexto, texto), do menos ao mais usado
+# Invalida quando o DAO registra escrita nos projetos/orientações do usuário (versão compartilhada
+# entre os workers, ver dao/context_versions.py); guarda no máximo CONTEXTO_PROJETOS_MAX usuários
+_contexto_cache = OrderedDict()
+_contexto_cache_lock = Lock()
+
+
+def _montar_contexto_projetos():
+    """Contexto com os projetos (ou orientados) do usuário atual, usando o cache quando válido"""
+    versao = dao.versao_contexto(current_user.id)
+
+    with _contexto_cache_lock:
+        entry = _contexto_cache.get(current_user.id)
+        if entry and versao is not None and entry[0] == versao:
+            _contexto_cache.move_to_end(current_user.id)
+            logger.debug(f"💾 Contexto de projetos do cache - User {current_user.id}")
+            return entry[1]
+
+    contexto_projetos = _gerar_contexto_projetos()
+
+    if versao is not None:
+        with _contexto_cache_lock:
+            _contexto_cache[current_user.id] = (versao, contexto_projetos)
+            _contexto_cache.move_to_end(current_user.id)
+            while len(_contexto_cache) > Config.CONTEXTO_PROJETOS_MAX:
+                _contexto_cache.popitem(last=False)
+
+    return contexto_projetos
+
+
+def _gerar_contexto_projetos():
+    """Monta o contexto com os projetos (ou orientados) do usuário atual a partir do banco"""
+    projetos = dao.listar_projetos_por_usuario(current_user.id)
+    contexto_projetos = ""
+
+    if projetos:
+        contexto_projetos = "\n\n=== SEUS PROJETOS ===\n"
+        for projeto in projetos:
+            contexto_projetos += f"""
+            Projeto: {projeto.nome}
+            Categoria: {projeto.categoria}
+            Status: {projeto.status}
+            Resumo: {projeto.resumo or 'Não informado'}
+            ---
+            """
+
+    elif current_user.is_orientador():
+        # Busca orientados (sem os chats, que não entram no prompt)
+        orientados = dao.listar_orientados_por_orientador(current_user.id, incluir_chats=False)
+        
+        if orientados:
+            contexto_projetos = "\n\n=== SEUS ORIENTADOS ===\n"
+            for orientado in orientados:
+                contexto_projetos += f"""
+                Orientado: {orientado.get('nome_completo')}
+                Email: {orientado.get('email')}
+                BP: {orientado.get('numero_inscricao', 'Não informado')}
+                """
+
+        projetos_orientador = dao.listar_projetos_por_orientador(current_user.id)
+
+        if projetos_orientador:
+            # Participantes de todos os projetos numa busca só
+            participantes_por_projeto = dao.listar_participantes_por_projetos([p.id for p in projetos_orientador])
+            
+            contexto_projetos += "\n\n=== PROJETOS QUE VOCÊ ESTÁ ORIENTANDO ===\n"
+            for projeto in projetos_orientador:
+                participantes = participantes_por_projeto.get(projeto.id, [])
+                participantes_nomes = [p.nome_completo for p in participantes]
+                
+                contexto_projetos += f"""
+                Projeto: {projeto.nome}
+                Categoria: {projeto.categoria}
+                Status: {projeto.status}
+                Participantes: {', '.join(participantes_nomes) if participantes_nomes else 'Nenhum'}
+                Resumo: {projeto.resumo or 'Não informado'}
+                ---
+"""
+
+    return contexto_projetos
+
+
+def _preparar_envio(data):
+    """
+    Lê o corpo de /send e /send-stream, cria o chat se preciso e monta
+    os argumentos de gemini.chat / gemini.chat_stream, já ajustados ao nível de degradação.
+    Retorna (chat_id, message, gemini_kwargs, precisa_compactar, nivel_degradacao)
+    """
+    message = data.get('message', '')
+    chat_id = data.get('chat_id')
+
+    # Cria chat se não existir
+    if not chat_id:
+        tipo_ia_id = 2 if current_user.is_participante() else \
+                    3 if current_user.is_orientador() else 1
+
+        titulo = generate_chat_title(message)
+
+        chat = dao.criar_chat(current_user.id, tipo_ia_id, titulo)
+        chat_id = chat.id
+
+    contexto_projetos = _montar_contexto_projetos()
+
+    # Cota global perto do limite: pedidos mais leves (ver services/degradation.py)
+    nivel = degradacao.nivel()
+
+    # Carrega histórico (resumo das antigas + recentes dentro do orçamento de tokens)
+    history, precisa_compactar = historico.montar(chat_id, orcamento=degradacao.orcamento_historico(nivel))
+    if degradacao.orcamento_historico(nivel):
+        # Janela encurtada pela pressão: o resumo (outra chamada à IA) fica para depois
+        precisa_compactar = False
+
+    # Mensagem com contexto
+    message_com_contexto = f"{contexto_projetos}\n\n{message}"
+    
+    apelido = current_user.apelido if hasattr(current_user, 'apelido') else None
+
+    usar_pesquisa = data.get('usar_pesquisa', True)
+    usar_code_execution = data.get('usar_code_execution', True)
+
+    # Thinking, ferramentas e teto de saída conforme a mensagem (os toggles do usuário são o limite)
+    perfil = classificar_pedido(message, bool(history), usar_pesquisa, usar_code_execution)
+    if perfil:
+        usar_pesquisa = perfil['pesquisa']
+        usar_code_execution = perfil['codigo']
+
+    gemini_kwargs = dict(
+        tipo_usuario=_tipo_usuario_atual(),
+        history=history,
+        usar_pesquisa=usar_pesquisa,
+        usar_code_execution=usar_code_execution,
+        analyze_url=data.get('url'),
+        usar_contexto_bragantec=data.get('usar_contexto_bragantec', False),
+        user_id=current_user.id,
+        apelido=apelido,
+        perfil=perfil
+    )
+    degradacao.aplicar(gemini_kwargs, nivel)
+
+    return chat_id, message_com_contexto, gemini_kwargs, precisa_compactar, nivel
+
+
+def _compactar_historico_job(job, chat_id, user_id):
+    """Roda no pool de jobs: incorpora ao resumo do chat as mensagens que saíram da janela"""
+    return {'success': historico.compactar(chat_id, user_id=user_id)}, 200
+
+
+def _agendar_compactacao(chat_id, user_id):
+    job_queue.submit(user_id, 'resumo', _compactar_historico_job, chat_id, user_id)
+
+
+def _salvar_conversa(chat_id, message, response, gemini_kwargs):
+    """Salva a mensagem do usuário, a resposta da IA e as ferramentas usadas"""
+    # Salva mensagem do usuário
+    dao.criar_mensagem(chat_id, 'user', message)
+
+    # Salva resposta da IA
+    msg_assistant_id = dao.criar_mensagem(
+        chat_id,
+        'model',
+        response['response'],
+        thinking_process=response.get('thinking_process')
+    )
+
+    # Salva informações sobre ferramentas usadas
+    if msg_assistant_id:
+        ferramentas_usadas = {
+            'google_search': response.get('search_used', False),
+            'contexto_bragantec': gemini_kwargs['usar_contexto_bragantec'],
+            'code_execution': response.get('code_executed', False),
+            'url_context': bool(gemini_kwargs['analyze_url'])
+        }
+        
+        dao.salvar_ferramenta_usada(msg_assistant_id['id'], ferramentas_usadas)
+
+
+def _log_tokens(response):
+    """Log de consumo de tokens de uma resposta"""
+    tokens_input = response.get('tokens_input', 0)
+    tokens_output = response.get('tokens_output', 0)
+
+    if tokens_input or tokens_output:
+        logger.info(f"📊 Tokens - Input: {tokens_input:,} | Output: {tokens_output:,}")
+        
+        if tokens_input > 100000:
+            logger.warning(f"⚠️ ALTO CONSUMO DE INPUT: {tokens_input:,} tokens!")
+
+    return tokens_input, tokens_output
+
+
+def _termos_privados():
+    """
+    Apelido, nomes e projetos do usuário atual (e dos orientados): respostas que citam
+    algum deles não vão para o cache de perguntas frequentes
+    """
+    termos = [getattr(current_user, 'apelido', None)] + (current_user.nome_completo or '').split()
+    for linha in re.findall(r"(?:Projeto|Orientado|Participantes|Email): (.+)", _montar_contexto_projetos()):
+        termos += linha.split(',') if ',' in linha else [linha]
+    termos = [t.strip() for t in termos if t and t.strip()]
+    return [t for t in termos if len(t) >= 3 and normalizar_texto(t) not in STOPWORDS]
+
+
+def _resposta_frequente(chat_id, data, gemini_kwargs):
+    """Resposta do cache de perguntas frequentes para a mensagem (ou None)"""
+    history = gemini_kwargs['history']
+    if gemini_kwargs['analyze_url'] or (history and dao.listar_arquivos_por_chat(chat_id)):
+        return None
+    # Modo pedido pelo usuário (mesmo se a degradação o pausou: a resposta guardada não gasta cota)
+    return respostas_frequentes.buscar(
+        data['message'], gemini_kwargs['tipo_usuario'],
+        data.get('usar_contexto_bragantec', False), tem_historico=bool(history)
+    )
+
+
+def _guardar_resposta_frequente(message, response, gemini_kwargs, termos_privados, tem_arquivos=False):
+    """Guarda a resposta se a pergunta for genérica (ver services/answer_cache.py)"""
+    if tem_arquivos or gemini_kwargs['analyze_url']:
+        return
+    try:
+        respostas_frequentes.guardar(
+            message, response, gemini_kwargs['tipo_usuario'], gemini_kwargs['usar_contexto_bragantec'],
+            tem_historico=bool(gemini_kwargs['history']), termos_privados=termos_privados
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ Erro ao guardar resposta frequente: {e}")
+
+
+def _corpo_resposta(chat_id, response):
+    """Corpo de sucesso de /send (resultado do job ou resposta frequente)"""
+    tokens_input = response.get('tokens_input', 0)
+    tokens_output = response.get('tokens_output', 0)
+    return {
+        'success': True,
+        'response': response['response'],
+        'thinking_process': response.get('thinking_process'),
+        'chat_id': chat_id,
+        'search_used': response.get('search_used', False),
+        'code_executed': response.get('code_executed', False),
+        'code_results': response.get('code_results'),
+        'tokens_input': tokens_input,
+        'tokens_output': tokens_output,
+        'total_tokens': tokens_input + tokens_output,
+        'do_cache': response.get('do_cache', False)
+    }
+
+
+def _executar_chat(job, chat_id, message, message_com_contexto, gemini_kwargs, precisa_compactar=False,
+                   termos_privados=()):
+    """
+    Roda no pool de jobs: junta os arquivos do chat e gera a resposta
+    Arquivos expirados no Gemini são reenviados sem prender a thread; o job continua quando terminarem
+    """
+    argumentos = (chat_id, message, message_com_contexto, gemini_kwargs, precisa_compactar, termos_privados)
+
+    arquivos, reenviando = arquivos_gemini.anexos(
+        chat_id,
+        on_pronto=lambda arquivos: job_queue.continuar(job, _responder_chat, arquivos, *argumentos),
+        on_status=lambda estado: job.emitir('arquivo', {'estado': estado})
+    )
+    if arquivos is None:
+        job.emitir('arquivo', {'estado': 'reenviando', 'nomes': reenviando})
+        return None
+
+    return _responder_chat(job, arquivos, *argumentos)
+
+
+def _responder_chat(job, arquivos, chat_id, message, message_com_contexto, gemini_kwargs, precisa_compactar=False,
+                    termos_privados=()):
+    """Gera a resposta em streaming, publica os trechos como eventos do job e salva a conversa no fim"""
+    response = None
+
+    for evento in gemini.chat_stream(message_com_contexto, on_fila=job.on_fila, arquivos=arquivos, **gemini_kwargs):
+        if evento['type'] == 'done':
+            response = evento['data']
+        elif evento['type'] == 'error':
+            return {'error': True, 'message': evento['data'], 'degradado': resiliencia.aberto()}, 500
+        else:
+            job.emitir(evento['type'], evento['data'])
+
+    if response is None:
+        return {'error': True, 'message': 'A IA não retornou resposta'}, 500
+
+    # Log de tokens
+    _log_tokens(response)
+
+    _salvar_conversa(chat_id, message, response, gemini_kwargs)
+    _guardar_resposta_frequente(message, response, gemini_kwargs, termos_privados, tem_arquivos=bool(arquivos))
+
+    if precisa_compactar:
+        _agendar_compactacao(chat_id, gemini_kwargs['user_id'])
+
+    return _corpo_resposta(chat_id, response), 200
+
+
+def _recusar_se_degradado():
+    """Resposta 503 enquanto o circuito do Gemini estiver aberto (ou None)"""
+    estado = resiliencia.estado_publico()
+    if not estado['degradado']:
+        return None
+    return jsonify({
+        'error': True,
+        'degradado': True,
+        'retry_em': estado['retry_em'],
+        'message': f"⚠️ A IA está instável no momento. Tente novamente em {estado['retry_em']}s."
+    }), 503
+
+
+@chat_bp.route('/status')
+@login_required
+def status_ia():
+    """Situação da IA para a interface: API instável (circuito aberto) e nível de economia pela cota"""
+    return jsonify(dict(
+        resiliencia.estado_publico(),
+        online=Config.IA_STATUS,
+        degradacao=degradacao.estado_publico()
+    ))
+
+
 @chat_bp.route('/send', methods=['POST'])
 @login_required
 def send_message():
-    """Endpoint para enviar mensagens"""
+    """
+    Endpoint para enviar mensagens
+    Devolve um job_id na hora (202); a resposta é acompanhada em /jobs/<job_id>
+    """
     if not Config.IA_STATUS:
         return jsonify({
             'error': True,
             'message': 'IA está temporariamente offline.'
         }), 503
 
+    # API instável (circuito aberto): recusa na hora em vez de enfileirar
+    resposta_degradada = _recusar_se_degradado()
+    if resposta_degradada:
+        return resposta_degradada
+
     # Verifica rate limit
     can_proceed, error_msg = rate_limiter.check_limit(current_user.id)
 
@@ -62,174 +412,133 @@ def send_message():
         }), 429
 
     data = request.json
-    message = data.get('message', '')
-    chat_id = data.get('chat_id')
-    usar_pesquisa = data.get('usar_pesquisa', True)
-    usar_code_execution = data.get('usar_code_execution', True)
-    analyze_url = data.get('url')
-    usar_contexto_bragantec = data.get('usar_contexto_bragantec', False)
 
-    if not message:
+    if not data.get('message', ''):
         return jsonify({'error': True, 'message': 'Mensagem vazia'}), 400
 
     try:
-        tipo_usuario = None
-        # Tipo de usuário
-        if current_user.is_participante():
-            tipo_usuario = 'participante'
-        elif current_user.is_orientador():
-            tipo_usuario = 'orientador'
-        elif current_user.is_admin(): 
-            tipo_usuario = 'administrador'
-
-        # Cria chat se não existir
-        if not chat_id:
-            tipo_ia_id = 2 if current_user.is_participante() else \
-                        3 if current_user.is_orientador() else 1
-
-            titulo = generate_chat_title(message)
-
-            chat = dao.criar_chat(current_user.id, tipo_ia_id, titulo)
-            chat_id = chat.id
-
-        # Contexto de projetos
-        projetos = dao.listar_projetos_por_usuario(current_user.id)
-        contexto_projetos = ""
-
-        if projetos:
-            contexto_projetos = "\n\n=== SEUS PROJETOS ===\n"
-            for projeto in projetos:
-                contexto_projetos += f"""
-                Projeto: {projeto.nome}
-                Categoria: {projeto.categoria}
-                Status: {projeto.status}
-                Resumo: {projeto.resumo or 'Não informado'}
-                ---
-                """
-
-        elif current_user.is_orientador():
-            # Busca orientados
-            orientados = dao.listar_orientados_por_orientador(current_user.id)
-            
-            if orientados:
-                contexto_projetos = "\n\n=== SEUS ORIENTADOS ===\n"
-                for orientado in orientados:
-                    contexto_projetos += f"""
-                    Orientado: {orientado.get('nome_completo')}
-                    Email: {orientado.get('email')}
-                    BP: {orientado.get('numero_inscricao', 'Não informado')}
-                    """
-
-            projetos_orientador = dao.listar_projetos_por_orientador(current_user.id)
-
-            if projetos_orientador:
-                contexto_projetos += "\n\n=== PROJETOS QUE VOCÊ ESTÁ ORIENTANDO ===\n"
-                for projeto in projetos_orientador:
-                    # Busca participantes do projeto
-                    participantes = dao.listar_participantes_por_projeto(projeto.id)
-                    participantes_nomes = [p.nome_completo for p in participantes]
-                    
-                    contexto_projetos += f"""
-                    Projeto: {projeto.nome}
-                    Categoria: {projeto.categoria}
-                    Status: {projeto.status}
-                    Participantes: {', '.join(participantes_nomes) if participantes_nomes else 'Nenhum'}
-                    Resumo: {projeto.resumo or 'Não informado'}
-                    ---
-"""
-        
+        chat_id, message_com_contexto, gemini_kwargs, precisa_compactar, nivel = _preparar_envio(data)
+
+        # Pergunta frequente já respondida: resposta na hora (200, sem job), sem chamar a IA
+        response = _resposta_frequente(chat_id, data, gemini_kwargs)
+        if response:
+            _salvar_conversa(chat_id, data['message'], response, gemini_kwargs)
+            return jsonify(_corpo_resposta(chat_id, response)), 200
+
+        # Chama Gemini COM MODO BRAGANTEC (no pool de jobs)
+        job = job_queue.submit(
+            current_user.id, 'chat', _executar_chat,
+            chat_id, data['message'], message_com_contexto, gemini_kwargs, precisa_compactar, _termos_privados()
+        )
 
-        # Carrega histórico
-        mensagens_db = dao.obter_ultimas_n_mensagens(chat_id, n=20)
-        arquivos_db = dao.listar_arquivos_por_chat(chat_id)
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'chat_id': chat_id,
+            'degradacao': degradacao.estado_publico(nivel)
+        }), 202
 
-        history = []
-        
-        # Monta histórico
-        for msg in mensagens_db:
-            history.append({
-                'role': msg['role'],
-                'parts': [msg['conteudo']]
-            })
+    except Exception as e:
+        import traceback
+        print(f"❌ Erro: {traceback.format_exc()}")
+        return jsonify({
+            'error': True,
+            'message': f'Erro: {str(e)}'
+        }), 500
 
-        # Mensagem com contexto
-        message_com_contexto = f"{contexto_projetos}\n\n{message}"
-        
-        apelido = current_user.apelido if hasattr(current_user, 'apelido') else None
 
-        # Chama Gemini COM MODO BRAGANTEC
-        response = gemini.chat(
-            message_com_contexto,
-            tipo_usuario=tipo_usuario,
-            history=history,
-            usar_pesquisa=usar_pesquisa,
-            usar_code_execution=usar_code_execution,
-            analyze_url=analyze_url,
-            usar_contexto_bragantec=usar_contexto_bragantec,
-            user_id=current_user.id,
-            apelido=apelido
-        )
+def _evento_sse(tipo, dados):
+    """Formata um evento Server-Sent Events"""
+    return f"event: {tipo}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
 
-        # Extrai contagem de tokens
-        tokens_input = response.get('tokens_input', 0)
-        tokens_output = response.get('tokens_output', 0)
 
-        # Log de consumo
-        if tokens_input or tokens_output:
-            logger.info(f"📊 Tokens - Input: {tokens_input:,} | Output: {tokens_output:,}")
-            
-            if tokens_input > 100000:
-                logger.warning(f"⚠️ ALTO CONSUMO DE INPUT: {tokens_input:,} tokens!")
+@chat_bp.route('/send-stream', methods=['POST'])
+@login_required
+def send_message_stream():
+    """
+    Igual ao /send, mas devolve a resposta em Server-Sent Events conforme o Gemini gera
+    (eventos thought, text, code, code_result, aviso e, no fim, done ou error).
+    As mensagens são salvas quando o stream termina.
+    Obs.: mantém a conexão (e a thread do servidor) aberta até o fim; o chat.js usa /send + /jobs
+    """
+    if not Config.IA_STATUS:
+        return jsonify({
+            'error': True,
+            'message': 'IA está temporariamente offline.'
+        }), 503
 
-        if response.get('error'):
-            return jsonify({
-                'error': True,
-                'message': response['response']
-            }), 500
+    # API instável (circuito aberto): recusa na hora em vez de enfileirar
+    resposta_degradada = _recusar_se_degradado()
+    if resposta_degradada:
+        return resposta_degradada
 
-        # Salva mensagem do usuário
-        dao.criar_mensagem(chat_id, 'user', message)
+    # Verifica rate limit
+    can_proceed, error_msg = rate_limiter.check_limit(current_user.id)
 
-        # Salva resposta da IA
-        msg_assistant_id = dao.criar_mensagem(
-            chat_id,
-            'model',
-            response['response'],
-            thinking_process=response.get('thinking_process')
-        )
+    if not can_proceed:
+        return jsonify({
+            'error': True,
+            'message': error_msg
+        }), 429
 
-        # Salva informações sobre ferramentas usadas
-        if msg_assistant_id:
-            ferramentas_usadas = {
-                'google_search': response.get('search_used', False),
-                'contexto_bragantec': usar_contexto_bragantec,
-                'code_execution': response.get('code_executed', False),
-                'url_context': bool(analyze_url)
-            }
-            
-            dao.salvar_ferramenta_usada(msg_assistant_id['id'], ferramentas_usadas)
+    data = request.json
 
-        return jsonify({
-            'success': True,
-            'response': response['response'],
-            'thinking_process': response.get('thinking_process'),
-            'chat_id': chat_id,
-            'search_used': response.get('search_used', False),
-            'code_executed': response.get('code_executed', False),
-            'code_results': response.get('code_results'),
-            'tokens_input': tokens_input,
-            'tokens_output': tokens_output,
-            'total_tokens': tokens_input + tokens_output
-        })
+    if not data.get('message', ''):
+        return jsonify({'error': True, 'message': 'Mensagem vazia'}), 400
 
+    try:
+        chat_id, message_com_contexto, gemini_kwargs, precisa_compactar, nivel = _preparar_envio(data)
+        response_frequente = _resposta_frequente(chat_id, data, gemini_kwargs)
+        termos_privados = _termos_privados()
     except Exception as e:
-        import traceback
-        print(f"❌ Erro: {traceback.format_exc()}")
+        logger.error(f"❌ Erro ao preparar mensagem: {e}")
         return jsonify({
             'error': True,
             'message': f'Erro: {str(e)}'
         }), 500
 
+    def gerar_eventos():
+        # chat_id vai primeiro para o front já poder registrar a conversa
+        yield _evento_sse('chat', {'chat_id': chat_id, 'degradacao': degradacao.estado_publico(nivel)})
+
+        # Pergunta frequente já respondida: só o done
+        if response_frequente:
+            _salvar_conversa(chat_id, data['message'], response_frequente, gemini_kwargs)
+            yield _evento_sse('done', dict(response_frequente, success=True, chat_id=chat_id))
+            return
+
+        try:
+            # Não espera reenvio de arquivo expirado: a resposta vai sem ele e o usuário é avisado
+            arquivos, reenviando = arquivos_gemini.anexos(chat_id)
+            if reenviando:
+                yield _evento_sse('aviso', f"📎 {', '.join(reenviando)} expirou na IA e está sendo reprocessado; "
+                                           "esta resposta não considera o arquivo. Envie a pergunta de novo em instantes.")
+            for evento in gemini.chat_stream(message_com_contexto, arquivos=arquivos, **gemini_kwargs):
+                if evento['type'] == 'done':
+                    response = evento['data']
+                    _log_tokens(response)
+                    _salvar_conversa(chat_id, data['message'], response, gemini_kwargs)
+                    _guardar_resposta_frequente(data['message'], response, gemini_kwargs, termos_privados, bool(arquivos))
+                    if precisa_compactar:
+                        _agendar_compactacao(chat_id, gemini_kwargs['user_id'])
+                    yield _evento_sse('done', dict(response, success=True, chat_id=chat_id))
+                else:
+                    yield _evento_sse(evento['type'], evento['data'])
+
+        except Exception as e:
+            import traceback
+            logger.error(f"❌ Erro no streaming: {traceback.format_exc()}")
+            yield _evento_sse('error', f'Erro: {str(e)}')
+
+    return Response(
+        stream_with_context(gerar_eventos()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Evita buffer em proxies (nginx)
+        }
+    )
+
 
 @chat_bp.route('/upload-file', methods=['POST'])
 @login_required
@@ -240,6 +549,10 @@ def upload_file():
     if not Config.IA_STATUS:
         return jsonify({'error': True, 'message': 'IA offline'}), 503
     
+    resposta_degradada = _recusar_se_degradado()
+    if resposta_degradada:
+        return resposta_degradada
+    
     if 'file' not in request.files:
         return jsonify({'error': True, 'message': 'Nenhum arquivo'}), 400
     
@@ -259,101 +572,123 @@ def upload_file():
             }), 400
     
     try:
-        # 1. Salva arquivo TEMPORÁRIO
-        temp_filename = secure_filename(file.filename)
-        temp_path = os.path.join(Config.UPLOAD_FOLDER, f"temp_{uuid.uuid4()}_{temp_filename}")
-        file.save(temp_path)
-        
-        mime_type = detect_mime_type(temp_filename, file.content_type)
-        logger.info(f"📋 MIME type detectado: {mime_type}")
-        
-        tipo_usuario = 'participante' if current_user.is_participante() else \
-                       'orientador' if current_user.is_orientador() else \
-                       'administrador' if current_user.is_admin() else None
-        
-        # Processa arquivo com Gemini 
-        logger.info(f"📁 Processando arquivo: {temp_filename}")
-        
-        response = gemini.chat_with_file(
-            message, 
-            temp_path, 
-            tipo_usuario,
-            user_id=current_user.id,
-            keep_file_on_gemini=True,
-            mime_type=mime_type 
-        )
-        
-        gemini_file_uri = response.get('gemini_file_uri')
-        
-        # 3. Salva arquivo PERMANENTEMENTE
-        file.seek(0)
-        CHAT_FILES_DIR = os.path.join(Config.UPLOAD_FOLDER, 'chat_files')
+        # 1. Salva o arquivo uma vez só, já no lugar definitivo (com hash e tamanho calculados na gravação)
         file_info = save_uploaded_file(file, CHAT_FILES_DIR, current_user.id, subfolder=chat_id or 0)
+        logger.info(f"📋 MIME type detectado: {file_info['mime_type']}")
         
-        # 4. Remove arquivo temporário
-        try:
-            os.remove(temp_path)
-        except:
-            pass
-        
-        # 5. Salva no banco
-        if chat_id:
-            arquivo_id = dao.criar_arquivo_chat(
-                chat_id=int(chat_id),
-                nome_arquivo=file_info['filename'],
-                url_arquivo=file_info['filepath'],
-                tipo_arquivo=file_info['mime_type'],
-                tamanho_bytes=file_info['size'],
-                gemini_file_uri=gemini_file_uri
-            )
-            
-            # 6. Salva mensagens
-            msg_user = dao.criar_mensagem(
-                chat_id, 
-                'user', 
-                f'📎 {message} (arquivo: {file_info["filename"]})'
-            )
-            
-            msg_assistant = dao.criar_mensagem(
-                chat_id, 
-                'model', 
-                response['response'],
-                thinking_process=response.get('thinking_process')
-            )
-            
-            # 7. Associa arquivo à mensagem
-            dao.associar_arquivo_mensagem(arquivo_id, msg_user['id'])
+        # 2. Processa com o Gemini no pool de jobs (o upload sai desse mesmo arquivo)
+        job = job_queue.submit(
+            current_user.id, 'upload', _executar_upload,
+            message, chat_id, file_info, _tipo_usuario_atual(), current_user.id
+        )
         
         return jsonify({
             'success': True,
-            'response': response['response'],
-            'thinking_process': response.get('thinking_process'),
-            'file_type': response.get('file_type'),
-            'file_info': {
-                'name': file_info['filename'],
-                'size': file_info['size'],
-                'type': file_info['mime_type'],
-                'url': f"/chat/file/{arquivo_id}" if chat_id else None
-            }
-        })
+            'job_id': job.id
+        }), 202
         
     except Exception as e:
         import traceback
         logger.error(f"❌ Erro: {traceback.format_exc()}")
         
-        # Limpa temporário
-        if 'temp_path' in locals() and os.path.exists(temp_path):
-            try:
-                os.remove(temp_path)
-            except:
-                pass
-        
         return jsonify({
             'error': True,
             'message': f'Erro: {str(e)}'
         }), 500
 
 
+def _executar_upload(job, message, chat_id, file_info, tipo_usuario, user_id):
+    """
+    Roda no pool de jobs: entrega o arquivo ao pipeline de upload e libera a thread
+    O processamento no Gemini é acompanhado pelos eventos 'arquivo' do job; quando o arquivo
+    fica pronto, a análise roda numa segunda etapa do mesmo job (_analisar_upload)
+    """
+    logger.info(f"📁 Processando arquivo: {file_info['filename']}")
+    
+    def pronto(arquivo_gemini, hash_conteudo):
+        job_queue.continuar(job, _analisar_upload, message, chat_id, file_info,
+                            tipo_usuario, user_id, arquivo_gemini, hash_conteudo)
+    
+    def falhou(erro):
+        job.concluir({
+            'error': True,
+            'message': f'Erro ao enviar o arquivo para a IA: {erro}',
+            'degradado': resiliencia.aberto()
+        }, 500)
+    
+    # Mesmo conteúdo já enviado (por qualquer usuário) e ainda vivo: não envia de novo
+    arquivos_gemini.obter_async(
+        file_info['full_path'], file_info['mime_type'],
+        hash_conteudo=file_info['hash'],
+        on_pronto=pronto,
+        on_erro=falhou,
+        on_status=lambda estado: job.emitir('arquivo', {'estado': estado})
+    )
+    
+    return None
+
+
+def _analisar_upload(job, message, chat_id, file_info, tipo_usuario, user_id, arquivo_gemini, hash_conteudo):
+    """Segunda etapa do upload: arquivo pronto no Gemini -> análise e gravação no banco"""
+    job.emitir('arquivo', {'estado': 'analisando'})
+    
+    response = gemini.chat_with_file(
+        message, 
+        None, 
+        tipo_usuario,
+        user_id=user_id,
+        keep_file_on_gemini=True,
+        on_fila=job.on_fila,
+        uploaded_file=arquivo_gemini
+    )
+    
+    arquivo_id = None
+    
+    # 5. Salva no banco
+    if chat_id:
+        arquivo_id = dao.criar_arquivo_chat(
+            chat_id=int(chat_id),
+            nome_arquivo=file_info['filename'],
+            url_arquivo=file_info['filepath'],
+            tipo_arquivo=file_info['mime_type'],
+            tamanho_bytes=file_info['size'],
+            gemini_file_uri=arquivo_gemini.uri,
+            gemini_file_name=arquivo_gemini.name,
+            gemini_expiration=expiracao_iso(arquivo_gemini),
+            hash_conteudo=hash_conteudo
+        )
+        
+        # 6. Salva mensagens
+        msg_user = dao.criar_mensagem(
+            chat_id, 
+            'user', 
+            f'📎 {message} (arquivo: {file_info["filename"]})'
+        )
+        
+        msg_assistant = dao.criar_mensagem(
+            chat_id, 
+            'model', 
+            response['response'],
+            thinking_process=response.get('thinking_process')
+        )
+        
+        # 7. Associa arquivo à mensagem
+        dao.associar_arquivo_mensagem(arquivo_id, msg_user['id'])
+    
+    return {
+        'success': True,
+        'response': response['response'],
+        'thinking_process': response.get('thinking_process'),
+        'file_type': response.get('file_type'),
+        'file_info': {
+            'name': file_info['filename'],
+            'size': file_info['size'],
+            'type': file_info['mime_type'],
+            'url': f"/chat/file/{arquivo_id}" if arquivo_id else None
+        }
+    }, 200
+
+
 @chat_bp.route('/file/<int:arquivo_id>')
 @login_required
 def serve_file(arquivo_id):
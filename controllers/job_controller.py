@@ -0,0 +1,24 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required, current_user
+from services.job_queue import job_queue
+
+job_bp = Blueprint('jobs', __name__, url_prefix='/jobs')
+# prefixo /jobs por exemplo /jobs/<job_id>
+# o __name__ será controllers.job_controller
+# o nome sera "jobs"
+
+
+@job_bp.route('/<job_id>', methods=['GET'])
+@login_required
+def status(job_id):
+    """
+    Status de um job da IA
+    ?desde=N devolve só os eventos parciais a partir do N-ésimo
+    """
+    job = job_queue.get(job_id, current_user.id)
+
+    if not job:
+        return jsonify({'error': True, 'message': 'Job não encontrado ou expirado'}), 404
+
+    desde = request.args.get('desde', 0, type=int)
+    return jsonify(job.to_dict(desde=desde, posicao=job_queue.posicao(job)))
@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
 from flask_login import login_required, current_user
 from functools import wraps
-from dao.dao import SupabaseDAO
+from dao.dao import get_dao
 from utils.advanced_logger import logger
 from utils.decorators import orientador_required
 from datetime import datetime
@@ -10,7 +10,7 @@ orientador_bp = Blueprint('orientador', __name__, url_prefix='/orientador')
 # prefixo /orientador por exemplo /orientador/dashboard, /orientador/orientado/<id>, etc...
 # o __name__ será controllers.orientador_controller
 # o nome sera "orientador"
-dao = SupabaseDAO()
+dao = get_dao()
 
 
 @orientador_bp.route('/dashboard')
@@ -1,19 +1,24 @@
 from flask import Blueprint, render_template, request, jsonify, send_file
 from flask_login import login_required, current_user
-from dao.dao import SupabaseDAO
+from dao.dao import get_dao
 from services.gemini_service import GeminiService
+from config import Config
 from datetime import datetime
 from utils.advanced_logger import logger
-import json
 from utils.decorators import bloquear_orientador_criar_projeto
 from services.pdf_service import BragantecPDFGenerator
+from services.job_queue import job_queue
+from services.gemini_scheduler import PRIORIDADE_LOTE
+from services.idea_pool import IdeaPool
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 project_bp = Blueprint('project', __name__, url_prefix='/projetos')
 # prefixo /projetos por exemplo /projetos/, /projetos/novo, etc...
 # o __name__ sera "controllers.project_controller"
 # o nome sera "project"
-dao = SupabaseDAO()
+dao = get_dao()
 gemini = GeminiService()
+pool_ideias = IdeaPool(gemini)
 
 @project_bp.route('/')
 @login_required
@@ -212,236 +217,68 @@ def gerar_ideias():
     """
     Analisa projetos vencedores das edições anteriores da Bragantec
     para criar 4 novas ideias com ALTO POTENCIAL DE VITÓRIA que vao deixar os outros no CHINELO kkkkk
+    Normalmente sai na hora do estoque de ideias (idea_pool); se o estoque estiver vazio,
+    devolve um job_id (202) e o resultado é consultado em /jobs/<job_id>
     """
     logger.info(f"💡 Gerando ideias com análise de vencedores - Usuário: {current_user.nome_completo}")
     
     try:
-        # Prompt que analisa projetos
-        prompt = """
-        🎯 **MISSÃO CRÍTICA: CRIAR PROJETOS VENCEDORES PARA A BRAGANTEC 2025**
-
-        Você tem acesso ao histórico COMPLETO das edições anteriores da Bragantec (feira de ciências do IFSP Bragança Paulista), incluindo cadernos de resumos com TODOS os projetos vencedores.
-
-        **ANÁLISE OBRIGATÓRIA ANTES DE CRIAR:**
-        
-        1. **ESTUDE OS PROJETOS VENCEDORES** nos arquivos de contexto que você possui
-        2. **IDENTIFIQUE PADRÕES DE SUCESSO:**
-           - Que temas/abordagens venceram mais?
-           - Quais características os projetos premiados têm em comum?
-           - Que nível de complexidade/inovação foi valorizado?
-           - Quais problemas reais foram abordados?
-           - Que metodologias foram bem avaliadas?
-        
-        3. **EXTRAIA INSIGHTS DOS VENCEDORES:**
-           - Títulos: Como eram formulados?
-           - Relevância: Que impacto social/científico tinham?
-           - Inovação: O que os diferenciava?
-           - Viabilidade: Eram projetos executáveis por estudantes?
-        
-        4. **ENTENDA OS CRITÉRIOS DE AVALIAÇÃO:**
-           - **Inovação e criatividade** (30 pontos)
-           - **Relevância científica/social** (25 pontos)
-           - **Fundamentação teórica** (20 pontos)
-           - **Viabilidade de execução** (15 pontos)
-           - **Impacto potencial** (10 pontos)
-
-        ---
-
-        **AGORA CRIE 4 IDEIAS DE PROJETOS (UMA POR CATEGORIA):**
-
-        Com base na sua análise dos projetos vencedores das edições anteriores da Bragantec, crie UMA ideia de projeto para CADA uma das 4 categorias:
-
-        1. **Ciências da Natureza e Exatas**
-        2. **Informática**
-        3. **Ciências Humanas e Linguagens**
-        4. **Engenharias**
-
-        **REQUISITOS PARA CADA PROJETO:**
-
-        ✅ **DEVE SER INSPIRADO EM PROJETOS VENCEDORES ANTERIORES** (mas não cópia!)
-        ✅ **DEVE ABORDAR PROBLEMAS REAIS E ATUAIS DE 2025**
-        ✅ **DEVE SER INOVADOR** (trazer algo novo ou melhorado)
-        ✅ **DEVE SER VIÁVEL** para estudantes de ensino médio/técnico executarem
-        ✅ **DEVE TER IMPACTO** científico, social ou ambiental mensurável
-        ✅ **DEVE TER FUNDAMENTAÇÃO TEÓRICA** sólida
-
-        
-        ---
-
-        **PARA CADA CATEGORIA, FORNEÇA:**
-
-        - **titulo**: Título atrativo, direto e científico (máx 80 caracteres)
-          * Exemplo de títulos vencedores: específicos, técnicos, com termos científicos
-        
-        - **resumo**: Resumo executivo COMPLETO E PROFISSIONAL (200-250 palavras) contendo:
-          * **Introdução**: Contexto e problema (2-3 frases)
-          * **Objetivos**: O que o projeto pretende alcançar (1-2 frases)
-          * **Metodologia**: Como será desenvolvido - materiais, métodos (3-4 frases)
-          * **Resultados Esperados**: Impactos e conclusões esperadas (2-3 frases)
-          * **Relevância**: Por que é importante (1-2 frases)
-        
-        - **palavras_chave**: Exatamente 3 palavras-chave técnicas/científicas separadas por vírgula
-          * Use termos que projetos vencedores usaram
-        
-        - **inspiracao_vencedores**: Liste 2-3 características de projetos vencedores que inspiraram esta ideia
-          * Exemplo: "Baseado no padrão de projetos premiados que abordam sustentabilidade com tecnologia IoT"
-        
-        - **diferenciais_competitivos**: O que torna este projeto um VENCEDOR POTENCIAL (máx 150 palavras)
-          * Compare com projetos vencedores anteriores
-          * Explique por que este seria bem avaliado pelos jurados
-        
-        - **viabilidade_tecnica**: Nível de dificuldade e recursos necessários (máx 100 palavras)
-          * Seja realista sobre o que estudantes podem fazer
-
-        ---
-
-        **FORMATO DE SAÍDA (JSON ESTRITO):**
-
-        Retorne APENAS um JSON válido (sem texto adicional) no formato:
-
-        ```json
-        {
-          "Ciências da Natureza e Exatas": {
-            "titulo": "...",
-            "resumo": "...",
-            "palavras_chave": "palavra1, palavra2, palavra3",
-            "inspiracao_vencedores": "...",
-            "diferenciais_competitivos": "...",
-            "viabilidade_tecnica": "..."
-          },
-          "Informática": {
-            "titulo": "...",
-            "resumo": "...",
-            "palavras_chave": "palavra1, palavra2, palavra3",
-            "inspiracao_vencedores": "...",
-            "diferenciais_competitivos": "...",
-            "viabilidade_tecnica": "..."
-          },
-          "Ciências Humanas e Linguagens": {
-            "titulo": "...",
-            "resumo": "...",
-            "palavras_chave": "palavra1, palavra2, palavra3",
-            "inspiracao_vencedores": "...",
-            "diferenciais_competitivos": "...",
-            "viabilidade_tecnica": "..."
-          },
-          "Engenharias": {
-            "titulo": "...",
-            "resumo": "...",
-            "palavras_chave": "palavra1, palavra2, palavra3",
-            "inspiracao_vencedores": "...",
-            "diferenciais_competitivos": "...",
-            "viabilidade_tecnica": "..."
-          }
+        ideias = pool_ideias.servir(current_user.id)
+        if ideias:
+            pool_ideias.reabastecer_async()
+            return jsonify(_resposta_ideias(ideias, origem='estoque'))
+    except Exception as e:
+        logger.error(f"❌ Erro ao ler estoque de ideias: {e}")
+    
+    job = job_queue.submit(current_user.id, 'gerar_ideias', _gerar_ideias_job, current_user.id)
+    return jsonify({'success': True, 'job_id': job.id}), 202
+
+
+def _resposta_ideias(ideias, origem):
+    """Corpo de resposta com as ideias estruturadas e metadados"""
+    return {
+        'success': True,
+        'ideias': ideias,
+        'formato': 'json',
+        'metadata': {
+            'analise_vencedores': True,
+            'modo_bragantec': True,
+            'contexto_usado': 'Resumos selecionados dos cadernos das edições anteriores',
+            'origem': origem
         }
-        ```
-
-        **LEMBRE-SE:**
-        - Você tem acesso aos cadernos de resumos das edições anteriores da Bragantec
-        - USE esse conhecimento para criar projetos com padrões de sucesso comprovados
-        - Não copie projetos, mas INSPIRE-SE nos elementos que fizeram eles vencerem
-        - Pense como um jurado: O que ME impressionaria neste projeto?
-
+    }
 
 
-        **NÃO ADICIONE TEXTO EXPLICATIVO. RETORNE APENAS O JSON.**
-        """
-        
-        logger.info("🤖 Chamando Gemini com Modo Bragantec OBRIGATÓRIO")
-        logger.debug("⚠️ Consumo estimado: ~100k-200k tokens de input")
-        
-        response = gemini.chat(
-            prompt, 
-            tipo_usuario='participante',
-            usar_contexto_bragantec=True,  # OBRIGATÓRIO
-            usar_pesquisa=True,
-            usar_code_execution=False,
-            user_id=current_user.id
-        )
-        
-        if response.get('error'):
-            logger.error(f"❌ Erro na resposta do Gemini: {response.get('response')}")
-            return jsonify({
+def _gerar_ideias_job(job, user_id):
+    """Roda no pool de jobs quando o estoque está vazio: gera um lote e serve um conjunto. Retorna (corpo, http_status)"""
+    try:
+        # Alunos pedindo ao mesmo tempo dividem o mesmo lote (pedidos idênticos viram uma chamada só);
+        # quem chegar com o lote já esgotado gera o próximo (outro prompt: evita os títulos novos)
+        for _ in range(Config.IDEIAS_TENTATIVAS_JOB):
+            inseridas = pool_ideias.gerar_lote(user_id, on_fila=job.on_fila)
+            ideias = pool_ideias.servir(user_id)
+            if ideias:
+                break
+        
+        if not ideias:
+            logger.error(f"❌ Lote gerado sem ideias suficientes ({inseridas} novas)")
+            return {
                 'error': True,
                 'message': 'Erro ao gerar ideias com IA'
-            }), 500
-        
-        logger.info("✅ Resposta recebida do Gemini")
-        
-        # Tenta parsear a resposta como JSON
-        ideias_text = response['response']
+            }, 500
         
-        try:
-            # Remove possíveis blocos de código markdown
-            if '```json' in ideias_text:
-                ideias_text = ideias_text.split('```json')[1].split('```')[0].strip()
-            elif '```' in ideias_text:
-                ideias_text = ideias_text.split('```')[1].split('```')[0].strip()
-            
-            # Parse JSON
-            ideias = json.loads(ideias_text)
-            
-            logger.debug("✅ JSON parseado com sucesso")
-            
-            # Valida estrutura e adiciona metadados
-            categorias_esperadas = [
-                "Ciências da Natureza e Exatas",
-                "Informática",
-                "Ciências Humanas e Linguagens",
-                "Engenharias"
-            ]
-            
-            for categoria in categorias_esperadas:
-                if categoria not in ideias:
-                    raise ValueError(f"Categoria '{categoria}' não encontrada")
-                
-                ideia = ideias[categoria]
-                campos_obrigatorios = ['titulo', 'resumo', 'palavras_chave']
-                
-                for campo in campos_obrigatorios:
-                    if campo not in ideia:
-                        raise ValueError(f"Campo '{campo}' não encontrado em '{categoria}'")
-                
-                # Adiciona metadado de que foi gerado com análise de vencedores
-                ideia['gerado_com_analise_vencedores'] = True
-                ideia['ano_geracao'] = 2025
-            
-            logger.info("✅ Ideias validadas e enriquecidas com metadados")
-            
-            # Retorna ideias estruturadas COM metadados
-            return jsonify({
-                'success': True,
-                'ideias': ideias,
-                'formato': 'json',
-                'metadata': {
-                    'analise_vencedores': True,
-                    'modo_bragantec': True,
-                    'contexto_usado': 'Cadernos de resumos das edições anteriores',
-                    'aviso_tokens': 'Esta operação consumiu ~100k-200k tokens (contexto histórico completo)'
-                }
-            })
-            
-        except (json.JSONDecodeError, ValueError) as e:
-            logger.warning(f"⚠️ Erro ao parsear JSON: {e}")
-            logger.debug(f"📄 Resposta bruta (primeiros 500 chars): {ideias_text[:500]}")
-            
-            # Fallback: Se não conseguir parsear, retorna texto bruto
-            return jsonify({
-                'success': True,
-                'ideias': ideias_text,
-                'formato': 'texto',
-                'aviso': 'A IA não retornou JSON estruturado. Exibindo texto bruto.'
-            })
+        logger.info("✅ Ideias validadas e enriquecidas com metadados")
+        return _resposta_ideias(ideias, origem='gerado'), 200
         
     except Exception as e:
         logger.error(f"❌ Erro ao gerar ideias: {str(e)}")
         import traceback
         logger.error(f"Traceback completo:\n{traceback.format_exc()}")
         
-        return jsonify({
+        return {
             'error': True,
             'message': f'Erro ao gerar ideias: {str(e)}'
-        }), 500
+        }, 500
 
 @project_bp.route('/autocompletar', methods=['POST'])
 @login_required
@@ -449,30 +286,74 @@ def autocompletar():
     """
     IA preenche campos do projeto automaticamente
     Retorna JSON estruturado com campos específicos
+    Devolve um job_id na hora (202); o resultado é consultado em /jobs/<job_id>
     """
     logger.info(f"🤖 Autocompletando campos - Usuário: {current_user.nome_completo}")
     
-    try:
-        data = request.json
-        campos = data.get('campos', [])
-        projeto_parcial = data.get('projeto', {})
-        
-        if not campos:
-            logger.warning("❌ Nenhum campo selecionado para autocompletar")
-            return jsonify({'error': True, 'message': 'Nenhum campo selecionado'}), 400
-        
-        logger.debug(f"📝 Campos solicitados: {campos}")
-        
-        # Prepara dados do projeto para contexto
-        nome = projeto_parcial.get('nome', 'Não informado')
-        categoria = projeto_parcial.get('categoria', 'Não informado')
-        resumo = projeto_parcial.get('resumo', 'Não informado')
-        palavras_chave = projeto_parcial.get('palavras_chave', 'Não informado')
-        
-        # Monta prompt dinâmico
-        campos_str = ', '.join(campos)
-        
-        prompt = f"""
+    data = request.json or {}
+    campos = data.get('campos', [])
+    projeto_parcial = data.get('projeto', {})
+    
+    if not campos:
+        logger.warning("❌ Nenhum campo selecionado para autocompletar")
+        return jsonify({'error': True, 'message': 'Nenhum campo selecionado'}), 400
+    
+    logger.debug(f"📝 Campos solicitados: {campos}")
+    
+    job = job_queue.submit(current_user.id, 'autocompletar', _autocompletar_job,
+                           current_user.id, campos, projeto_parcial)
+    return jsonify({'success': True, 'job_id': job.id}), 202
+
+
+# Campo do formulário -> chave no JSON do autocompletar
+CAMPOS_AUTOCOMPLETAR = {
+    'resumo': 'resumo',
+    'introducao': 'introducao',
+    'objetivos': 'objetivo_geral',
+    'objetivo_geral': 'objetivo_geral',
+    'metodologia': 'metodologia',
+    'resultados_esperados': 'resultados_esperados'
+}
+
+REFERENCIAS_AUTOCOMPLETAR = {
+    'resumo': "Sintetize introdução, objetivos, métodos e resultados esperados em um único texto corrido. (máximo 300 palavras)",
+    'introducao': "Apresente o tema, contextualize sua relevância, mencione a fundamentação teórica. Responda: Qual o problema? Por que é importante? O que já se sabe sobre o tema? (250-400 palavras)",
+    'objetivo_geral': "Descreva a finalidade principal do projeto usando verbo no infinitivo (desenvolver, analisar, comparar, investigar, propor). Deve ser claro, específico e alcançável. (1-2 frases)",
+    'metodologia': "Detalhe materiais, métodos, procedimentos experimentais, equipamentos, tipo de pesquisa, dados a coletar, como será desenvolvido. Seja específico mas didático. (300-500 palavras)",
+    'resultados_esperados': "Descreva as expectativas científicas, técnicas ou sociais do projeto quando finalizado. Quais conclusões espera obter? Qual o impacto potencial? (200-300 palavras)"
+}
+
+# Pool dos pedidos por campo (separado da fila de jobs, que já está ocupada pelo job que os dispara)
+_pool_campos = ThreadPoolExecutor(max_workers=Config.AUTOCOMPLETAR_WORKERS, thread_name_prefix='apbia-campos')
+
+
+def _chaves_autocompletar(campos):
+    """Chaves do JSON pedidas, sem repetir (ex.: 'objetivos' e 'objetivo_geral')"""
+    chaves = list(dict.fromkeys(CAMPOS_AUTOCOMPLETAR[c] for c in campos if c in CAMPOS_AUTOCOMPLETAR))
+    return chaves or ['introducao', 'objetivo_geral', 'metodologia', 'resultados_esperados']
+
+
+def _schema_autocompletar(chaves):
+    """response_schema com apenas os campos solicitados (todos obrigatórios)"""
+    return {
+        'type': 'OBJECT',
+        'properties': {chave: {'type': 'STRING'} for chave in chaves},
+        'required': chaves,
+        'property_ordering': chaves
+    }
+
+
+def _prompt_autocompletar(chaves, projeto_parcial):
+    """Prompt com as informações parciais do projeto e a referência de cada campo pedido"""
+    nome = projeto_parcial.get('nome', 'Não informado')
+    categoria = projeto_parcial.get('categoria', 'Não informado')
+    resumo = projeto_parcial.get('resumo', 'Não informado')
+    palavras_chave = projeto_parcial.get('palavras_chave', 'Não informado')
+    
+    campos_str = ', '.join(chaves)
+    referencias = "\n\n".join(f"        - **{chave}**: {REFERENCIAS_AUTOCOMPLETAR[chave]}" for chave in chaves)
+    
+    return f"""
         Você é um especialista em projetos científicos para a Bragantec (feira de ciências do IFSP).
 
         Com base nas informações parciais do projeto abaixo, complete APENAS os seguintes campos: {campos_str}
@@ -487,86 +368,106 @@ def autocompletar():
         1. Gere conteúdo profissional, acadêmico e adequado para feira de ciências
         2. Use linguagem científica mas acessível para estudantes de ensino médio
         3. Baseie-se nos critérios de avaliação da Bragantec
-        4. Retorne APENAS um JSON válido no formato:
-
-        {{
-          "introducao": "texto da introdução (se solicitado)...",
-          "objetivo_geral": "texto do objetivo geral (se solicitado)...",
-          "metodologia": "texto da metodologia (se solicitado)...",
-          "resultados_esperados": "texto dos resultados (se solicitado)..."
-        }}
-
-        **IMPORTANTE**:
-        - Inclua APENAS os campos que foram solicitados: {campos_str}
-        - NÃO adicione texto explicativo antes ou depois do JSON
-        - Retorne APENAS o JSON válido
-        - Se o campo for "objetivos", inclua "objetivo_geral" no JSON
 
         **REFERÊNCIAS PARA CADA CAMPO**:
 
-        - **introducao**: Apresente o tema, contextualize sua relevância, mencione a fundamentação teórica. Responda: Qual o problema? Por que é importante? O que já se sabe sobre o tema? (250-400 palavras)
-
-        - **objetivo_geral**: Descreva a finalidade principal do projeto usando verbo no infinitivo (desenvolver, analisar, comparar, investigar, propor). Deve ser claro, específico e alcançável. (1-2 frases)
+{referencias}
+        """
 
-        - **metodologia**: Detalhe materiais, métodos, procedimentos experimentais, equipamentos, tipo de pesquisa, dados a coletar, como será desenvolvido. Seja específico mas didático. (300-500 palavras)
 
-        - **resultados_esperados**: Descreva as expectativas científicas, técnicas ou sociais do projeto quando finalizado. Quais conclusões espera obter? Qual o impacto potencial? (200-300 palavras)
-        """
+def _autocompletar_job(job, user_id, campos, projeto_parcial):
+    """Roda no pool de jobs. Retorna (corpo, http_status)"""
+    try:
+        chaves = _chaves_autocompletar(campos)
+        
+        if Config.AUTOCOMPLETAR_PARALELO and len(chaves) > 1:
+            return _autocompletar_paralelo(job, user_id, chaves, projeto_parcial)
         
         logger.info("🤖 Chamando Gemini para autocompletar")
         
-        # Chama Gemini
-        response = gemini.chat(
-            prompt, 
+        # Chama Gemini (saída estruturada: só os campos pedidos, já em JSON)
+        response = gemini.gerar_estruturado(
+            _prompt_autocompletar(chaves, projeto_parcial),
+            _schema_autocompletar(chaves),
             tipo_usuario='participante',
-            user_id=current_user.id
+            user_id=user_id,
+            prioridade=PRIORIDADE_LOTE,
+            on_fila=job.on_fila
         )
         
         if response.get('error'):
             logger.error(f"❌ Erro na resposta do Gemini: {response.get('response')}")
-            return jsonify({'error': True, 'message': 'Erro ao autocompletar'}), 500
+            return {'error': True, 'message': 'Erro ao autocompletar'}, 500
         
         logger.info("✅ Resposta recebida do Gemini")
         
-        # Tenta parsear resposta como JSON
-        try:
-            conteudo_text = response['response']
-            
-            # Remove blocos markdown
-            if '```json' in conteudo_text:
-                conteudo_text = conteudo_text.split('```json')[1].split('```')[0].strip()
-            elif '```' in conteudo_text:
-                conteudo_text = conteudo_text.split('```')[1].split('```')[0].strip()
-            
-            conteudo = json.loads(conteudo_text)
-            
-            logger.debug("✅ JSON parseado com sucesso")
-            
-            return jsonify({
-                'success': True,
-                'conteudo': conteudo,
-                'formato': 'json'
-            })
-            
-        except json.JSONDecodeError:
-            logger.warning("⚠️ Erro ao parsear JSON do autocompletar")
-            
-            # Fallback: retorna texto bruto
-            return jsonify({
-                'success': True,
-                'conteudo': {'texto': response['response']},
-                'formato': 'texto'
-            })
+        return {
+            'success': True,
+            'conteudo': response['dados'],
+            'formato': 'json'
+        }, 200
         
     except Exception as e:
         logger.error(f"❌ Erro ao autocompletar: {str(e)}")
         import traceback
         logger.error(f"Traceback completo:\n{traceback.format_exc()}")
         
-        return jsonify({
+        return {
             'error': True,
             'message': f'Erro: {str(e)}'
-        }), 500
+        }, 500
+
+
+def _autocompletar_paralelo(job, user_id, chaves, projeto_parcial):
+    """
+    Um pedido pequeno por campo (sem ferramentas, thinking curto), todos ao mesmo tempo
+    Cada campo pronto vira um evento 'campo' do job; um campo com erro não derruba os outros
+    Os pedidos passam pela fila da API key como qualquer outro (respeitam RPM/TPM globais)
+    """
+    logger.info(f"🤖 Autocompletando {len(chaves)} campos em paralelo")
+    
+    def gerar(chave):
+        return gemini.gerar_estruturado(
+            _prompt_autocompletar([chave], projeto_parcial),
+            _schema_autocompletar([chave]),
+            tipo_usuario='participante',
+            user_id=user_id,
+            prioridade=PRIORIDADE_LOTE,
+            on_fila=job.on_fila,
+            thinking_budget=Config.AUTOCOMPLETAR_THINKING_BUDGET,
+            hedge=True  # Campo que demora segura o formulário inteiro
+        )
+    
+    futuros = {_pool_campos.submit(gerar, chave): chave for chave in chaves}
+    conteudo = {}
+    falhas = []
+    
+    for futuro in as_completed(futuros):
+        chave = futuros[futuro]
+        try:
+            response = futuro.result()
+        except Exception as e:
+            response = {'error': True, 'response': str(e)}
+        
+        texto = None if response.get('error') else response['dados'].get(chave)
+        if not texto:
+            logger.warning(f"⚠️ Campo {chave} não gerado: {response.get('response')}")
+            falhas.append(chave)
+            continue
+        
+        conteudo[chave] = texto
+        job.emitir('campo', {'chave': chave, 'texto': texto})
+        logger.debug(f"✅ Campo {chave} pronto")
+    
+    if not conteudo:
+        return {'error': True, 'message': 'Erro ao autocompletar'}, 500
+    
+    return {
+        'success': True,
+        'conteudo': conteudo,
+        'formato': 'json',
+        'falhas': falhas
+    }, 200
 
 @project_bp.route('/gerar-pdf/<int:projeto_id>')
 @login_required
@@ -0,0 +1,74 @@
+"""
+Versão do contexto de projetos de cada usuário, num SQLite compartilhado entre os workers
+As escritas do DAO em projetos/participantes/orientações incrementam a versão dos usuários
+afetados; o chat guarda o contexto já montado junto com a versão e só remonta quando ela muda
+(em qualquer worker, não só no que fez a escrita)
+"""
+
+import os
+import sqlite3
+import threading
+from config import Config
+from utils.advanced_logger import logger
+
+
+class VersoesContexto:
+    """usuario_id -> versão, com incremento atômico (BEGIN IMMEDIATE)"""
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho or Config.CONTEXTO_VERSOES_DB_PATH
+        self._local = threading.local()
+
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+        self._conexao().execute("""
+            CREATE TABLE IF NOT EXISTS versoes (
+                usuario_id INTEGER PRIMARY KEY,
+                valor INTEGER NOT NULL
+            )
+        """)
+
+    def _conexao(self):
+        """Uma conexão por thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=Config.QUOTA_SQLITE_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def versao(self, usuario_id):
+        """Versão atual do usuário (0 se nunca mudou); None se o banco falhar (não usar cache)"""
+        try:
+            row = self._conexao().execute("SELECT valor FROM versoes WHERE usuario_id = ?", (usuario_id,)).fetchone()
+            return row[0] if row else 0
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Erro ao ler versão do contexto do usuário {usuario_id}: {e}")
+            return None
+
+    def incrementar(self, usuario_ids):
+        """Nova versão para cada usuário (os contextos guardados deles deixam de valer)"""
+        usuario_ids = {u for u in usuario_ids if u is not None}
+        if not usuario_ids:
+            return
+
+        conn = self._conexao()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO versoes (usuario_id, valor) VALUES (?, 1) "
+                    "ON CONFLICT (usuario_id) DO UPDATE SET valor = valor + 1",
+                    [(u,) for u in usuario_ids]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            logger.debug(f"🔄 Contexto de projetos invalidado: usuários {sorted(usuario_ids)}")
+        except sqlite3.Error as e:
+            # A escrita no Supabase já aconteceu: não falha a operação por causa do cache
+            logger.error(f"❌ Erro ao invalidar contexto dos usuários {sorted(usuario_ids)}: {e}")
@@ -1,4 +1,5 @@
-from supabase import create_client, Client
+from supabase import Client
+from threading import Lock
 import json
 from config import Config
 from models.models import Usuario, Projeto, Chat, TipoIA, ArquivoChat, TipoUsuario
@@ -6,17 +7,22 @@ import bcrypt
 from utils.advanced_logger import logger, log_database_operation
 from utils.helpers import validate_bp, format_bp
 from datetime import datetime
+from dao.supabase_client import get_supabase_client
+from dao.context_versions import VersoesContexto
 class SupabaseDAO:
     # Data Access Object para Supabase
     
-    def __init__(self): 
+    def __init__(self, client=None, versoes_contexto=None): 
         logger.info("🗄️ Inicializando SupabaseDAO...") # Log de inicialização
+        
+        # Versão do contexto de projetos de cada usuário (SQLite compartilhado entre os workers):
+        # as escritas em projetos/participantes/orientações invalidam o contexto de prompt
+        # guardado em cache dos usuários afetados (ver chat_controller)
+        self.versoes_contexto = versoes_contexto or VersoesContexto()
+        
         try:
-            #cria o cliente supabase usando a api key e a url do banco de dados
-            self.supabase: Client = create_client(
-                Config.SUPABASE_URL, 
-                Config.SUPABASE_KEY
-            )
+            # usa o cliente supabase compartilhado (pool de conexões único por processo)
+            self.supabase: Client = client or get_supabase_client()
             logger.info(f"✅ Conectado ao Supabase: {Config.SUPABASE_URL}") # Log de conexão
         except Exception as e:
             logger.critical(f"💥 ERRO ao conectar ao Supabase: {e}") # Log de erro
@@ -103,6 +109,30 @@ class SupabaseDAO:
         # o salt que adicionamos nao atraplha nisso, o bcrypt é inteligente pra isso
     
     
+    def versao_contexto(self, usuario_id):
+        """Versão do contexto de projetos do usuário (None se não der para ler: não usar cache)"""
+        return self.versoes_contexto.versao(usuario_id)
+
+    def _nova_versao_contexto(self, *usuario_ids):
+        """Marca que os projetos/orientações destes usuários mudaram (invalida o contexto deles em todos os workers)"""
+        self.versoes_contexto.incrementar(usuario_ids)
+
+    def _orientadores_do_projeto(self, projeto_id):
+        """IDs dos orientadores do projeto (o projeto e os participantes aparecem no contexto deles)"""
+        result = self.supabase.table('orientadores_projetos')\
+            .select('orientador_id')\
+            .eq('projeto_id', projeto_id)\
+            .execute()
+        return [row['orientador_id'] for row in result.data or []]
+
+    def _participantes_do_projeto(self, projeto_id):
+        """IDs dos participantes do projeto"""
+        result = self.supabase.table('participantes_projetos')\
+            .select('participante_id')\
+            .eq('projeto_id', projeto_id)\
+            .execute()
+        return [row['participante_id'] for row in result.data or []]
+    
     def criar_projeto_completo(self, nome, categoria, criador_id, **kwargs): # **kwargs permite que eu passe quantos argumentos eu quiser, sem precisar digitar tudo, 
         # nao é usada em todo codigo pois descobri so agr, teria que atualizar tudo
         """Cria um projeto completo com todos os campos"""
@@ -132,6 +162,7 @@ class SupabaseDAO:
         }
         
         result = self.supabase.table('projetos').insert(data).execute() # equivale a INSERT INTO projetos VALUES (data)
+        self._nova_versao_contexto(criador_id)
         return self._row_to_projeto(result.data[0]) if result.data else None #manda para a funcao _row_to_projeto que explicarei depois
     
     def atualizar_projeto(self, projeto_id, **kwargs):
@@ -148,6 +179,7 @@ class SupabaseDAO:
     
         if data: # se houver informacoes para atualizar
             result = self.supabase.table('projetos').update(data).eq('id', projeto_id).execute() #equivale a UPDATE projetos SET data WHERE id = projeto_id
+            self._nova_versao_contexto(*self._participantes_do_projeto(projeto_id), *self._orientadores_do_projeto(projeto_id))
             return self._row_to_projeto(result.data[0]) if result.data else None # manda pro row_to_projeto
         return None # se nao houver informacoes para atualizar, volta None
     
@@ -163,8 +195,19 @@ class SupabaseDAO:
             'projeto_id': projeto_id
         }
         result = self.supabase.table('participantes_projetos').insert(data).execute() #equivale a INSERT INTO participantes_projetos (participante_id, projeto_id) VALUES (participante_id, projeto_id)
+        # O participante ganha o projeto; os orientadores do projeto, um orientado
+        self._nova_versao_contexto(participante_id, *self._orientadores_do_projeto(projeto_id))
         return bool(result.data) #retorna True se deu certo, False se deu errado
     
+    def remover_participante_projeto(self, participante_id, projeto_id):
+        """Remove participante de um projeto"""
+        result = self.supabase.table('participantes_projetos')\
+            .delete()\
+            .eq('projeto_id', projeto_id)\
+            .eq('participante_id', participante_id)\
+            .execute() #equivale a DELETE FROM participantes_projetos WHERE projeto_id = projeto_id AND participante_id = participante_id
+        return bool(result.data)
+    
     def associar_orientador_projeto(self, orientador_id, projeto_id):
         """Associa orientador a projeto"""
         # mesma coisa basicamente
@@ -215,7 +258,8 @@ class SupabaseDAO:
             return False #retorna false se deu erro
 
     def criar_arquivo_chat(self, chat_id, nome_arquivo, url_arquivo, tipo_arquivo=None, 
-                           tamanho_bytes=None, gemini_file_uri=None):
+                           tamanho_bytes=None, gemini_file_uri=None, gemini_file_name=None,
+                           gemini_expiration=None, hash_conteudo=None):
         """Cria registro de arquivo no banco"""
         logger.info(f"📎 Salvando arquivo no banco: {nome_arquivo}")
         
@@ -229,9 +273,14 @@ class SupabaseDAO:
         
         if gemini_file_uri:
             data['gemini_file_uri'] = gemini_file_uri
+            data['gemini_file_name'] = gemini_file_name
+            data['gemini_expiration'] = gemini_expiration
             
             #adiciona o URI do arquivo gemini se tiver (se ja estiver expirado o arquivo, entao nao tem uri, por isso o if)
         
+        if hash_conteudo:
+            data['hash_conteudo'] = hash_conteudo #sha256 do conteudo, pra reaproveitar o upload no gemini
+        
         try:
             result = self.supabase.table('arquivos_chat').insert(data).execute() #equivale a INSERT INTO arquivos_chat (chat_id, nome_arquivo, url_arquivo, tipo_arquivo, tamanho_bytes, gemini_file_uri) VALUES (chat_id, nome_arquivo, url_arquivo, tipo_arquivo, tamanho_bytes, gemini_file_uri)
             log_database_operation('INSERT', 'arquivos_chat', data={'nome': nome_arquivo}, result='Success') #log de sussesso
@@ -305,6 +354,43 @@ class SupabaseDAO:
             logger.error(f"❌ Erro ao deletar arquivo: {e}")
             return False
 
+    def buscar_arquivo_gemini_por_hash(self, hash_conteudo, expira_depois):
+        """Arquivo com o mesmo conteúdo cujo upload no Gemini só expira depois de expira_depois (ISO, UTC)"""
+        try:
+            result = self.supabase.table('arquivos_chat')\
+                .select('gemini_file_uri, gemini_file_name, gemini_expiration, tipo_arquivo')\
+                .eq('hash_conteudo', hash_conteudo)\
+                .gt('gemini_expiration', expira_depois)\
+                .order('gemini_expiration', desc=True)\
+                .limit(1)\
+                .execute()
+            
+            return result.data[0] if result.data else None
+            
+        except Exception as e:
+            logger.error(f"❌ Erro ao buscar arquivo por hash: {e}")
+            return None
+
+    def atualizar_arquivo_gemini(self, hash_conteudo, gemini_file_uri, gemini_file_name, gemini_expiration):
+        """Grava o novo upload no Gemini em todos os registros com o mesmo conteúdo"""
+        try:
+            result = self.supabase.table('arquivos_chat')\
+                .update({
+                    'gemini_file_uri': gemini_file_uri,
+                    'gemini_file_name': gemini_file_name,
+                    'gemini_expiration': gemini_expiration
+                })\
+                .eq('hash_conteudo', hash_conteudo)\
+                .execute()
+            
+            log_database_operation('UPDATE', 'arquivos_chat', data={'hash': hash_conteudo[:12]}, result='Success')
+            return bool(result.data)
+            
+        except Exception as e:
+            log_database_operation('UPDATE', 'arquivos_chat', data={'hash': hash_conteudo[:12]}, result=f'Error: {e}')
+            logger.error(f"❌ Erro ao atualizar arquivo no Gemini: {e}")
+            return False
+
     def associar_arquivo_mensagem(self, arquivo_id, mensagem_id):
         """Associa arquivo a uma mensagem específica"""
         try:
@@ -499,7 +585,8 @@ class SupabaseDAO:
             mensagem_id=row.get('mensagem_id'),
             gemini_file_uri=row.get('gemini_file_uri'),
             gemini_file_name=row.get('gemini_file_name'),
-            gemini_expiration=gemini_expiration
+            gemini_expiration=gemini_expiration,
+            hash_conteudo=row.get('hash_conteudo')
         )
     
 
@@ -583,6 +670,52 @@ class SupabaseDAO:
         # Inverte para ordem cronológica correta
         return list(reversed(result.data)) if result.data else []
 
+    def obter_resumo_chat(self, chat_id):
+        """
+        Retorna o resumo acumulado do histórico de um chat
+        {'resumo': texto ou None, 'ate_mensagem_id': última mensagem já resumida ou None}
+        """
+        result = self.supabase.table('chats')\
+            .select('resumo_historico, resumo_ate_mensagem_id')\
+            .eq('id', chat_id)\
+            .execute()
+        
+        row = result.data[0] if result.data else {}
+        return {
+            'resumo': row.get('resumo_historico'),
+            'ate_mensagem_id': row.get('resumo_ate_mensagem_id')
+        }
+
+    def atualizar_resumo_chat(self, chat_id, resumo, ate_mensagem_id):
+        """Grava o resumo acumulado do histórico e até qual mensagem ele cobre"""
+        result = self.supabase.table('chats')\
+            .update({
+                'resumo_historico': resumo,
+                'resumo_ate_mensagem_id': ate_mensagem_id
+            })\
+            .eq('id', chat_id)\
+            .execute()
+        
+        return bool(result.data)
+
+    def obter_mensagens_apos(self, chat_id, apos_id=None, n=40, mais_recentes=True):
+        """
+        Mensagens de um chat com id maior que apos_id (ainda não resumidas), em ordem cronológica
+        mais_recentes=True traz as N últimas; False traz as N mais antigas
+        """
+        query = self.supabase.table('mensagens')\
+            .select('id, role, conteudo')\
+            .eq('chat_id', chat_id)
+        
+        if apos_id is not None:
+            query = query.gt('id', apos_id)
+        
+        result = query.order('id', desc=mais_recentes).limit(n).execute()
+        
+        if not result.data:
+            return []
+        return list(reversed(result.data)) if mais_recentes else result.data
+
     def listar_projetos_por_usuario(self, usuario_id):
         """
         Lista projetos de um usuário (via tabela de associação)
@@ -652,8 +785,12 @@ class SupabaseDAO:
 
 
 
-    def listar_orientados_por_orientador(self, orientador_id):
-        """ Lista todos os orientados de um orientador """
+    def listar_orientados_por_orientador(self, orientador_id, incluir_chats=True):
+        """
+        Lista todos os orientados de um orientador
+        Usuários e chats são buscados em lote (.in_) e agrupados em memória;
+        incluir_chats=False pula a consulta de chats (ex.: prompt do chat)
+        """
         logger.debug(f"📋 Buscando orientados do orientador {orientador_id}")
     
         try:
@@ -678,17 +815,33 @@ class SupabaseDAO:
             if not participantes_result.data:
                 return [] #retorna lista vazia se nao tiver dados
         
-            participante_ids = list(set([row['participante_id'] for row in participantes_result.data])) #pega os ids dos participantes, usando set() para evitar duplicatas, pois um participante pode estar em varios projetos do mesmo orientador
+            participante_ids = list(dict.fromkeys(row['participante_id'] for row in participantes_result.data)) #pega os ids dos participantes sem duplicatas, pois um participante pode estar em varios projetos do mesmo orientador
+        
+            # Busca dados completos de todos os participantes de uma vez
+            usuarios_result = self.supabase.table('usuarios')\
+                .select('*')\
+                .in_('id', participante_ids)\
+                .execute() #equivale a SELECT * FROM usuarios WHERE id IN participante_ids
+            usuarios = {row['id']: self._row_to_usuario(row) for row in usuarios_result.data or []}
+        
+            # Busca os chats de todos eles de uma vez e agrupa por usuário
+            chats_por_usuario = {}
+            if incluir_chats:
+                chats_result = self.supabase.table('chats')\
+                    .select('*')\
+                    .in_('usuario_id', participante_ids)\
+                    .order('data_criacao', desc=True)\
+                    .execute() #equivale a SELECT * FROM chats WHERE usuario_id IN participante_ids ORDER BY data_criacao DESC
+                for row in chats_result.data or []:
+                    chats_por_usuario.setdefault(row['usuario_id'], []).append(self._row_to_chat(row))
         
-            # Busca dados completos dos participantes
             orientados = []
             for participante_id in participante_ids:
-                usuario = self.buscar_usuario_por_id(participante_id) #busca o usuario pelo id do participante
+                usuario = usuarios.get(participante_id)
                 if usuario:
-                    # Adiciona chats
-                    chats = self.listar_chats_por_usuario(participante_id)
                     orientado_data = usuario.to_dict()  #converte o usuario para dicionario
-                    orientado_data['chats'] = [c.to_dict() for c in chats] #adiciona os chats do usuario ao dicionario
+                    if incluir_chats:
+                        orientado_data['chats'] = [c.to_dict() for c in chats_por_usuario.get(participante_id, [])] #adiciona os chats do usuario ao dicionario
                     orientados.append(orientado_data) #adiciona o dicionario do orientado na lista de orientados
         
             logger.info(f"✅ {len(orientados)} orientados encontrados")
@@ -906,28 +1059,44 @@ class SupabaseDAO:
         return [self._row_to_projeto(row) for row in result.data] if result.data else []
 
 
+    def listar_participantes_por_projetos(self, projeto_ids):
+        """
+        Participantes de vários projetos em 2 consultas (vínculos + usuários)
+        Retorna {projeto_id: [Usuario, ...]}
+        """
+        participantes_por_projeto = {pid: [] for pid in projeto_ids}
+        if not projeto_ids:
+            return participantes_por_projeto
+
+        result = self.supabase.table('participantes_projetos')\
+            .select('projeto_id, participante_id')\
+            .in_('projeto_id', list(projeto_ids))\
+            .execute() #equivale a SELECT projeto_id, participante_id FROM participantes_projetos WHERE projeto_id IN projeto_ids
+
+        if not result.data:
+            return participantes_por_projeto
+
+        participante_ids = list(dict.fromkeys(row['participante_id'] for row in result.data))
+
+        usuarios_result = self.supabase.table('usuarios')\
+            .select('*')\
+            .in_('id', participante_ids)\
+            .execute() #equivale a SELECT * FROM usuarios WHERE id IN participante_ids
+        usuarios = {row['id']: self._row_to_usuario(row) for row in usuarios_result.data or []}
+
+        for row in result.data:
+            usuario = usuarios.get(row['participante_id'])
+            if usuario:
+                participantes_por_projeto.setdefault(row['projeto_id'], []).append(usuario)
+
+        return participantes_por_projeto
+
     def listar_participantes_por_projeto(self, projeto_id):
         """ Lista participantes associados a um projeto """
         logger.debug(f"👥 Buscando participantes do projeto {projeto_id}")
 
         try:
-            # Busca IDs dos participantes
-            result = self.supabase.table('participantes_projetos')\
-                .select('participante_id')\
-                .eq('projeto_id', projeto_id)\
-                .execute()
-
-            if not result.data:
-                return []
-
-            participante_ids = [row['participante_id'] for row in result.data]
-
-            # Busca dados completos dos participantes
-            participantes = []
-            for pid in participante_ids:
-                usuario = self.buscar_usuario_por_id(pid)
-                if usuario:
-                    participantes.append(usuario)
+            participantes = self.listar_participantes_por_projetos([projeto_id]).get(projeto_id, [])
 
             logger.info(f"✅ {len(participantes)} participantes encontrados")
             return participantes
@@ -999,6 +1168,7 @@ class SupabaseDAO:
             result = self.supabase.table('orientadores_projetos')\
                 .insert(data)\
                 .execute()
+            self._nova_versao_contexto(orientador_id)
 
             log_database_operation('INSERT', 'orientadores_projetos', data, 'Success')
             logger.info("✅ Orientação criada")
@@ -1020,6 +1190,7 @@ class SupabaseDAO:
                 .eq('orientador_id', orientador_id)\
                 .eq('projeto_id', projeto_id)\
                 .execute()
+            self._nova_versao_contexto(orientador_id)
 
             log_database_operation('DELETE', 'orientadores_projetos', {'orientador': orientador_id, 'projeto': projeto_id}, 'Success')
             logger.info("✅ Orientação removida")
@@ -1031,66 +1202,124 @@ class SupabaseDAO:
             raise
 
 
+    def _selecionar_todos(self, tabela, colunas, ordem, coluna_in=None, valores=None):
+        """
+        SELECT paginado com .range(): o PostgREST corta cada resposta em SUPABASE_PAGINA linhas
+        Com coluna_in/valores filtra por .in_(), em lotes de SUPABASE_LOTE_IN ids
+        """
+        if coluna_in is None:
+            lotes = [None]
+        else:
+            valores = sorted(set(valores))
+            lotes = [valores[i:i + Config.SUPABASE_LOTE_IN] for i in range(0, len(valores), Config.SUPABASE_LOTE_IN)]
+
+        pagina = Config.SUPABASE_PAGINA
+        linhas = []
+        for lote in lotes:
+            inicio = 0
+            while True:
+                query = self.supabase.table(tabela).select(colunas)
+                if lote is not None:
+                    query = query.in_(coluna_in, lote)
+                for coluna in ordem: # ordem estável, senão as páginas podem repetir/pular linhas
+                    query = query.order(coluna)
+                result = query.range(inicio, inicio + pagina - 1).execute()
+
+                linhas.extend(result.data or [])
+                if len(result.data or []) < pagina:
+                    break
+                inicio += pagina
+        return linhas
+
     def listar_orientacoes_completas(self):
-        """ Lista todas orientações com dados completos """
+        """
+        Lista todas orientações com dados completos
+        Busca as orientações e depois só os participantes, usuários e projetos citados nelas
+        (.in_() com os ids da etapa anterior), juntando os dados em memória em vez de
+        consultas por orientação/participante
+        """
         logger.debug("📋 Listando orientações completas")
 
         try:
             # Busca todas as orientações
-            result = self.supabase.table('orientadores_projetos')\
-                .select('orientador_id, projeto_id')\
-                .execute()
+            result = self._selecionar_todos('orientadores_projetos', 'orientador_id, projeto_id',
+                                            ordem=('orientador_id', 'projeto_id'))
 
-            if not result.data:
+            if not result:
                 return []
 
+            projeto_ids = {row['projeto_id'] for row in result}
+            orientador_ids = {row['orientador_id'] for row in result}
+
+            # Participantes só dos projetos orientados
+            participacoes = self._selecionar_todos('participantes_projetos', 'projeto_id, participante_id',
+                                                   ordem=('projeto_id', 'participante_id'),
+                                                   coluna_in='projeto_id', valores=projeto_ids)
+
+            participantes_por_projeto = {}
+            for row in participacoes:
+                participantes_por_projeto.setdefault(row['projeto_id'], []).append(row['participante_id'])
+
+            # Orientadores e participantes numa única busca de usuários (só as colunas usadas)
+            usuario_ids = orientador_ids | {row['participante_id'] for row in participacoes}
+            usuarios = self._selecionar_todos('usuarios', 'id, nome_completo, email, numero_inscricao',
+                                              ordem=('id',), coluna_in='id', valores=usuario_ids)
+            usuarios = {row['id']: row for row in usuarios}
+
+            projetos = self._selecionar_todos('projetos', 'id, nome, categoria',
+                                              ordem=('id',), coluna_in='id', valores=projeto_ids)
+            projetos = {row['id']: row for row in projetos}
+
             orientacoes = []
 
-            for row in result.data:
+            for row in result:
                 orientador_id = row['orientador_id']
                 projeto_id = row['projeto_id']
 
-                # Busca dados do orientador
-                orientador = self.buscar_usuario_por_id(orientador_id)
+                # Dados do orientador
+                orientador = usuarios.get(orientador_id)
                 if not orientador:
                     continue
                     
-                # Busca dados do projeto
-                projeto = self.buscar_projeto_por_id(projeto_id)
+                # Dados do projeto
+                projeto = projetos.get(projeto_id)
                 if not projeto:
                     continue
                     
-                # Busca participantes do projeto
-                participantes = self.listar_participantes_por_projeto(projeto_id)
+                # Participantes do projeto
+                participantes = [
+                    usuarios[pid] for pid in participantes_por_projeto.get(projeto_id, [])
+                    if pid in usuarios
+                ]
                 
-            # Para cada participante, cria uma entrada
+                # Para cada participante, cria uma entrada
                 if participantes:
                     for participante in participantes:
                         orientacoes.append({
-                            'id': f"{orientador_id}-{projeto_id}-{participante.id}",
+                            'id': f"{orientador_id}-{projeto_id}-{participante['id']}",
                             'orientador_id': orientador_id,
-                            'orientador_nome': orientador.nome_completo,
-                            'orientador_email': orientador.email,
-                            'participante_id': participante.id,
-                            'participante_nome': participante.nome_completo,
-                            'participante_bp': participante.numero_inscricao,
+                            'orientador_nome': orientador['nome_completo'],
+                            'orientador_email': orientador['email'],
+                            'participante_id': participante['id'],
+                            'participante_nome': participante['nome_completo'],
+                            'participante_bp': participante['numero_inscricao'],
                             'projeto_id': projeto_id,
-                            'projeto_nome': projeto.nome,
-                            'projeto_categoria': projeto.categoria
+                            'projeto_nome': projeto['nome'],
+                            'projeto_categoria': projeto['categoria']
                         })
                 else:
                     # Projeto sem participantes ainda
                     orientacoes.append({
                         'id': f"{orientador_id}-{projeto_id}",
                         'orientador_id': orientador_id,
-                        'orientador_nome': orientador.nome_completo,
-                        'orientador_email': orientador.email,
+                        'orientador_nome': orientador['nome_completo'],
+                        'orientador_email': orientador['email'],
                         'participante_id': None,
                         'participante_nome': '(Sem participantes)',
                         'participante_bp': '-',
                         'projeto_id': projeto_id,
-                        'projeto_nome': projeto.nome,
-                        'projeto_categoria': projeto.categoria
+                        'projeto_nome': projeto['nome'],
+                        'projeto_categoria': projeto['categoria']
                     })
 
             logger.info(f"✅ {len(orientacoes)} orientações encontradas")
@@ -1116,13 +1345,14 @@ class SupabaseDAO:
 
             projeto_ids = [row['projeto_id'] for row in result.data] #pega os ids dos projetos
 
-            projetos = [] #cria uma lista vazia de projetos
-            for pid in projeto_ids: #para cada id de projeto
-                projeto = self.buscar_projeto_por_id(pid) #busca o projeto pelo id
-                if projeto: #se tiver projeto
-                    projetos.append(projeto) #adiciona o projeto na lista
+            # Busca todos os projetos de uma vez, mantendo a ordem das orientações
+            projetos_result = self.supabase.table('projetos')\
+                .select('*')\
+                .in_('id', projeto_ids)\
+                .execute() #equivale a SELECT * FROM projetos WHERE id IN projeto_ids
+            projetos = {row['id']: self._row_to_projeto(row) for row in projetos_result.data or []}
 
-            return projetos #retorna a lista de projetos
+            return [projetos[pid] for pid in projeto_ids if pid in projetos] #retorna a lista de projetos
 
         except Exception as e:
             logger.error(f"❌ Erro ao buscar projetos: {e}")
@@ -1177,4 +1407,18 @@ class SupabaseDAO:
             .eq('nome', nome)\
             .execute()
         
-        return result.data[0]['id'] if result.data else None
\ No newline at end of file
+        return result.data[0]['id'] if result.data else None
+
+
+# Instância global
+_dao = None
+_dao_lock = Lock()
+
+def get_dao():
+    """Retorna o SupabaseDAO global (compartilhado por controllers, app e sessão)"""
+    global _dao
+    if _dao is None:
+        with _dao_lock:
+            if _dao is None:
+                _dao = SupabaseDAO()
+    return _dao
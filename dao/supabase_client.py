@@ -0,0 +1,53 @@
+"""
+Cliente Supabase compartilhado pelo processo
+Um único create_client com pool de conexões HTTP keep-alive (httpx),
+em vez de um cliente (e uma sessão HTTP) por instância de DAO
+"""
+
+import httpx
+from threading import Lock
+from supabase import create_client, Client, ClientOptions
+from config import Config
+from utils.advanced_logger import logger
+
+
+_client = None
+_client_lock = Lock()
+
+
+def _criar_http_client():
+    """Pool HTTP usado pelo PostgREST (keep-alive entre requisições)"""
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=Config.SUPABASE_POOL_SIZE,
+            max_keepalive_connections=Config.SUPABASE_POOL_KEEPALIVE,
+            keepalive_expiry=Config.SUPABASE_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(Config.SUPABASE_TIMEOUT, connect=Config.SUPABASE_CONNECT_TIMEOUT)
+    )
+
+
+def criar_supabase_client():
+    """Cria um cliente Supabase com pool de conexões configurado"""
+    try:
+        options = ClientOptions(
+            postgrest_client_timeout=Config.SUPABASE_TIMEOUT,
+            httpx_client=_criar_http_client()
+        )
+    except TypeError:
+        # Versões do supabase-py sem httpx_client: ao menos o timeout é respeitado
+        logger.warning("⚠️ supabase-py sem suporte a httpx_client - usando pool padrão")
+        options = ClientOptions(postgrest_client_timeout=Config.SUPABASE_TIMEOUT)
+
+    return create_client(Config.SUPABASE_URL, Config.SUPABASE_KEY, options=options)
+
+
+def get_supabase_client() -> Client:
+    """Retorna o cliente Supabase global, criando na primeira chamada"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = criar_supabase_client()
+                logger.info(f"🔌 Cliente Supabase criado (pool: {Config.SUPABASE_POOL_SIZE} conexões, timeout: {Config.SUPABASE_TIMEOUT}s)")
+    return _client
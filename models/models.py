@@ -160,7 +160,7 @@ class ArquivoChat:
     def __init__(self, id, chat_id, nome_arquivo, url_arquivo, 
                  tipo_arquivo=None, tamanho_bytes=None, data_upload=None,
                  mensagem_id=None, gemini_file_uri=None, 
-                 gemini_file_name=None, gemini_expiration=None):
+                 gemini_file_name=None, gemini_expiration=None, hash_conteudo=None):
         self.id = id
         self.chat_id = chat_id
         self.nome_arquivo = nome_arquivo
@@ -172,6 +172,7 @@ class ArquivoChat:
         self.gemini_file_uri = gemini_file_uri      
         self.gemini_file_name = gemini_file_name    
         self.gemini_expiration = gemini_expiration  
+        self.hash_conteudo = hash_conteudo
     
     def to_dict(self):
         return {
@@ -185,7 +186,8 @@ class ArquivoChat:
             'mensagem_id': self.mensagem_id,
             'gemini_file_uri': self.gemini_file_uri,
             'gemini_file_name': self.gemini_file_name,
-            'gemini_expiration': self.gemini_expiration.isoformat() if isinstance(self.gemini_expiration, datetime) else self.gemini_expiration
+            'gemini_expiration': self.gemini_expiration.isoformat() if isinstance(self.gemini_expiration, datetime) else self.gemini_expiration,
+            'hash_conteudo': self.hash_conteudo
         }
     
     def get_formatted_size(self):
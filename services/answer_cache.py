@@ -0,0 +1,389 @@
+"""
+Cache de respostas por similaridade para as perguntas frequentes do chat
+Prazos, categorias, o que os avaliadores valorizam, como escrever o resumo... chegam a toda hora
+com palavras um pouco diferentes. Perguntas genéricas (sem "meu projeto", sem depender da conversa)
+e suas respostas ficam num SQLite compartilhado entre os workers, separadas por tipo de usuário e
+Modo Bragantec; uma pergunta parecida o bastante (TF-IDF + cosseno) é respondida na hora, sem cota.
+Entradas vencem após RESPOSTAS_CACHE_TTL; as fixadas por um admin não vencem
+"""
+
+import os
+import re
+import json
+import math
+import time
+import sqlite3
+import threading
+from collections import Counter
+from config import Config
+from utils.advanced_logger import logger
+from services.bragantec_retriever import tokenizar, normalizar_texto
+
+
+# Perguntas sobre o próprio aluno/projeto: a resposta não serve para outra pessoa
+_PESSOAIS = {
+    'meu', 'minha', 'meus', 'minhas', 'nosso', 'nossa', 'nossos', 'nossas', 'comigo', 'mim'
+}
+
+# Em conversas já começadas, estas palavras apontam para o que veio antes
+_CONTINUACAO = (
+    'isso', 'isto', 'esse', 'essa', 'acima', 'anterior', 'continue', 'continua', 'reescrev',
+    'refac', 'refaz', 'corrij', 'corrig', 'detalh', 'aprofund', 'outro', 'outra', 'tambem'
+)
+
+
+def escopo_de(tipo_usuario, bragantec):
+    """Respostas só são compartilhadas entre usuários do mesmo tipo e no mesmo modo"""
+    return f"{tipo_usuario}|{'bragantec' if bragantec else 'geral'}"
+
+
+# Resposta ajustada ao projeto de quem perguntou ("no seu projeto de hidroponia...")
+_PERSONALIZADA = re.compile(r"\b(seu|sua|seus|suas|teu|tua) (projeto|pesquisa|trabalho|experimento|orientad|grupo|equipe)")
+
+# Perguntas: o pronome interrogativo diz o que se quer saber ("quando" x "onde" é a feira)
+_INTERROGATIVOS = {'quando', 'onde', 'quanto', 'quantos', 'quantas', 'qual', 'quais', 'como', 'quem', 'porque'}
+
+# Palavras de pergunta que não mudam o assunto
+_VAZIAS = {'vai', 'vou', 'posso', 'podemos', 'devo', 'preciso', 'existe', 'existem', 'ha', 'fazer', 'feito', 'num', 'numa'}
+
+# Negação e contraste invertem a pergunta ("como NÃO escrever" != "como escrever"): viram termos e precisam casar
+_NEGACOES = {'nao', 'sem', 'nunca', 'nem', 'jamais', 'nenhum', 'nenhuma', 'nada', 'exceto', 'salvo', 'fora', 'evitar', 'proibido'}
+
+# Mesmos assuntos com outras palavras (radicais de 5 letras)
+_SINONIMOS = {'jurad': 'avali', 'banca': 'avali', 'area': 'categ', 'areas': 'categ'}
+
+
+def termos_da_pergunta(pergunta):
+    """
+    Radicais de 5 letras (inscrição ~ inscrever) sem stopwords, negações como "!nao", o interrogativo
+    e pares de radicais vizinhos sem ordem (bom resumo ~ resumo bom, mas prazo+inscrição != prazo+entrega)
+    """
+    palavras = re.findall(r'[a-z0-9]+', normalizar_texto(pergunta))
+    interrogativos = ['?' + p.rstrip('s') for p in palavras if p in _INTERROGATIVOS]
+    radicais = []
+    for palavra in palavras:
+        if palavra in _NEGACOES:
+            radicais.append('!' + palavra)
+        else:
+            radicais.extend(t[:5] for t in tokenizar(palavra) if t not in _VAZIAS)
+    radicais = [_SINONIMOS.get(r, r) for r in radicais]
+    pares = ['+'.join(sorted(par)) for par in zip(radicais, radicais[1:])]
+    return radicais + pares + interrogativos[:1]
+
+
+def negacoes_da_pergunta(pergunta):
+    """Negações e contrastes da pergunta (as duas perguntas precisam ter as mesmas para casar)"""
+    return frozenset(p for p in re.findall(r'[a-z0-9]+', normalizar_texto(pergunta)) if p in _NEGACOES)
+
+
+def pergunta_reutilizavel(pergunta, tem_historico=False):
+    """Pergunta genérica o bastante para a resposta servir a qualquer um do mesmo escopo"""
+    palavras = re.findall(r'[a-z0-9]+', normalizar_texto(pergunta))
+    if not 3 <= len(palavras) <= Config.RESPOSTAS_CACHE_MAX_PALAVRAS:
+        return False
+    if any(p in _PESSOAIS for p in palavras):
+        return False
+    if tem_historico and any(p.startswith(c) for p in palavras for c in _CONTINUACAO):
+        return False
+    return len([t for t in tokenizar(pergunta) if t not in _VAZIAS]) >= 2
+
+
+def _cita(texto, termos_privados):
+    """A resposta menciona algo do usuário (apelido, nomes, projetos)? Palavra inteira: "Ana" não casa com "análise" """
+    texto = normalizar_texto(texto)
+    if _PERSONALIZADA.search(texto):
+        return True
+    return any(
+        re.search(rf"(?<![a-z0-9]){re.escape(normalizar_texto(t).strip())}(?![a-z0-9])", texto)
+        for t in termos_privados if t and len(t.strip()) >= 3
+    )
+
+
+class _Indice:
+    """TF-IDF das perguntas guardadas de um escopo"""
+
+    def __init__(self, linhas):
+        self.df = Counter()
+        documentos = []
+        for id_, pergunta, termos, fixada in linhas:
+            tf = Counter(json.loads(termos))
+            self.df.update(tf.keys())
+            documentos.append((id_, negacoes_da_pergunta(pergunta), tf, fixada))
+        self.n = len(documentos)
+        self.entradas = [(id_, negacoes, *self._vetor(tf), fixada) for id_, negacoes, tf, fixada in documentos]
+
+    def _idf(self, termo):
+        return math.log((self.n + 1) / (self.df.get(termo, 0) + 1)) + 1
+
+    def _vetor(self, tf):
+        vetor = {t: (1 + math.log(c)) * self._idf(t) for t, c in tf.items()}
+        return vetor, math.sqrt(sum(v * v for v in vetor.values())) or 1.0
+
+    def mais_parecida(self, termos, negacoes=frozenset()):
+        """(id, similaridade, fixada) da pergunta mais parecida com as mesmas negações, ou None"""
+        if not self.entradas or not termos:
+            return None
+        consulta, norma = self._vetor(Counter(termos))
+        melhor = None
+        for id_, negacoes_doc, vetor, norma_doc, fixada in self.entradas:
+            if negacoes_doc != negacoes:
+                continue
+            produto = sum(peso * vetor[t] for t, peso in consulta.items() if t in vetor)
+            if produto:
+                similaridade = produto / (norma * norma_doc)
+                if melhor is None or similaridade > melhor[1]:
+                    melhor = (id_, similaridade, fixada)
+        return melhor
+
+
+class AnswerCache:
+    """Perguntas e respostas por escopo num SQLite compartilhado + índice TF-IDF em memória por processo"""
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho or Config.RESPOSTAS_CACHE_DB_PATH
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._indices = {}       # escopo -> _Indice
+        self._versao = None      # versão do banco quando os índices foram montados
+
+        self.stats = {
+            'consultas': 0, 'hits': 0, 'hits_fixadas': 0, 'guardadas': 0,
+            'nao_reutilizaveis': 0, 'recusadas_privadas': 0, 'tokens_economizados': 0
+        }
+
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+        conn = self._conexao()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS respostas (
+                id INTEGER PRIMARY KEY,
+                escopo TEXT NOT NULL,
+                pergunta TEXT NOT NULL,
+                pergunta_norm TEXT NOT NULL,
+                termos TEXT NOT NULL,
+                resposta TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                expira_em REAL NOT NULL,
+                fixada INTEGER NOT NULL DEFAULT 0,
+                hits INTEGER NOT NULL DEFAULT 0,
+                ultimo_hit REAL,
+                UNIQUE (escopo, pergunta_norm)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_respostas_escopo ON respostas (escopo, expira_em)")
+        conn.execute("CREATE TABLE IF NOT EXISTS versao (id INTEGER PRIMARY KEY CHECK (id = 1), valor INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO versao (id, valor) VALUES (1, 0)")
+
+    def _conexao(self):
+        """Uma conexão por thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=Config.QUOTA_SQLITE_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transacao(self, func):
+        """Escrita + versão nova (os outros workers remontam os índices na próxima busca)"""
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            resultado = func(conn)
+            conn.execute("UPDATE versao SET valor = valor + 1 WHERE id = 1")
+            conn.execute("COMMIT")
+            return resultado
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _contar(self, chave, n=1):
+        with self._lock:
+            self.stats[chave] += n
+
+    def _indice(self, escopo):
+        versao = self._conexao().execute("SELECT valor FROM versao WHERE id = 1").fetchone()[0]
+        with self._lock:
+            if versao != self._versao:
+                self._indices = {}
+                self._versao = versao
+            indice = self._indices.get(escopo)
+        if indice is None:
+            linhas = self._conexao().execute(
+                "SELECT id, pergunta, termos, fixada FROM respostas WHERE escopo = ? AND (fixada = 1 OR expira_em > ?)",
+                (escopo, time.time())
+            ).fetchall()
+            indice = _Indice(linhas)
+            with self._lock:
+                if self._versao == versao:
+                    self._indices[escopo] = indice
+        return indice
+
+    # ------------------------------------------------------------------
+    # Chat
+    # ------------------------------------------------------------------
+
+    def buscar(self, pergunta, tipo_usuario, bragantec, tem_historico=False):
+        """
+        Resposta guardada para uma pergunta parecida o bastante (dict no formato de gemini.chat, com do_cache=True)
+        ou None. Só consulta perguntas reutilizáveis
+        """
+        if not Config.RESPOSTAS_CACHE or not pergunta_reutilizavel(pergunta, tem_historico):
+            return None
+        self._contar('consultas')
+
+        escopo = escopo_de(tipo_usuario, bragantec)
+        achada = self._indice(escopo).mais_parecida(termos_da_pergunta(pergunta), negacoes_da_pergunta(pergunta))
+        if achada is None:
+            return None
+
+        id_, similaridade, fixada = achada
+        minimo = Config.RESPOSTAS_CACHE_SIMILARIDADE_FIXADA if fixada else Config.RESPOSTAS_CACHE_SIMILARIDADE
+        if similaridade < minimo:
+            return None
+
+        conn = self._conexao()
+        row = conn.execute(
+            "SELECT pergunta, resposta FROM respostas WHERE id = ? AND (fixada = 1 OR expira_em > ?)",
+            (id_, time.time())
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE respostas SET hits = hits + 1, ultimo_hit = ? WHERE id = ?", (time.time(), id_))
+
+        guardada = json.loads(row[1])
+        self._contar('hits')
+        if fixada:
+            self._contar('hits_fixadas')
+        self._contar('tokens_economizados', guardada.get('total_tokens', 0))
+        logger.info(f"⚡ Pergunta frequente respondida do cache ({similaridade:.2f} com \"{row[0][:60]}\")")
+
+        return {
+            'response': guardada['response'],
+            'thinking_process': None,
+            'search_used': guardada.get('search_used', False),
+            'code_executed': False,
+            'code_results': None,
+            'tokens_input': 0,
+            'tokens_output': 0,
+            'total_tokens': 0,
+            'do_cache': True
+        }
+
+    def guardar(self, pergunta, response, tipo_usuario, bragantec, tem_historico=False, termos_privados=()):
+        """
+        Guarda a resposta de uma pergunta reutilizável (se ela não citar nada do usuário)
+        Retorna True se guardou
+        """
+        if not Config.RESPOSTAS_CACHE or response.get('error') or response.get('do_cache') or response.get('code_executed'):
+            return False
+        if not pergunta_reutilizavel(pergunta, tem_historico):
+            self._contar('nao_reutilizaveis')
+            return False
+        if _cita(response.get('response') or '', termos_privados):
+            self._contar('recusadas_privadas')
+            logger.debug("🔒 Resposta cita dados do usuário: fora do cache de perguntas frequentes")
+            return False
+
+        self._gravar(escopo_de(tipo_usuario, bragantec), pergunta, {
+            'response': response['response'],
+            'search_used': response.get('search_used', False),
+            'total_tokens': response.get('total_tokens', 0)
+        })
+        self._contar('guardadas')
+        return True
+
+    def _gravar(self, escopo, pergunta, dados, fixada=False):
+        agora = time.time()
+        termos = termos_da_pergunta(pergunta)
+
+        def gravar(conn):
+            # Entradas fixadas só mudam pelo admin
+            conn.execute(
+                "INSERT INTO respostas (escopo, pergunta, pergunta_norm, termos, resposta, criado_em, expira_em, fixada) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (escopo, pergunta_norm) DO UPDATE SET pergunta = excluded.pergunta, "
+                "resposta = excluded.resposta, criado_em = excluded.criado_em, expira_em = excluded.expira_em, "
+                "fixada = excluded.fixada WHERE respostas.fixada = 0 OR excluded.fixada = 1",
+                (escopo, pergunta.strip(), ' '.join(termos), json.dumps(termos), json.dumps(dados, ensure_ascii=False),
+                 agora, agora + Config.RESPOSTAS_CACHE_TTL, int(fixada))
+            )
+            conn.execute("DELETE FROM respostas WHERE fixada = 0 AND expira_em <= ?", (agora,))
+            # Acima do limite, saem as não fixadas menos usadas
+            conn.execute(
+                "DELETE FROM respostas WHERE id IN (SELECT id FROM respostas WHERE escopo = ? AND fixada = 0 "
+                "ORDER BY hits DESC, criado_em DESC LIMIT -1 OFFSET ?)",
+                (escopo, Config.RESPOSTAS_CACHE_MAX)
+            )
+
+        self._transacao(gravar)
+
+    # ------------------------------------------------------------------
+    # Curadoria (admin)
+    # ------------------------------------------------------------------
+
+    def listar(self, limite=200):
+        """Entradas válidas, fixadas primeiro e depois as mais usadas"""
+        agora = time.time()
+        rows = self._conexao().execute(
+            "SELECT id, escopo, pergunta, resposta, criado_em, expira_em, fixada, hits, ultimo_hit FROM respostas "
+            "WHERE fixada = 1 OR expira_em > ? ORDER BY fixada DESC, hits DESC, criado_em DESC LIMIT ?",
+            (agora, limite)
+        ).fetchall()
+        entradas = []
+        for id_, escopo, pergunta, resposta, criado_em, expira_em, fixada, hits, ultimo_hit in rows:
+            tipo_usuario, modo = escopo.split('|')
+            entradas.append({
+                'id': id_, 'tipo_usuario': tipo_usuario, 'bragantec': modo == 'bragantec',
+                'pergunta': pergunta, 'resposta': json.loads(resposta)['response'],
+                'criado_em': criado_em, 'vence_em_h': None if fixada else round((expira_em - agora) / 3600, 1),
+                'fixada': bool(fixada), 'hits': hits, 'ultimo_hit': ultimo_hit
+            })
+        return entradas
+
+    def fixar(self, id_, fixada=True):
+        """Fixa (não vence, limiar de similaridade menor) ou desafixa (volta a vencer após o TTL)"""
+        agora = time.time()
+        return self._transacao(lambda conn: conn.execute(
+            "UPDATE respostas SET fixada = ?, expira_em = ? WHERE id = ?",
+            (int(fixada), agora + Config.RESPOSTAS_CACHE_TTL, id_)
+        ).rowcount) > 0
+
+    def remover(self, id_):
+        return self._transacao(lambda conn: conn.execute("DELETE FROM respostas WHERE id = ?", (id_,)).rowcount) > 0
+
+    def criar_fixada(self, pergunta, resposta, tipo_usuario, bragantec):
+        """Pergunta e resposta escritas pelo admin (já fixadas)"""
+        if not pergunta_reutilizavel(pergunta):
+            raise ValueError("Pergunta curta demais para ser reconhecida")
+        self._gravar(escopo_de(tipo_usuario, bragantec), pergunta, {'response': resposta.strip()}, fixada=True)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        contagem = self._conexao().execute(
+            "SELECT COUNT(*), COALESCE(SUM(fixada), 0) FROM respostas WHERE fixada = 1 OR expira_em > ?",
+            (time.time(),)
+        ).fetchone()
+        return dict(
+            stats,
+            entradas=contagem[0],
+            fixadas=contagem[1],
+            taxa_acerto_percent=round(100 * stats['hits'] / stats['consultas'], 1) if stats['consultas'] else None
+        )
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """Retorna o cache de respostas global, criando na primeira chamada"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache()
+    return _cache
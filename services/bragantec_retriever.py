@@ -0,0 +1,275 @@
+"""
+Índice de busca local sobre os cadernos de resumos da Bragantec
+Divide os arquivos de context_files/ em resumos de projetos e indexa com BM25,
+para que o Modo Bragantec envie só os trechos relevantes em vez do corpus inteiro
+"""
+
+import os
+import re
+import math
+import unicodedata
+from collections import defaultdict, Counter
+from threading import Lock
+from config import Config
+from utils.advanced_logger import logger
+
+
+# Palavras muito comuns em português que não ajudam na busca
+STOPWORDS = {
+    'que', 'para', 'com', 'uma', 'por', 'como', 'mais', 'dos', 'das', 'nos', 'nas',
+    'foi', 'ser', 'sao', 'sua', 'seu', 'suas', 'seus', 'este', 'esta', 'esse', 'essa',
+    'isso', 'isto', 'entre', 'sobre', 'pela', 'pelo', 'pelas', 'pelos', 'tem', 'ter',
+    'nao', 'sim', 'mas', 'sem', 'tambem', 'quando', 'onde', 'qual', 'quais', 'muito',
+    'ou', 'ao', 'aos', 'de', 'da', 'do', 'em', 'um', 'os', 'as', 'se', 'na', 'no',
+    'voce', 'vc', 'me', 'meu', 'minha', 'eu', 'ele', 'ela', 'eles', 'elas', 'lhe',
+    'pode', 'podem', 'ja', 'ainda', 'ate', 'apos', 'cada', 'outro', 'outra', 'outros',
+    'the', 'and', 'of', 'sendo', 'foram', 'sera', 'serao', 'assim', 'desta',
+    'deste', 'dessa', 'desse', 'neste', 'nesta', 'atraves', 'partir', 'forma', 'bem'
+}
+
+# Início de um resumo ("RESUMO.", "RESUMO:", "Resumo", "Resumo:"), sem pegar "Resumos da..."
+_RE_INICIO_RESUMO = re.compile(r'^\s*(RESUMO|Resumo)\b(?!s)')
+
+# Linhas de ruído: rodapés, números de página, sumário
+_RE_RUIDO = re.compile(
+    r'^\s*(Resumos da BRAGANTEC.*|RESUMOS da .*BRAGANTEC.*|©.*copyright.*|'
+    r'\d+º Feira de Ciência.*|\d{1,2}-\d{1,2} de setembro de \d{4}.*|\d{1,3}|.*\.{6,}.*)\s*$'
+)
+
+_RE_PALAVRAS_CHAVE = re.compile(r'^\s*Palavras[- ]chave', re.IGNORECASE)
+
+
+def normalizar_texto(texto):
+    """
+    Remove acentos e converte para minúsculas
+    """
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return texto.lower()
+
+
+def tokenizar(texto):
+    """
+    Quebra o texto em termos para o índice (sem acento, sem stopwords, plural simples)
+    """
+    termos = []
+    for termo in re.findall(r'[a-z0-9]+', normalizar_texto(texto)):
+        if len(termo) < 3 and not termo.isdigit():
+            continue
+        if termo in STOPWORDS:
+            continue
+        # "Stemming" bem simples: projetos -> projeto, sensores -> sensore
+        if len(termo) > 4 and termo.endswith('s'):
+            termo = termo[:-1]
+        termos.append(termo)
+    return termos
+
+
+class ResumoBragantec:
+    """Um resumo de projeto extraído de um caderno da Bragantec"""
+
+    def __init__(self, id, ano, titulo, texto, arquivo):
+        self.id = id
+        self.ano = ano
+        self.titulo = titulo
+        self.texto = texto
+        self.arquivo = arquivo
+
+    def formatar(self, max_chars=None):
+        texto = self.texto
+        if max_chars and len(texto) > max_chars:
+            texto = texto[:max_chars].rsplit(' ', 1)[0] + '...'
+        return f"[Bragantec {self.ano or '?'}] {self.titulo}\n{texto}"
+
+
+class BragantecRetriever:
+    """
+    Índice invertido BM25 sobre os resumos da Bragantec
+    """
+
+    def __init__(self, context_path=None, k1=1.5, b=0.75):
+        self.context_path = context_path or Config.CONTEXT_FILES_PATH
+        self.k1 = k1
+        self.b = b
+
+        self.resumos = []                 # [ResumoBragantec]
+        self.postings = defaultdict(list) # termo -> [(doc_id, tf)]
+        self.doc_len = []                 # tamanho (em termos) de cada resumo
+        self.idf = {}
+        self.avg_doc_len = 0.0
+        self.total_chars = 0
+
+        self._construir()
+
+    # ------------------------------------------------------------------
+    # Construção do índice
+    # ------------------------------------------------------------------
+
+    def _construir(self):
+        """Carrega os arquivos, divide em resumos e monta o índice"""
+        if not os.path.exists(self.context_path):
+            logger.warning(f"⚠️ Pasta {self.context_path} não existe - índice Bragantec vazio")
+            return
+
+        for filename in sorted(os.listdir(self.context_path)):
+            if not filename.endswith('.txt'):
+                continue
+
+            filepath = os.path.join(self.context_path, filename)
+            try:
+                with open(filepath, 'r', encoding='utf-8') as f:
+                    conteudo = f.read()
+            except Exception as e:
+                logger.error(f"❌ Erro ao carregar {filename}: {e}")
+                continue
+
+            self.total_chars += len(conteudo)
+            ano_match = re.search(r'(20\d{2})', filename)
+            ano = int(ano_match.group(1)) if ano_match else None
+
+            for titulo, texto in self._dividir_em_resumos(conteudo):
+                self.resumos.append(ResumoBragantec(
+                    id=len(self.resumos),
+                    ano=ano,
+                    titulo=titulo,
+                    texto=texto,
+                    arquivo=filename
+                ))
+
+        for resumo in self.resumos:
+            termos = Counter(tokenizar(f"bragantec {resumo.ano or ''} {resumo.titulo}\n{resumo.texto}"))
+            self.doc_len.append(sum(termos.values()))
+            for termo, tf in termos.items():
+                self.postings[termo].append((resumo.id, tf))
+
+        n_docs = len(self.resumos)
+        if n_docs:
+            self.avg_doc_len = sum(self.doc_len) / n_docs
+            for termo, lista in self.postings.items():
+                df = len(lista)
+                self.idf[termo] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+        logger.info(f"📚 Índice Bragantec: {n_docs} resumos, {len(self.postings):,} termos (~{self.total_chars:,} caracteres no corpus)")
+
+    def _dividir_em_resumos(self, conteudo):
+        """
+        Divide um caderno em (título, texto) por projeto.
+        Cada resumo começa no bloco de cabeçalho (título/autores) acima da linha "RESUMO"
+        e vai até o "Palavras-chave" ou até o cabeçalho do próximo resumo.
+        """
+        linhas = ['' if _RE_RUIDO.match(l) else l.rstrip() for l in conteudo.splitlines()]
+
+        ancoras = [i for i, l in enumerate(linhas) if _RE_INICIO_RESUMO.match(l)]
+        if not ancoras:
+            return self._dividir_em_blocos(linhas)
+
+        # Início do cabeçalho de cada resumo
+        inicios = []
+        limite = 0
+        for ancora in ancoras:
+            i = ancora - 1
+            while i >= limite and not linhas[i].strip():
+                i -= 1
+            lidas = 0
+            while i >= limite and linhas[i].strip() and lidas < 12 \
+                    and not _RE_PALAVRAS_CHAVE.match(linhas[i]):
+                i -= 1
+                lidas += 1
+            inicio = i + 1
+            inicios.append(inicio)
+            limite = ancora + 1
+
+        resumos = []
+        for n, inicio in enumerate(inicios):
+            fim = inicios[n + 1] if n + 1 < len(inicios) else len(linhas)
+            ancora = ancoras[n]
+
+            # Corta no "Palavras-chave" (inclusive), se houver
+            for j in range(ancora, fim):
+                if _RE_PALAVRAS_CHAVE.match(linhas[j]):
+                    fim = j + 1
+                    break
+
+            cabecalho = [l.strip() for l in linhas[inicio:ancora] if l.strip()]
+            corpo = ' '.join(l.strip() for l in linhas[ancora:fim] if l.strip())
+            if not corpo:
+                continue
+
+            titulo = cabecalho[0] if cabecalho else corpo[:80]
+            titulo = re.sub(r'^Título\s*:?\s*', '', titulo)
+            texto = '\n'.join(cabecalho[1:] + [corpo]) if cabecalho else corpo
+            resumos.append((titulo, texto))
+
+        return resumos
+
+    def _dividir_em_blocos(self, linhas, tamanho=1500):
+        """Fallback para arquivos sem marcação de resumo: blocos de parágrafos"""
+        blocos = []
+        atual = []
+        chars = 0
+        for linha in linhas:
+            if linha.strip():
+                atual.append(linha.strip())
+                chars += len(linha)
+            if chars >= tamanho and not linha.strip():
+                texto = ' '.join(atual)
+                blocos.append((texto[:80], texto))
+                atual, chars = [], 0
+        if atual:
+            texto = ' '.join(atual)
+            blocos.append((texto[:80], texto))
+        return blocos
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def buscar(self, consulta, top_k=None):
+        """
+        Retorna os top-k resumos mais relevantes para a consulta (BM25)
+        """
+        top_k = top_k or Config.BRAGANTEC_TOP_K
+        termos = set(tokenizar(consulta))
+        if not termos or not self.resumos:
+            return []
+
+        scores = defaultdict(float)
+        for termo in termos:
+            idf = self.idf.get(termo)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[termo]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_len[doc_id] / self.avg_doc_len)
+                scores[doc_id] += idf * (tf * (self.k1 + 1)) / (tf + norm)
+
+        melhores = sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+        return [self.resumos[doc_id] for doc_id, _ in melhores]
+
+    def montar_contexto(self, consulta, top_k=None):
+        """
+        Monta o bloco de contexto Bragantec com os resumos relevantes para a mensagem
+        """
+        resumos = self.buscar(consulta, top_k)
+        cabecalho = "=== RESUMOS RELEVANTES DAS EDIÇÕES ANTERIORES DA BRAGANTEC ==="
+
+        if not resumos:
+            return f"{cabecalho}\n(Nenhum resumo dos cadernos da Bragantec é relevante para esta mensagem.)\n"
+
+        max_chars = Config.BRAGANTEC_MAX_CHARS_RESUMO
+        trechos = "\n\n".join(r.formatar(max_chars) for r in resumos)
+        return f"{cabecalho}\n({len(resumos)} de {len(self.resumos)} projetos, selecionados por relevância)\n\n{trechos}\n"
+
+
+# Instância global (construída uma vez por processo)
+_retriever = None
+_retriever_lock = Lock()
+
+
+def get_bragantec_retriever():
+    """Retorna o índice Bragantec global, construindo na primeira chamada"""
+    global _retriever
+    if _retriever is None:
+        with _retriever_lock:
+            if _retriever is None:
+                _retriever = BragantecRetriever()
+    return _retriever
@@ -0,0 +1,144 @@
+"""
+Degradação gradual conforme a pressão na cota da API key
+Em vez de aceitar pedidos caros até a chave lotar e então recusar todo mundo,
+o chat vai ficando mais leve à medida que o RPM/TPM global se aproxima do limite:
+1) sem o corpus da Bragantec, 2) sem Google Search e execução de código,
+3) thinking reduzido, 4) histórico mais curto. Cada pedido gasta menos TPM e mais
+pedidos cabem no minuto
+"""
+
+import time
+import threading
+from config import Config
+from utils.advanced_logger import logger
+from services.quota_engine import get_quota_engine
+from services.gemini_scheduler import scheduler
+from services.request_classifier import PERFIS
+
+
+# Níveis em ordem (cada um inclui os anteriores)
+NIVEIS = [
+    {'nome': 'normal', 'descricao': None},
+    {'nome': 'sem_bragantec', 'descricao': 'Modo Bragantec pausado'},
+    {'nome': 'sem_ferramentas', 'descricao': 'Google Search e execução de código pausados'},
+    {'nome': 'thinking_reduzido', 'descricao': 'raciocínio mais curto'},
+    {'nome': 'historico_curto', 'descricao': 'só as mensagens mais recentes da conversa'},
+]
+
+
+class DegradationPolicy:
+    """Nível atual (0 = normal) a partir do uso global do último minuto, com histerese para não oscilar"""
+
+    def __init__(self, quota=None, limiares=None, histerese=None, intervalo=None):
+        self._quota = quota
+        self.limiares = limiares or Config.DEGRADACAO_LIMIARES
+        self.histerese = histerese if histerese is not None else Config.DEGRADACAO_HISTERESE
+        self.intervalo = intervalo or Config.DEGRADACAO_INTERVALO
+
+        self.lock = threading.Lock()
+        self._nivel = 0
+        self._pressao = 0.0
+        self._medido_em = 0.0
+
+        self.stats = {'pedidos_por_nivel': [0] * len(NIVEIS), 'mudancas': 0}
+
+    @property
+    def quota(self):
+        if self._quota is None:
+            self._quota = get_quota_engine()
+        return self._quota
+
+    def pressao(self):
+        """Fração do limite global já usada no último minuto (RPM ou TPM, o maior); 1.0 com fila esperando"""
+        uso = self.quota.uso()
+        pressao = max(
+            uso['requests_minute'] / self.quota.GLOBAL_RPM_LIMIT if self.quota.GLOBAL_RPM_LIMIT else 0,
+            uso['tokens_minute'] / self.quota.GLOBAL_TPM_LIMIT if self.quota.GLOBAL_TPM_LIMIT else 0
+        )
+        if scheduler.get_stats()['na_fila']:
+            pressao = max(pressao, 1.0)
+        return pressao
+
+    def _nivel_para(self, pressao, atual):
+        nivel = sum(pressao >= limiar for limiar in self.limiares)
+        if nivel < atual:
+            # Só desce quando a pressão fica abaixo do limiar com folga
+            nivel = max(nivel, min(atual, sum(pressao >= limiar - self.histerese for limiar in self.limiares)))
+        return nivel
+
+    def nivel(self):
+        """Nível atual (medido no máximo a cada `intervalo` segundos)"""
+        with self.lock:
+            if time.time() - self._medido_em < self.intervalo:
+                return self._nivel
+
+        try:
+            pressao = self.pressao()
+        except Exception as e:
+            logger.warning(f"⚠️ Erro medindo a pressão na cota: {e}")
+            return self._nivel
+
+        with self.lock:
+            novo = self._nivel_para(pressao, self._nivel)
+            if novo != self._nivel:
+                self.stats['mudancas'] += 1
+                logger.warning(
+                    f"🎛️ Degradação: nível {self._nivel} -> {novo} ({NIVEIS[novo]['nome']}), "
+                    f"pressão {pressao:.0%} do limite"
+                )
+            self._nivel, self._pressao, self._medido_em = novo, pressao, time.time()
+            return novo
+
+    def aplicar(self, gemini_kwargs, nivel=None):
+        """
+        Ajusta os argumentos do chat (gemini_kwargs) ao nível, in place, e retorna o nível
+        O orçamento do histórico fica por conta de orcamento_historico()
+        """
+        nivel = self.nivel() if nivel is None else nivel
+        with self.lock:
+            self.stats['pedidos_por_nivel'][nivel] += 1
+
+        if nivel >= 1:
+            gemini_kwargs['usar_contexto_bragantec'] = False
+        if nivel >= 2:
+            gemini_kwargs['usar_pesquisa'] = False
+            gemini_kwargs['usar_code_execution'] = False
+        if nivel >= 3:
+            # Sem classificador, parte do orçamento completo de sempre
+            perfil = gemini_kwargs.get('perfil') or dict(PERFIS['complexa'], classe='complexa')
+            gemini_kwargs['perfil'] = perfil
+            perfil['thinking_budget'] = min(perfil['thinking_budget'], Config.DEGRADACAO_THINKING_MAX)
+            perfil['max_output_tokens'] = min(perfil['max_output_tokens'], Config.DEGRADACAO_SAIDA_MAX)
+        return nivel
+
+    def orcamento_historico(self, nivel=None):
+        """Orçamento de tokens do histórico no nível (None = o padrão)"""
+        nivel = self.nivel() if nivel is None else nivel
+        if nivel >= 4:
+            return int(Config.HISTORICO_MAX_TOKENS * Config.DEGRADACAO_HISTORICO_FRACAO)
+        return None
+
+    def estado_publico(self, nivel=None):
+        """Nível para a interface: o que está pausado/reduzido agora"""
+        nivel = self.nivel() if nivel is None else nivel
+        return {
+            'nivel': nivel,
+            'nome': NIVEIS[nivel]['nome'],
+            'reduzido': [n['descricao'] for n in NIVEIS[1:nivel + 1]]
+        }
+
+    def get_stats(self):
+        nivel = self.nivel()
+        with self.lock:
+            return {
+                'nivel': nivel,
+                'nome': NIVEIS[nivel]['nome'],
+                'pressao_percent': round(self._pressao * 100, 1),
+                'limiares_percent': [round(l * 100) for l in self.limiares],
+                'pedidos_por_nivel': dict(zip((n['nome'] for n in NIVEIS), self.stats['pedidos_por_nivel'])),
+                'mudancas': self.stats['mudancas']
+            }
+
+
+# Instância global
+degradacao = DegradationPolicy()
@@ -0,0 +1,228 @@
+"""
+Registro dos arquivos enviados ao Gemini, pelo hash do conteúdo
+Um arquivo (mesmo sha256) é enviado uma vez só enquanto o upload estiver vivo (48h no Gemini)
+e volta anexado nas próximas mensagens do mesmo chat; depois de expirar, só é reenviado
+quando alguém precisar dele de novo
+"""
+
+import os
+import hashlib
+import threading
+from datetime import datetime, timedelta, timezone
+from google.genai import types
+from config import Config
+from utils.advanced_logger import logger
+
+
+def hash_arquivo(caminho, bloco=1024 * 1024):
+    """sha256 do conteúdo (lido em blocos, serve para vídeos grandes)"""
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for pedaco in iter(lambda: f.read(bloco), b''):
+            h.update(pedaco)
+    return h.hexdigest()
+
+
+def _para_utc(expiracao):
+    """datetime (ou ISO do banco, sem fuso = UTC) -> datetime com fuso"""
+    if not expiracao:
+        return None
+    if isinstance(expiracao, str):
+        try:
+            expiracao = datetime.fromisoformat(expiracao.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if expiracao.tzinfo is None:
+        expiracao = expiracao.replace(tzinfo=timezone.utc)
+    return expiracao.astimezone(timezone.utc)
+
+
+def expiracao_iso(arquivo):
+    """Expiração de um types.File em ISO UTC (para a coluna gemini_expiration)"""
+    expiracao = _para_utc(getattr(arquivo, 'expiration_time', None))
+    return expiracao.replace(tzinfo=None).isoformat() if expiracao else None
+
+
+class FileRegistry:
+    """Arquivos vivos no Gemini por hash: memória do processo + arquivos_chat no banco"""
+
+    def __init__(self, gemini, dao, margem=None, max_anexos=None):
+        self.gemini = gemini
+        self.dao = dao
+        self.margem = timedelta(seconds=margem or Config.GEMINI_ARQUIVO_MARGEM)
+        self.max_anexos = max_anexos or Config.CHAT_MAX_ANEXOS
+
+        self._arquivos = {}      # hash -> types.File
+        self._pendentes = {}     # hash -> [(on_pronto, on_erro)] (um upload por conteúdo de cada vez)
+        self._lock = threading.Lock()
+
+        self.stats = {'reaproveitados': 0, 'enviados': 0, 'anexados': 0}
+
+    def _vivo(self, expiracao):
+        expiracao = _para_utc(expiracao)
+        return expiracao is not None and expiracao > datetime.now(timezone.utc) + self.margem
+
+    def _guardar(self, hash_conteudo, arquivo):
+        with self._lock:
+            for h in [h for h, a in self._arquivos.items() if not self._vivo(a.expiration_time)]:
+                del self._arquivos[h]
+            self._arquivos[hash_conteudo] = arquivo
+
+    def _do_banco(self, hash_conteudo):
+        """Upload ainda vivo feito por outro worker (ou antes de reiniciar)"""
+        minimo = (datetime.now(timezone.utc) + self.margem).replace(tzinfo=None).isoformat()
+        row = self.dao.buscar_arquivo_gemini_por_hash(hash_conteudo, minimo)
+        if not row or not row.get('gemini_file_uri'):
+            return None
+        return types.File(
+            name=row['gemini_file_name'],
+            uri=row['gemini_file_uri'],
+            mime_type=row.get('tipo_arquivo'),
+            expiration_time=_para_utc(row['gemini_expiration'])
+        )
+
+    def _ja_enviado(self, hash_conteudo):
+        """Upload vivo deste conteúdo (memória do processo ou banco) ou None"""
+        arquivo = self._arquivos.get(hash_conteudo)
+        if arquivo is not None and self._vivo(arquivo.expiration_time):
+            return arquivo
+        arquivo = self._do_banco(hash_conteudo)
+        if arquivo is not None:
+            self._guardar(hash_conteudo, arquivo)
+        return arquivo
+
+    def obter_async(self, caminho, mime_type=None, hash_conteudo=None, on_pronto=None, on_erro=None, on_status=None):
+        """
+        Garante o conteúdo vivo no Gemini sem bloquear: on_pronto(arquivo, hash) é chamado na hora se ele
+        já estiver lá, ou quando o upload terminar (pedidos do mesmo conteúdo esperam o mesmo upload)
+        on_erro(erro) se o upload falhar; on_status(estado) acompanha o upload. Retorna o hash
+        """
+        hash_conteudo = hash_conteudo or hash_arquivo(caminho)
+
+        arquivo = self._ja_enviado(hash_conteudo)
+        if arquivo is not None:
+            self.stats['reaproveitados'] += 1
+            logger.info(f"♻️ Arquivo já está no Gemini ({hash_conteudo[:12]}): {arquivo.name}")
+            if on_pronto:
+                on_pronto(arquivo, hash_conteudo)
+            return hash_conteudo
+
+        with self._lock:
+            esperando = self._pendentes.get(hash_conteudo)
+            self._pendentes.setdefault(hash_conteudo, []).append((on_pronto, on_erro))
+        if esperando is not None:
+            logger.info(f"♻️ Mesmo arquivo já está sendo enviado ({hash_conteudo[:12]}): aguardando")
+            return hash_conteudo
+
+        def pronto(arquivo):
+            self.stats['enviados'] += 1
+            self._guardar(hash_conteudo, arquivo)
+            # Registros antigos com o mesmo conteúdo passam a apontar para o upload novo
+            self.dao.atualizar_arquivo_gemini(hash_conteudo, arquivo.uri, arquivo.name, expiracao_iso(arquivo))
+            self._avisar_pendentes(hash_conteudo, 0, arquivo, hash_conteudo)
+
+        def falhou(erro):
+            self._avisar_pendentes(hash_conteudo, 1, erro)
+
+        self.gemini.uploads.enviar(caminho, mime_type, on_status=on_status, on_pronto=pronto, on_erro=falhou)
+        return hash_conteudo
+
+    def _avisar_pendentes(self, hash_conteudo, qual, *args):
+        with self._lock:
+            callbacks = self._pendentes.pop(hash_conteudo, [])
+        for callback in callbacks:
+            if callback[qual]:
+                try:
+                    callback[qual](*args)
+                except Exception as e:
+                    logger.error(f"❌ Erro no callback do arquivo {hash_conteudo[:12]}: {e}")
+
+    def obter(self, caminho, mime_type=None, hash_conteudo=None):
+        """
+        Versão síncrona de obter_async()
+        Retorna (types.File ou None se o upload falhar, hash do conteúdo)
+        """
+        resultado = {}
+        fim = threading.Event()
+
+        def pronto(arquivo, _):
+            resultado['arquivo'] = arquivo
+            fim.set()
+
+        hash_conteudo = self.obter_async(caminho, mime_type, hash_conteudo, pronto, lambda erro: fim.set())
+        fim.wait()
+        return resultado.get('arquivo'), hash_conteudo
+
+    def anexos(self, chat_id, on_pronto=None, on_status=None):
+        """
+        Arquivos do chat para anexar à próxima mensagem (os últimos max_anexos), sem bloquear
+        Os que expiraram são reenviados em segundo plano a partir da cópia salva no servidor
+        Retorna (anexos, nomes sendo reenviados); com reenvios pendentes e on_pronto, anexos é None
+        e on_pronto(anexos) é chamado quando eles terminarem. Sem on_pronto, vão só os que estão vivos
+        """
+        vistos = set()
+        recentes = []
+        for arquivo in reversed(self.dao.listar_arquivos_por_chat(chat_id)):
+            if arquivo.hash_conteudo and arquivo.hash_conteudo not in vistos:
+                vistos.add(arquivo.hash_conteudo)
+                recentes.append(arquivo)
+            if len(recentes) >= self.max_anexos:
+                break
+
+        partes = []
+        reenvios = []
+        for registro in reversed(recentes):
+            if self._vivo(registro.gemini_expiration) and registro.gemini_file_uri:
+                partes.append(types.Part.from_uri(file_uri=registro.gemini_file_uri, mime_type=registro.tipo_arquivo))
+                continue
+
+            caminho = os.path.join(Config.UPLOAD_FOLDER, registro.url_arquivo)
+            if not os.path.exists(caminho):
+                logger.warning(f"⚠️ Arquivo {registro.nome_arquivo} expirou no Gemini e não está mais no servidor")
+                continue
+
+            partes.append(None)
+            reenvios.append((len(partes) - 1, caminho, registro))
+
+        # Uma vaga a mais no contador: quem zerar por último entrega (aqui ou no callback do upload)
+        faltam = [len(reenvios) + 1]
+        lock = threading.Lock()
+
+        def terminou(i, arquivo, registro):
+            if arquivo is not None:
+                partes[i] = types.Part.from_uri(file_uri=arquivo.uri, mime_type=arquivo.mime_type or registro.tipo_arquivo)
+            with lock:
+                faltam[0] -= 1
+                ultimo = faltam[0] == 0
+            if ultimo and on_pronto:
+                on_pronto(self._anexados(chat_id, partes))
+
+        for i, caminho, registro in reenvios:
+            self.obter_async(
+                caminho, registro.tipo_arquivo, registro.hash_conteudo,
+                on_pronto=lambda arquivo, _, i=i, registro=registro: terminou(i, arquivo, registro),
+                on_erro=lambda erro, i=i, registro=registro: terminou(i, None, registro),
+                on_status=on_status
+            )
+
+        with lock:
+            faltam[0] -= 1
+            pendentes = [registro.nome_arquivo for i, _, registro in reenvios if partes[i] is None] if faltam[0] else []
+
+        if pendentes:
+            logger.info(f"📎 Reenviando ao Gemini {len(pendentes)} arquivo(s) expirado(s) do chat {chat_id}")
+            if on_pronto:
+                return None, pendentes
+        return self._anexados(chat_id, partes), pendentes
+
+    def _anexados(self, chat_id, partes):
+        anexos = [parte for parte in partes if parte is not None]
+        if anexos:
+            self.stats['anexados'] += len(anexos)
+            logger.info(f"📎 {len(anexos)} arquivo(s) do chat {chat_id} anexado(s) à mensagem")
+        return anexos
+
+    def get_stats(self):
+        with self._lock:
+            vivos = len(self._arquivos)
+        return dict(self.stats, em_memoria=vivos)
@@ -0,0 +1,191 @@
+"""
+Cache explícito de contexto do Gemini (client.caches)
+Guarda o system prompt (por tipo de usuário / Modo Bragantec / ferramentas) no Gemini,
+para que cada turno pague só pelos tokens novos
+"""
+
+import time
+import hashlib
+import itertools
+from threading import Lock
+from datetime import datetime, timedelta, timezone
+from google.genai import types
+from config import Config
+from utils.advanced_logger import logger
+
+
+class FakeCachedContent:
+    """Imita o objeto CachedContent retornado pela API"""
+
+    def __init__(self, name, model, display_name, expire_time, config):
+        self.name = name
+        self.model = model
+        self.display_name = display_name
+        self.expire_time = expire_time
+        self.config = config
+
+
+class FakeCachesClient:
+    """
+    Cliente falso com a mesma interface de client.caches (create/get/update/delete)
+    Usado para testar o ContextCacheManager sem rede
+    """
+
+    def __init__(self, falhar_criacao=False):
+        self.caches = {}
+        self.falhar_criacao = falhar_criacao
+        self.chamadas = {'create': 0, 'update': 0, 'delete': 0, 'get': 0}
+        self._contador = itertools.count(1)
+
+    def _expiracao(self, ttl):
+        segundos = int(str(ttl or '3600s').rstrip('s'))
+        return datetime.now(timezone.utc) + timedelta(seconds=segundos)
+
+    def create(self, model, config=None):
+        self.chamadas['create'] += 1
+        if self.falhar_criacao:
+            raise ValueError("Cached content is too small")
+        name = f"cachedContents/fake-{next(self._contador)}"
+        cache = FakeCachedContent(
+            name=name,
+            model=model,
+            display_name=getattr(config, 'display_name', None),
+            expire_time=self._expiracao(getattr(config, 'ttl', None)),
+            config=config
+        )
+        self.caches[name] = cache
+        return cache
+
+    def get(self, name, config=None):
+        self.chamadas['get'] += 1
+        if name not in self.caches:
+            raise KeyError(f"{name} não encontrado")
+        return self.caches[name]
+
+    def update(self, name, config=None):
+        self.chamadas['update'] += 1
+        cache = self.get(name)
+        cache.expire_time = self._expiracao(getattr(config, 'ttl', None))
+        return cache
+
+    def delete(self, name, config=None):
+        self.chamadas['delete'] += 1
+        self.caches.pop(name, None)
+
+
+class ContextCacheManager:
+    """
+    Mantém um cached-content por prefixo (tipo_usuario, Modo Bragantec, ferramentas)
+    Cria na primeira vez, renova antes do TTL acabar e recria se o prompt mudar
+    """
+
+    def __init__(self, caches_client, model_name, ttl_seconds=None, refresh_margin=None, enabled=None):
+        self.caches_client = caches_client
+        self.model_name = model_name
+        self.ttl_seconds = ttl_seconds or Config.GEMINI_CACHE_TTL
+        self.refresh_margin = refresh_margin or Config.GEMINI_CACHE_REFRESH_MARGIN
+        self.enabled = Config.GEMINI_CONTEXT_CACHE if enabled is None else enabled
+
+        self._lock = Lock()
+        self._key_locks = {}
+        self.entries = {}        # chave -> {'name', 'hash', 'expira_em'}
+        self.falhas = {}         # chave -> timestamp até quando não tentar de novo
+
+        self.stats = {'hits': 0, 'criados': 0, 'renovados': 0, 'falhas': 0}
+
+    def _lock_da_chave(self, chave):
+        with self._lock:
+            if chave not in self._key_locks:
+                self._key_locks[chave] = Lock()
+            return self._key_locks[chave]
+
+    @staticmethod
+    def _hash(system_instruction, tools):
+        conteudo = system_instruction + '|' + '|'.join(sorted(repr(t) for t in (tools or [])))
+        return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()
+
+    def get_cache_name(self, tipo_usuario, usar_contexto_bragantec, system_instruction, tools=None, tools_key=''):
+        """
+        Retorna o nome do cached-content para o prefixo, ou None se o cache não puder ser usado
+        (nesse caso quem chamou envia o system_instruction normalmente)
+        """
+        if not self.enabled:
+            return None
+
+        chave = (tipo_usuario, bool(usar_contexto_bragantec), tools_key)
+        conteudo_hash = self._hash(system_instruction, tools)
+        now = time.time()
+
+        with self._lock_da_chave(chave):
+            if self.falhas.get(chave, 0) > now:
+                return None
+
+            entry = self.entries.get(chave)
+
+            # Prompt mudou: descarta o cache antigo
+            if entry and entry['hash'] != conteudo_hash:
+                self._deletar(entry['name'])
+                entry = None
+
+            # Ainda válido e longe de expirar
+            if entry and entry['expira_em'] - now > self.refresh_margin:
+                self.stats['hits'] += 1
+                return entry['name']
+
+            # Perto de expirar: renova o TTL
+            if entry and entry['expira_em'] > now:
+                try:
+                    self.caches_client.update(
+                        name=entry['name'],
+                        config=types.UpdateCachedContentConfig(ttl=f"{self.ttl_seconds}s")
+                    )
+                    entry['expira_em'] = now + self.ttl_seconds
+                    self.stats['renovados'] += 1
+                    logger.info(f"💾 Cache de contexto renovado: {entry['name']}")
+                    return entry['name']
+                except Exception as e:
+                    logger.warning(f"⚠️ Erro ao renovar cache {entry['name']}: {e}")
+
+            # Cria um novo
+            try:
+                cache = self.caches_client.create(
+                    model=self.model_name,
+                    config=types.CreateCachedContentConfig(
+                        display_name=f"apbia-{tipo_usuario}-{'bragantec' if usar_contexto_bragantec else 'base'}-{tools_key or 'sem-tools'}",
+                        system_instruction=system_instruction,
+                        tools=tools or None,
+                        ttl=f"{self.ttl_seconds}s"
+                    )
+                )
+                self.entries[chave] = {
+                    'name': cache.name,
+                    'hash': conteudo_hash,
+                    'expira_em': now + self.ttl_seconds
+                }
+                self.stats['criados'] += 1
+                logger.info(f"💾 Cache de contexto criado: {cache.name} ({tipo_usuario}, Bragantec={usar_contexto_bragantec}, tools={tools_key or '-'})")
+                return cache.name
+
+            except Exception as e:
+                # Ex.: prompt menor que o mínimo de tokens do cache ou tier sem suporte
+                self.entries.pop(chave, None)
+                self.falhas[chave] = now + Config.GEMINI_CACHE_RETRY_AFTER
+                self.stats['falhas'] += 1
+                logger.warning(f"⚠️ Cache de contexto indisponível ({e}). Usando system_instruction direto")
+                return None
+
+    def invalidar(self, name):
+        """Remove uma entrada após erro da API (ex.: cache expirou do lado do Gemini)"""
+        with self._lock:
+            for chave, entry in list(self.entries.items()):
+                if entry['name'] == name:
+                    del self.entries[chave]
+
+    def _deletar(self, name):
+        try:
+            self.caches_client.delete(name=name)
+        except Exception as e:
+            logger.debug(f"Cache {name} já removido: {e}")
+
+    def get_stats(self):
+        return dict(self.stats, ativos=len(self.entries))
@@ -0,0 +1,279 @@
+"""
+Camada de resiliência nas chamadas ao Gemini
+Erros passageiros (429, 503, quedas de rede) são repetidos com backoff exponencial com jitter,
+respeitando o retry-after da API; falhas seguidas abrem o circuito e os pedidos falham na hora
+(a interface mostra a IA como instável) até uma sonda passar. Chamadas idempotentes e curtas
+podem ser duplicadas (hedge) quando a primeira demora mais que o normal
+"""
+
+import re
+import time
+import random
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import httpx
+from config import Config
+from utils.advanced_logger import logger
+
+
+# Códigos que indicam que o pedido nem foi processado (seguro repetir qualquer chamada)
+CODIGOS_REJEITADO = {429, 503}
+# Códigos passageiros que só repetimos em chamadas idempotentes (o pedido pode ter sido processado)
+CODIGOS_PASSAGEIROS = {500, 502, 504}
+
+_RETRY_DELAY = re.compile(r"retryDelay['\"]?\s*:\s*['\"]?([\d.]+)s")
+
+
+class CircuitoAberto(Exception):
+    """A API está instável: o pedido nem foi enviado"""
+
+    def __init__(self, segundos):
+        self.segundos = max(1, round(segundos))
+        super().__init__(f"A IA está instável no momento. Tente novamente em {self.segundos}s.")
+
+
+def codigo_erro(erro):
+    """Código HTTP de um erro do google-genai (ou None para erros de rede/outros)"""
+    codigo = getattr(erro, 'code', None)
+    return codigo if isinstance(codigo, int) else None
+
+
+def retry_after(erro):
+    """Segundos pedidos pela API antes de tentar de novo (header Retry-After ou RetryInfo.retryDelay)"""
+    headers = getattr(getattr(erro, 'response', None), 'headers', None)
+    if headers:
+        try:
+            return float(headers.get('retry-after'))
+        except (TypeError, ValueError):
+            pass
+    achado = _RETRY_DELAY.search(str(getattr(erro, 'details', None) or erro))
+    return float(achado.group(1)) if achado else None
+
+
+def classificar(erro, idempotente=True):
+    """'passageiro' (vale repetir) ou 'permanente'"""
+    codigo = codigo_erro(erro)
+    if codigo in CODIGOS_REJEITADO:
+        return 'passageiro'
+    if codigo in CODIGOS_PASSAGEIROS:
+        return 'passageiro' if idempotente else 'permanente'
+    if codigo is None:
+        # Sem conexão o pedido não saiu; timeout de leitura só é seguro repetir se for idempotente
+        if isinstance(erro, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout, ConnectionError)):
+            return 'passageiro'
+        if isinstance(erro, (httpx.TransportError, TimeoutError)):
+            return 'passageiro' if idempotente else 'permanente'
+    return 'permanente'
+
+
+class CircuitBreaker:
+    """
+    fechado -> (falhas passageiras seguidas) -> aberto -> (tempo) -> meio_aberto -> 1 sonda
+    A sonda passando fecha o circuito; falhando, abre de novo
+    """
+
+    def __init__(self, limite_falhas=None, tempo_aberto=None):
+        self.limite_falhas = limite_falhas or Config.GEMINI_CIRCUITO_FALHAS
+        self.tempo_aberto = tempo_aberto or Config.GEMINI_CIRCUITO_ABERTO
+        self.lock = threading.Lock()
+        self.estado = 'fechado'
+        self.falhas = 0
+        self.reabre_em = 0.0
+        self._sondando = False
+
+    def restante(self):
+        """Segundos até aceitar pedidos de novo (0 se já aceita)"""
+        if self.estado == 'fechado':
+            return 0
+        return max(0.0, self.reabre_em - time.time())
+
+    def recusando(self):
+        """Recusaria um pedido agora: aberto ou meio aberto com a sonda em andamento"""
+        return self.restante() > 0 or self._sondando
+
+    def permitir(self):
+        """Libera o pedido ou levanta CircuitoAberto"""
+        with self.lock:
+            if self.estado == 'fechado':
+                return
+            if time.time() < self.reabre_em or self._sondando:
+                raise CircuitoAberto(self.reabre_em - time.time())
+            # Tempo passou: este pedido é a sonda
+            self.estado = 'meio_aberto'
+            self._sondando = True
+            logger.info("🔌 Circuito do Gemini meio aberto: enviando sonda")
+
+    def sucesso(self):
+        with self.lock:
+            if self.estado != 'fechado':
+                logger.info("✅ Circuito do Gemini fechado: API respondendo de novo")
+            self.estado = 'fechado'
+            self.falhas = 0
+            self._sondando = False
+
+    def falha(self, espera_api=None):
+        """Registra falha passageira; retorna True se o circuito abriu agora"""
+        with self.lock:
+            self.falhas += 1
+            self._sondando = False
+            if self.estado == 'fechado' and self.falhas < self.limite_falhas:
+                return False
+            duracao = max(self.tempo_aberto, espera_api or 0)
+            self.reabre_em = time.time() + duracao
+            abriu = self.estado != 'aberto'
+            self.estado = 'aberto'
+        logger.warning(f"🔌 Circuito do Gemini aberto por {duracao:.0f}s ({self.falhas} falhas seguidas)")
+        return abriu
+
+
+class GeminiResilience:
+    """Repetição com backoff + circuit breaker + hedge, compartilhados por todos os GeminiService do processo"""
+
+    def __init__(self, circuito=None, tentativas=None, base=None, espera_max=None, orcamento=None,
+                 hedge_apos=None, hedge_workers=None):
+        self.circuito = circuito or CircuitBreaker()
+        self.tentativas = tentativas or Config.GEMINI_RETRY_TENTATIVAS
+        self.base = base or Config.GEMINI_RETRY_BASE
+        self.espera_max = espera_max or Config.GEMINI_RETRY_ESPERA_MAX
+        self.orcamento = orcamento or Config.GEMINI_RETRY_ORCAMENTO
+        self.hedge_apos = hedge_apos or Config.GEMINI_HEDGE_APOS
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=hedge_workers or Config.GEMINI_HEDGE_WORKERS, thread_name_prefix='apbia-hedge'
+        )
+        self._latencias = defaultdict(lambda: deque(maxlen=50))   # tipo -> últimas durações com sucesso
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'sucesso': 0, 'sucesso_apos_retry': 0, 'retries': 0,
+            'falha_passageira': 0, 'falha_permanente': 0, 'retry_after_longo': 0,
+            'rejeitadas_circuito': 0, 'circuito_aberturas': 0,
+            'hedges': 0, 'hedges_venceram': 0
+        }
+
+    def _contar(self, chave, n=1):
+        with self._lock:
+            self.stats[chave] += n
+
+    def aberto(self):
+        """Circuito aberto ou meio aberto com a sonda em andamento (sem consumir a vaga da sonda)"""
+        return self.circuito.recusando()
+
+    def _espera(self, tentativa, espera_api):
+        """Backoff exponencial com jitter total; nunca menos que o retry-after da API"""
+        espera = random.uniform(0, min(self.espera_max, self.base * 2 ** tentativa))
+        return max(espera, espera_api or 0)
+
+    def executar(self, func, tipo='generate', idempotente=True, hedge=False, reservar_extra=None, tentativas=None,
+                 liberar=None):
+        """
+        Chama func() com repetição dos erros passageiros (até tentativas vezes)
+        hedge: se a chamada passar da latência normal, dispara uma cópia e usa a primeira que terminar
+        reservar_extra(): reserva a cota da cópia (sem cota, não há hedge)
+        Levanta CircuitoAberto sem chamar a API se o circuito estiver aberto
+        liberar(): devolve a cota já reservada quando o circuito recusa antes de qualquer chamada à API
+        """
+        inicio = time.time()
+        tentativas = tentativas or self.tentativas
+        for tentativa in range(tentativas):
+            try:
+                self.circuito.permitir()
+            except CircuitoAberto:
+                self._contar('rejeitadas_circuito')
+                if tentativa == 0 and liberar:
+                    liberar()
+                raise
+
+            t0 = time.time()
+            try:
+                if hedge and idempotente:
+                    resultado = self._com_hedge(func, tipo, reservar_extra)
+                else:
+                    resultado = func()
+            except Exception as e:
+                if classificar(e, idempotente) == 'permanente':
+                    # A API respondeu (ex.: 400): ela está de pé
+                    self.circuito.sucesso()
+                    self._contar('falha_permanente')
+                    raise
+
+                espera_api = retry_after(e)
+                if self.circuito.falha(espera_api):
+                    self._contar('circuito_aberturas')
+
+                espera = self._espera(tentativa, espera_api)
+                ultima = tentativa == tentativas - 1
+                if ultima or self.aberto() or time.time() - inicio + espera > self.orcamento:
+                    if espera_api and espera_api > self.orcamento:
+                        self._contar('retry_after_longo')
+                    self._contar('falha_passageira')
+                    raise
+
+                self._contar('retries')
+                logger.warning(
+                    f"🔁 Gemini ({tipo}) falhou com erro passageiro ({codigo_erro(e) or type(e).__name__}); "
+                    f"tentativa {tentativa + 2}/{tentativas} em {espera:.1f}s"
+                )
+                time.sleep(espera)
+                continue
+
+            self.circuito.sucesso()
+            self._latencias[tipo].append(time.time() - t0)
+            self._contar('sucesso' if tentativa == 0 else 'sucesso_apos_retry')
+            return resultado
+
+    def _limite_hedge(self, tipo):
+        """Quanto esperar antes do hedge: p95 das últimas chamadas do tipo (ou o padrão, com poucas amostras)"""
+        amostras = sorted(self._latencias[tipo])
+        if len(amostras) < 10:
+            return self.hedge_apos
+        return max(1.0, amostras[int(len(amostras) * 0.95) - 1])
+
+    def _com_hedge(self, func, tipo, reservar_extra):
+        original = self.executor.submit(func)
+        futuros = {original}
+
+        feitos, _ = wait(futuros, timeout=self._limite_hedge(tipo))
+        if not feitos and not self.aberto() and (reservar_extra is None or reservar_extra()):
+            self._contar('hedges')
+            logger.info(f"🏇 Gemini ({tipo}) demorando: disparando cópia da chamada")
+            futuros.add(self.executor.submit(func))
+
+        erro = None
+        pendentes = futuros
+        while pendentes:
+            feitos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in feitos:
+                if futuro.exception() is None:
+                    if futuro is not original:
+                        self._contar('hedges_venceram')
+                    return futuro.result()
+                erro = futuro.exception()
+        raise erro
+
+    def estado_publico(self):
+        """Situação para a interface (sem detalhes internos)"""
+        restante = self.circuito.restante()
+        return {
+            'degradado': restante > 0,
+            'retry_em': round(restante) if restante > 0 else None,
+            'mensagem': "A IA está instável no momento; pedidos estão sendo recusados até ela se recuperar."
+            if restante > 0 else None
+        }
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        total = stats['sucesso'] + stats['sucesso_apos_retry'] + stats['falha_passageira'] + stats['falha_permanente']
+        return dict(
+            stats,
+            circuito=self.circuito.estado,
+            falhas_seguidas=self.circuito.falhas,
+            reabre_em_s=round(self.circuito.restante()) or None,
+            taxa_sucesso_percent=round(100 * (stats['sucesso'] + stats['sucesso_apos_retry']) / total, 1) if total else None
+        )
+
+
+# Instância global
+resiliencia = GeminiResilience()
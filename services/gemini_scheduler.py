@@ -0,0 +1,224 @@
+"""
+Fila justa na frente do Gemini
+Os limites do FREE tier (RPM/TPM) são da GEMINI_API_KEY, não de cada usuário:
+quando a chave está no limite, os pedidos esperam aqui (com posição na fila)
+em vez de receber 429 da API. Prioridade primeiro; dentro da mesma prioridade,
+um pedido por usuário de cada vez (round-robin), para ninguém monopolizar a chave
+"""
+
+import time
+import itertools
+import threading
+from collections import OrderedDict, deque
+from config import Config
+from utils.advanced_logger import logger
+from services.quota_engine import get_quota_engine
+
+
+# Prioridades (menor = atendido antes)
+PRIORIDADE_ORIENTADOR = 0
+PRIORIDADE_CHAT = 1
+PRIORIDADE_LOTE = 2        # Gerar ideias, autocompletar e outras gerações em massa
+
+
+def prioridade_por_tipo(tipo_usuario):
+    """Prioridade padrão de uma conversa conforme o tipo do usuário"""
+    return PRIORIDADE_ORIENTADOR if tipo_usuario == 'orientador' else PRIORIDADE_CHAT
+
+
+class Pedido:
+    """Um pedido esperando vaga na API key"""
+
+    __slots__ = ('user_id', 'prioridade', 'tokens', 'seq', 'evento', 'resultado', 'pulado')
+
+    def __init__(self, user_id, prioridade, tokens, seq):
+        self.user_id = user_id
+        self.prioridade = prioridade
+        self.tokens = tokens
+        self.seq = seq
+        self.evento = threading.Event()
+        self.resultado = None
+        self.pulado = 0          # Vezes que pedidos menores passaram na frente (travado no TPM)
+
+
+class FairScheduler:
+    """
+    Admissão global: cada chamada ao Gemini passa por admitir() antes de ir para a API
+    A reserva em si é feita no motor de cotas (compartilhado entre workers)
+    """
+
+    def __init__(self, quota=None, max_espera=None, intervalo=None):
+        self._quota = quota
+        self.max_espera = max_espera or Config.GEMINI_FILA_MAX_ESPERA
+        self.intervalo = intervalo or Config.GEMINI_FILA_INTERVALO
+
+        self.cond = threading.Condition()
+        self.filas = {}              # prioridade -> OrderedDict(user_id -> deque[Pedido]) (ordem = vez de cada usuário)
+        self._seq = itertools.count()
+        self._despachante = None
+
+        self.stats = {'imediatos': 0, 'enfileirados': 0, 'admitidos_fila': 0, 'recusados': 0, 'desistencias': 0, 'pulos': 0}
+
+    @property
+    def quota(self):
+        if self._quota is None:
+            self._quota = get_quota_engine()
+        return self._quota
+
+    def admitir(self, user_id, tokens_estimados=0, prioridade=PRIORIDADE_CHAT, on_posicao=None, max_espera=None):
+        """
+        Espera (no máximo max_espera segundos) por uma vaga no RPM/TPM da API key e a reserva
+        on_posicao(posicao) é chamado sempre que a posição na fila muda
+        Retorna (ok, mensagem)
+        """
+        with self.cond:
+            fila_vazia = not self.filas
+
+        # Caminho rápido: ninguém esperando, tenta direto
+        if fila_vazia:
+            ok, msg, lotado = self.quota.reservar_global(user_id, tokens_estimados)
+            if ok or not lotado:
+                with self.cond:
+                    self.stats['imediatos' if ok else 'recusados'] += 1
+                return ok, msg
+
+        pedido = self._enfileirar(user_id, prioridade, tokens_estimados)
+        limite = time.time() + (max_espera or self.max_espera)
+        ultima_posicao = None
+
+        while not pedido.evento.wait(min(1.0, max(0.0, limite - time.time()))):
+            if time.time() >= limite:
+                with self.cond:
+                    if pedido.resultado is None:
+                        self._remover(pedido)
+                        self.stats['desistencias'] += 1
+                        logger.warning(f"⏳ Pedido de User {user_id} desistiu da fila após {max_espera or self.max_espera}s")
+                        return False, "A IA está atendendo muitos pedidos agora. Tente novamente em instantes."
+                break
+
+            posicao = self.posicao(pedido)
+            if on_posicao and posicao != ultima_posicao:
+                ultima_posicao = posicao
+                try:
+                    on_posicao(posicao)
+                except Exception as e:
+                    logger.debug(f"on_posicao falhou: {e}")
+
+        ok, msg = pedido.resultado
+        with self.cond:
+            self.stats['admitidos_fila' if ok else 'recusados'] += 1
+        return ok, msg
+
+    def _enfileirar(self, user_id, prioridade, tokens):
+        with self.cond:
+            pedido = Pedido(user_id, prioridade, tokens, next(self._seq))
+            self.filas.setdefault(prioridade, OrderedDict()).setdefault(user_id, deque()).append(pedido)
+            self.stats['enfileirados'] += 1
+
+            if self._despachante is None:
+                self._despachante = threading.Thread(target=self._loop, name='apbia-fila-gemini', daemon=True)
+                self._despachante.start()
+
+            self.cond.notify()
+            logger.info(f"⏳ API key no limite: pedido de User {user_id} na fila (prioridade {prioridade})")
+            return pedido
+
+    def _remover(self, pedido):
+        """Tira o pedido da fila (chamar com self.cond adquirido)"""
+        usuarios = self.filas.get(pedido.prioridade)
+        if not usuarios or pedido.user_id not in usuarios:
+            return
+        fila = usuarios[pedido.user_id]
+        try:
+            fila.remove(pedido)
+        except ValueError:
+            return
+        if not fila:
+            del usuarios[pedido.user_id]
+        if not usuarios:
+            del self.filas[pedido.prioridade]
+
+    def _ordem(self):
+        """Ordem em que os pedidos serão atendidos se ninguém mais chegar (chamar com self.cond adquirido)"""
+        for prioridade in sorted(self.filas):
+            filas_usuarios = list(self.filas[prioridade].values())
+            for rodada in range(max(len(f) for f in filas_usuarios)):
+                for fila in filas_usuarios:
+                    if rodada < len(fila):
+                        yield fila[rodada]
+
+    def posicao(self, pedido):
+        """1 = próximo a ser atendido"""
+        with self.cond:
+            for i, outro in enumerate(self._ordem(), 1):
+                if outro is pedido:
+                    return i
+        return 0
+
+    def _candidatos(self):
+        """
+        Primeiro pedido da vez e, se ele ainda pode ser pulado, os seguintes menores que ele
+        (um pedido grande travado no TPM não segura os pequenos que cabem). Chamar com self.cond adquirido
+        """
+        ordem = self._ordem()
+        primeiro = next(ordem, None)
+        if primeiro is None:
+            return []
+        candidatos = [primeiro]
+        if primeiro.pulado < Config.GEMINI_FILA_MAX_PULOS:
+            for pedido in ordem:
+                if len(candidatos) >= Config.GEMINI_FILA_CANDIDATOS:
+                    break
+                if pedido.tokens < primeiro.tokens:
+                    candidatos.append(pedido)
+        return candidatos
+
+    def _loop(self):
+        """Despachante: tenta reservar para o próximo pedido da vez até a fila esvaziar"""
+        while True:
+            with self.cond:
+                while not self.filas:
+                    self.cond.wait()
+                candidatos = self._candidatos()
+
+            for pedido in candidatos:
+                ok, msg, lotado = self.quota.reservar_global(pedido.user_id, pedido.tokens)
+                if not lotado:
+                    break
+            else:
+                time.sleep(self.intervalo)
+                continue
+
+            with self.cond:
+                if pedido is not candidatos[0]:
+                    candidatos[0].pulado += 1
+                    self.stats['pulos'] += 1
+                    logger.debug(f"⏩ Pedido menor de User {pedido.user_id} passou na frente de um travado no TPM")
+
+                if not self._esta_na_fila(pedido):
+                    # Desistiu enquanto reservávamos: devolve a vaga
+                    if ok:
+                        self.quota.liberar(pedido.user_id, pedido.tokens)
+                    continue
+                self._remover(pedido)
+
+                # Vez passa para o próximo usuário da mesma prioridade
+                usuarios = self.filas.get(pedido.prioridade)
+                if usuarios and pedido.user_id in usuarios:
+                    usuarios.move_to_end(pedido.user_id)
+
+                pedido.resultado = (ok, msg)
+                pedido.evento.set()
+
+    def _esta_na_fila(self, pedido):
+        usuarios = self.filas.get(pedido.prioridade)
+        return bool(usuarios) and pedido in usuarios.get(pedido.user_id, ())
+
+    def get_stats(self):
+        with self.cond:
+            na_fila = sum(len(f) for usuarios in self.filas.values() for f in usuarios.values())
+        return dict(self.stats, na_fila=na_fila)
+
+
+# Instância global
+scheduler = FairScheduler()
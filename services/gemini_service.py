@@ -5,14 +5,21 @@ COM MODO BRAGANTEC OPCIONAL para reduzir consumo de tokens
 
 from google import genai
 from google.genai import types
-from google.genai.types import CountTokensConfig, Content, Part
-import os
+import json
 import time
+import itertools
 from config import Config
 from utils.advanced_logger import logger, log_ai_usage
 from collections import defaultdict
 from datetime import datetime, timedelta
 from services.gemini_stats import gemini_stats
+from services.gemini_scheduler import scheduler, prioridade_por_tipo, PRIORIDADE_LOTE
+from services.bragantec_retriever import get_bragantec_retriever
+from services.gemini_cache import ContextCacheManager
+from services.token_estimator import token_estimator
+from services.upload_pipeline import UploadPipeline
+from services.gemini_resilience import resiliencia, classificar, CircuitoAberto
+from services.single_flight import coalescedor, chave_pedido
 
 
 class GeminiService:
@@ -28,7 +35,17 @@ class GeminiService:
             self.client = genai.Client(api_key=Config.GEMINI_API_KEY)
             self.model_name = 'gemini-2.5-flash' #infelizmente o gemini 3 e pago
             
-            self.context_files = self._load_context_files()
+            # Índice BM25 dos cadernos da Bragantec (Modo Bragantec envia só os resumos relevantes)
+            self.retriever = get_bragantec_retriever()
+            
+            # Cache explícito do system prompt no Gemini (um por tipo de usuário / modo / ferramentas)
+            self.cache_manager = ContextCacheManager(self.client.caches, self.model_name)
+            
+            # Uploads de arquivos em pool limitado, com consulta do processamento por backoff
+            self.uploads = UploadPipeline(self.client.files)
+            
+            # Repetição de erros passageiros, circuit breaker e hedge (compartilhados no processo)
+            self.resiliencia = resiliencia
             
             # Safety Settings: BLOCK_NONE
             self.safety_settings = [
@@ -59,40 +76,6 @@ class GeminiService:
             logger.critical(f"💥 ERRO ao inicializar Gemini: {e}")
             raise
     
-    def _load_context_files(self):
-        """Carrega arquivos de contexto da Bragantec"""
-        logger.debug("📂 Carregando arquivos de contexto...")
-        context_content = []
-        context_path = Config.CONTEXT_FILES_PATH
-        
-        if not os.path.exists(context_path):
-            logger.warning(f"⚠️ Pasta {context_path} não existe")
-            os.makedirs(context_path, exist_ok=True)
-            return ""
-        
-        files_found = 0
-        total_chars = 0
-        
-        for filename in os.listdir(context_path):
-            if filename.endswith('.txt'):
-                files_found += 1
-                filepath = os.path.join(context_path, filename)
-                try:
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                        total_chars += len(content)
-                        context_content.append(f"=== {filename} ===\n{content}\n")
-                    logger.info(f"✅ Contexto carregado: {filename}")
-                except Exception as e:
-                    logger.error(f"❌ Erro ao carregar {filename}: {e}")
-        
-        if files_found == 0:
-            logger.warning("⚠️ Nenhum arquivo .txt encontrado em context_files/")
-        else:
-            logger.info(f"✅ {files_found} arquivos carregados (~{total_chars:,} caracteres)")
-        
-        return "\n".join(context_content) if context_content else ""
-    
     def _get_system_instruction(self, tipo_usuario, usar_contexto_bragantec=False, apelido=None):
     
         # SAUDAÇÃO PERSONALIZADA COM APELIDO
@@ -190,18 +173,17 @@ class GeminiService:
             base += f"""
 
     📖 CONHECIMENTO SOBRE A BRAGANTEC:
-    Você tem acesso ao histórico completo das edições anteriores da Bragantec de 2011 ate 2019, incluindo:
-    - Projetos vencedores e suas características
-    - Critérios de avaliação dos jurados
-    - Tendências e padrões de projetos premiados
+    Junto com cada mensagem você recebe os resumos de projetos das edições anteriores da Bragantec (2011 ate 2019) mais relevantes para a pergunta, selecionados dos cadernos de resumos, incluindo:
+    - Projetos e suas características
+    - Tendências e padrões de projetos apresentados
     - Categorias: Ciências da Natureza e Exatas, Informática, Ciências Humanas e Linguagens, Engenharias
 
     Use este conhecimento para:
-    - Sugerir ideias alinhadas com projetos vencedores anteriores
+    - Sugerir ideias alinhadas com projetos anteriores
     - Orientar sobre o que os jurados valorizam
     - Identificar oportunidades de inovação baseadas em edições passadas
 
-    ⚠️ IMPORTANTE: Este conhecimento consome muitos tokens. Use-o com sabedoria.
+    ⚠️ IMPORTANTE: Baseie-se nos resumos recebidos. Se eles não cobrirem a pergunta, diga isso em vez de inventar.
     """
         else:
             base += """
@@ -257,10 +239,276 @@ class GeminiService:
         return base
 
 
+    def _get_prefixo_apelido(self, apelido):
+        """Linha com o apelido do usuário, enviada junto da mensagem"""
+        if not apelido:
+            return ""
+        return f"👤 O usuário se chama '{apelido}'. Chame-o pelo apelido para criar conexão.\n\n"
+
+    def _generate_with_prefix(self, contents, config_base, tipo_usuario, usar_contexto_bragantec,
+                              system_instruction, tools, tools_key, stream=False, hedge=False,
+                              reservar_extra=None, tipo=None, liberar=None):
+        """
+        Chama generate_content (ou generate_content_stream) usando o cache de contexto quando disponível.
+        Com cache, system_instruction e tools já estão no cached-content;
+        sem cache, vão direto no GenerateContentConfig.
+        Passa pela camada de resiliência: erros passageiros são repetidos (no streaming, só até o
+        primeiro chunk) e hedge/reservar_extra duplicam chamadas curtas que demoram demais
+        liberar(): devolve a cota reservada se o circuito recusar o pedido (ver _liberacao)
+        """
+        generate = self.client.models.generate_content_stream if stream else self.client.models.generate_content
+
+        def primeiro_chunk(response):
+            # Erros (de cache, 429, 503...) só aparecem ao ler o primeiro chunk
+            response = iter(response)
+            primeiro = next(response, None)
+            return itertools.chain([primeiro] if primeiro is not None else [], response)
+
+        def chamar():
+            cache_name = self.cache_manager.get_cache_name(
+                tipo_usuario, usar_contexto_bragantec, system_instruction, tools, tools_key
+            )
+
+            if cache_name:
+                try:
+                    response = generate(
+                        model=self.model_name,
+                        contents=contents,
+                        config=types.GenerateContentConfig(cached_content=cache_name, **config_base)
+                    )
+                    return primeiro_chunk(response) if stream else response
+                except Exception as e:
+                    # Erro passageiro não é culpa do cache: quem repete é a camada de resiliência
+                    if classificar(e) == 'passageiro':
+                        raise
+                    # Cache pode ter expirado/sido removido do lado do Gemini: tenta sem cache
+                    logger.warning(f"⚠️ Erro usando cache {cache_name}: {e}. Reenviando sem cache")
+                    self.cache_manager.invalidar(cache_name)
+
+            response = generate(
+                model=self.model_name,
+                contents=contents,
+                config=types.GenerateContentConfig(
+                    system_instruction=system_instruction,
+                    tools=tools if tools else None,
+                    **config_base
+                )
+            )
+            return primeiro_chunk(response) if stream else response
+
+        return self.resiliencia.executar(
+            chamar, tipo=tipo or ('stream' if stream else 'generate'),
+            hedge=hedge and not stream, reservar_extra=reservar_extra, liberar=liberar
+        )
+
+    def _preparar_chat(self, message, tipo_usuario, history, usar_pesquisa, usar_code_execution,
+                       usar_contexto_bragantec, apelido, contexto_top_k, arquivos=None, perfil=None):
+        """
+        Monta o que é comum a chat() e chat_stream():
+        contents, config base e prefixo (system instruction + ferramentas)
+        arquivos: parts de arquivos já enviados ao Gemini (file_registry), anexados antes da mensagem
+        perfil: escolhido pelo classificador de pedidos (thinking e teto de saída da mensagem)
+        """
+        # System instruction OTIMIZADA (sem apelido, para ser igual entre usuários e ir para o cache)
+        system_instruction = self._get_system_instruction(
+            tipo_usuario, 
+            usar_contexto_bragantec
+        )
+        
+        # Apelido vai junto da mensagem
+        prefixo_usuario = self._get_prefixo_apelido(apelido)
+        
+        # ADICIONA CONTEXTO BRAGANTEC APENAS SE ATIVADO (só os resumos relevantes para a mensagem)
+        if usar_contexto_bragantec:
+            contexto_bragantec = self.retriever.montar_contexto(message, top_k=contexto_top_k)
+            full_message = f"{prefixo_usuario}{contexto_bragantec}\n\n=== MENSAGEM DO USUÁRIO ===\n{message}"
+            logger.info(f"📚 Contexto Bragantec ADICIONADO (~{len(contexto_bragantec):,} de {self.retriever.total_chars:,} chars do corpus)")
+        else:
+            full_message = f"{prefixo_usuario}=== MENSAGEM DO USUÁRIO ===\n{message}"
+            logger.info("🚀 Contexto Bragantec DESABILITADO (economia de tokens)")
+        
+        # Ferramentas
+        tools = []
+        
+        if usar_pesquisa:
+            tools.append(types.Tool(google_search=types.GoogleSearch()))
+            logger.info("🔍 Google Search habilitado")
+        
+        if usar_code_execution:
+            tools.append(types.Tool(code_execution=types.ToolCodeExecution()))
+            logger.info("🐍 Code Execution habilitado")
+        
+        tools_key = '+'.join(nome for nome, ativo in (('search', usar_pesquisa), ('code', usar_code_execution)) if ativo)
+        
+        # Configuração
+        config_base = dict(
+            temperature=0.7,
+            top_p=0.95,
+            top_k=40,
+            max_output_tokens=65536,
+            safety_settings=self.safety_settings,
+            thinking_config=types.ThinkingConfig(
+                thinking_budget=24000, # tecnologia legada com a chegada do gemini 3
+                include_thoughts=True
+            )
+        )
+        
+        # Pedidos simples pensam menos e respondem mais curto
+        if perfil:
+            config_base['max_output_tokens'] = perfil['max_output_tokens']
+            config_base['thinking_config'] = types.ThinkingConfig(
+                thinking_budget=perfil['thinking_budget'],
+                include_thoughts=perfil['include_thoughts']
+            )
+            logger.info(f"🎚️ Pedido '{perfil['classe']}': thinking {perfil['thinking_budget']:,}, saída até {perfil['max_output_tokens']:,} tokens")
+        
+        # Prepara conteúdo
+        contents = []
+        
+        # Adiciona histórico
+        if history:
+            for msg in history:
+                contents.append(msg['parts'][0])
+        
+        # Arquivos enviados antes neste chat (sem novo upload)
+        if arquivos:
+            contents.extend(arquivos)
+        
+        # Adiciona mensagem atual
+        contents.append(full_message)
+        
+        return contents, config_base, system_instruction, tools, tools_key
+
+    def _extrair_part(self, part):
+        """
+        Classifica uma part da resposta: ('thought' | 'code' | 'code_result' | 'text', dados)
+        Retorna (None, None) para parts sem conteúdo útil
+        """
+        # Thinking process
+        if part.thought:
+            return 'thought', part.text
+        
+        # Code execution
+        if hasattr(part, 'executable_code') and part.executable_code:
+            code_info = {
+                'language': part.executable_code.language if hasattr(part.executable_code, 'language') else 'python',
+                'code': part.executable_code.code if hasattr(part.executable_code, 'code') else str(part.executable_code)
+            }
+            logger.info(f"🐍 Código detectado: {code_info['language']}")
+            return 'code', code_info
+        
+        # Resultado da execução
+        if hasattr(part, 'code_execution_result') and part.code_execution_result:
+            result_info = {
+                'outcome': part.code_execution_result.outcome if hasattr(part.code_execution_result, 'outcome') else 'unknown',
+                'output': part.code_execution_result.output if hasattr(part.code_execution_result, 'output') else str(part.code_execution_result)
+            }
+            logger.info(f"✅ Resultado: {result_info['outcome']}")
+            return 'code_result', result_info
+        
+        # Texto normal
+        if part.text:
+            return 'text', part.text
+        
+        return None, None
+
+    def _search_usado(self, candidate):
+        """Verifica no grounding metadata se o Google Search foi usado"""
+        try:
+            grounding = getattr(candidate, 'grounding_metadata', None)
+            if grounding and hasattr(grounding, 'web_search_queries'):
+                queries = grounding.web_search_queries
+                if queries and isinstance(queries, (list, tuple)) and len(queries) > 0:
+                    logger.info(f"🔍 Google Search usado: {len(queries)} queries")
+                    return True
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao verificar Google Search: {e}")
+        return False
+
+    def _registrar_uso(self, usage_metadata, user_id, thinking, search_used, start_time, response_chars,
+                       tokens_reservados=0, prompt=None, perfil=None):
+        """
+        Registra tokens, cache e tempo da requisição. Retorna (tokens_input, tokens_output)
+        prompt=(system_instruction, contents) calibra o estimador local de tokens
+        perfil: do classificador de pedidos (economia por classe nas estatísticas)
+        """
+        tokens_input = 0
+        tokens_output = 0
+        
+        if usage_metadata:
+            tokens_input = usage_metadata.prompt_token_count or 0
+            tokens_output = usage_metadata.candidates_token_count or 0
+            
+            gemini_stats.record_request(user_id, tokens_input, tokens_output, tokens_reservados)
+            
+            if perfil:
+                gemini_stats.record_perfil(
+                    perfil, getattr(usage_metadata, 'thoughts_token_count', None) or 0,
+                    tokens_output, (time.time() - start_time) * 1000
+                )
+            
+            if prompt:
+                token_estimator.calibrar(prompt[0], prompt[1], usage_metadata)
+            
+            logger.info(f"📊 Tokens - Input: {tokens_input:,} | Output: {tokens_output:,}")
+            
+            # ALERTA se consumo alto
+            if tokens_input > 100000:
+                logger.warning(f"⚠️ CONSUMO ALTO DE TOKENS INPUT: {tokens_input:,}")
+                logger.warning(f"💡 Considere desativar o Modo Bragantec para economizar")
+            
+            if hasattr(usage_metadata, 'cached_content_token_count'):
+                cached = usage_metadata.cached_content_token_count
+                if cached is not None and cached > 0:
+                    logger.info(f"💾 Cache usado: {cached:,} tokens economizados!")
+        
+        duration = (time.time() - start_time) * 1000
+        logger.info(f"✅ Resposta gerada em {duration:.2f}ms ({response_chars} chars)")
+        
+        # Log de uso
+        log_ai_usage(
+            self.model_name,
+            'CHAT',
+            tokens_input=tokens_input,
+            tokens_output=tokens_output,
+            thinking=thinking,
+            search=search_used
+        )
+        
+        return tokens_input, tokens_output
+
+    def _estimar_tokens(self, contents, system_instruction=''):
+        """Estimativa local de tokens de entrada (calibrada pelo uso real) para reservar o TPM"""
+        return token_estimator.estimar_prompt(system_instruction, contents)
+
+    def _admitir(self, user_id, tipo_usuario, tokens_estimados, prioridade=None, on_fila=None):
+        """
+        Reserva RPM/TPM do usuário e da API key, esperando na fila justa se a chave estiver no limite
+        on_fila(posicao) recebe a posição na fila enquanto espera
+        """
+        # API instável: falha na hora, sem reservar cota nem esperar na fila
+        if self.resiliencia.aberto():
+            return False, str(CircuitoAberto(self.resiliencia.circuito.restante()))
+        if prioridade is None:
+            prioridade = prioridade_por_tipo(tipo_usuario)
+        return scheduler.admitir(user_id, tokens_estimados, prioridade, on_posicao=on_fila)
+
+    def _liberacao(self, user_id, tokens_estimados):
+        """Devolve a reserva feita em _admitir (o circuito abriu entre a admissão e a chamada)"""
+        return lambda: scheduler.quota.liberar(user_id, tokens_estimados)
+
+    def _reserva_hedge(self, user_id, tokens_estimados):
+        """Reserva a cota da cópia de uma chamada (hedge); sem vaga na API key, não há cópia"""
+        return lambda: scheduler.quota.reservar_global(user_id, tokens_estimados)[0]
+
     def chat(self, message, tipo_usuario='participante', history=None, 
          usar_pesquisa=True, usar_code_execution=True, analyze_url=None, 
-         usar_contexto_bragantec=False, user_id=None, apelido=None):
-        
+         usar_contexto_bragantec=False, user_id=None, apelido=None, contexto_top_k=None,
+         prioridade=None, on_fila=None, arquivos=None, perfil=None, cache_ttl=0):
+        """
+        Resposta completa (sem streaming). Pedidos idênticos simultâneos viram uma chamada só
+        cache_ttl: segundos que a resposta fica guardada (só para pedidos determinísticos, sem histórico)
+        """
         logger.info("🚀 Iniciando chat com Gemini")
         logger.debug(f"   Tipo usuário: {tipo_usuario}")
         logger.debug(f"   Google Search: {usar_pesquisa}")
@@ -268,254 +516,377 @@ class GeminiService:
         logger.debug(f"   🎯 MODO BRAGANTEC: {usar_contexto_bragantec}")
         logger.debug(f"   Histórico: {len(history) if history else 0} mensagens")
         
-        # Verifica limites
-        can_proceed, error_msg = gemini_stats.check_limits(user_id)
-        if not can_proceed:
-            logger.warning(f"⚠️ Rate limit excedido: {error_msg}")
-            return {
-                'response': f"⚠️ {error_msg}",
-                'thinking_process': None,
-                'error': True,
-                'search_used': False,
-                'code_executed': False,
-                'code_results': None
-            }
-        
         start_time = time.time()
         
         try:
-            # System instruction OTIMIZADA
-            system_instruction = self._get_system_instruction(
-                tipo_usuario, 
-                usar_contexto_bragantec,
-                apelido  # NOVO
+            contents, config_base, system_instruction, tools, tools_key = self._preparar_chat(
+                message, tipo_usuario, history, usar_pesquisa, usar_code_execution,
+                usar_contexto_bragantec, apelido, contexto_top_k, arquivos, perfil
             )
             
-            # ADICIONA CONTEXTO BRAGANTEC APENAS SE ATIVADO
-            if usar_contexto_bragantec:
-                full_message = f"{system_instruction}\n\n{self.context_files}\n\n=== MENSAGEM DO USUÁRIO ===\n{message}"
-                logger.info("📚 Contexto Bragantec ADICIONADO (~{} chars)".format(len(self.context_files)))
-            else:
-                full_message = f"{system_instruction}\n\n=== MENSAGEM DO USUÁRIO ===\n{message}"
-                logger.info("🚀 Contexto Bragantec DESABILITADO (economia de tokens)")
+            # Pedido idêntico já em andamento (ou em cache): uma chamada só, sem reservar cota de novo
+            chave = chave_pedido('chat', self.model_name, system_instruction, contents, config_base, tools_key)
+
+            def gerar():
+                # Verifica limites (espera vaga na API key se ela estiver no limite)
+                tokens_estimados = self._estimar_tokens(contents, system_instruction)
+                can_proceed, error_msg = self._admitir(user_id, tipo_usuario, tokens_estimados, prioridade, on_fila)
+                if not can_proceed:
+                    logger.warning(f"⚠️ Rate limit excedido: {error_msg}")
+                    return {
+                        'response': f"⚠️ {error_msg}",
+                        'thinking_process': None,
+                        'error': True,
+                        'search_used': False,
+                        'code_executed': False,
+                        'code_results': None
+                    }
+                inicio = time.time()
             
-            # Ferramentas
-            tools = []
+                # Gera resposta
+                logger.debug("📤 Enviando requisição...")
+                response = self._generate_with_prefix(
+                    contents, config_base, tipo_usuario, usar_contexto_bragantec,
+                    system_instruction, tools, tools_key, liberar=self._liberacao(user_id, tokens_estimados)
+                )
             
-            if usar_pesquisa:
-                tools.append(types.Tool(google_search=types.GoogleSearch()))
-                logger.info("🔍 Google Search habilitado")
+                # Extrai dados
+                thinking_process = None
+                response_text = ""
+                code_executed = False
+                code_results = []
             
-            if usar_code_execution:
-                tools.append(types.Tool(code_execution=types.ToolCodeExecution()))
-                logger.info("🐍 Code Execution habilitado")
+                logger.debug(f"📦 Processando {len(response.candidates[0].content.parts)} parts")
             
-            # Configuração
-            config = types.GenerateContentConfig(
-                temperature=0.7,
-                top_p=0.95,
-                top_k=40,
-                max_output_tokens=65536,
-                tools=tools if tools else None,
-                safety_settings=self.safety_settings,
-                thinking_config=types.ThinkingConfig(
-                    thinking_budget=24000, # tecnologia legada com a chegada do gemini 3
-                    include_thoughts=True
+                for i, part in enumerate(response.candidates[0].content.parts):
+                    logger.debug(f"   Part {i}: {type(part).__name__}")
+                    tipo, dados = self._extrair_part(part)
+                
+                    if tipo == 'thought':
+                        thinking_process = dados
+                        logger.info(f"💭 Thinking: {len(thinking_process)} chars")
+                    elif tipo == 'code':
+                        code_executed = True
+                        code_results.append(dados)
+                    elif tipo == 'code_result':
+                        if code_results:
+                            code_results[-1]['result'] = dados
+                    elif tipo == 'text':
+                        response_text += dados
+            
+                # Verifica Google Search
+                search_used = self._search_usado(response.candidates[0])
+                if search_used:
+                    gemini_stats.record_search(user_id)
+            
+                # Registra estatísticas
+                tokens_input, tokens_output = self._registrar_uso(
+                    getattr(response, 'usage_metadata', None), user_id,
+                    bool(thinking_process), search_used, inicio, len(response_text),
+                    tokens_estimados, prompt=None if arquivos else (system_instruction, contents), perfil=perfil
                 )
-            )
             
-            # Prepara conteúdo
-            contents = []
+                return {
+                    'response': response_text or response.text,
+                    'thinking_process': thinking_process,
+                    'search_used': search_used,
+                    'code_executed': code_executed,
+                    'code_results': code_results if code_results else None,
+                    'tokens_input': tokens_input,
+                    'tokens_output': tokens_output,
+                    'total_tokens': tokens_input + tokens_output
+                }
+            
+
+            return coalescedor.executar(chave, gerar, ttl=cache_ttl, guardar=lambda r: not r.get('error'))
+
+        except Exception as e:
+            duration = (time.time() - start_time) * 1000
+            logger.error(f"❌ Erro após {duration:.2f}ms: {str(e)}")
+            import traceback
+            logger.error(f"Traceback:\n{traceback.format_exc()}")
             
-            # Adiciona histórico
-            if history:
-                for msg in history:
-                    contents.append(msg['parts'][0])
+            return {
+                'response': f"Erro ao processar mensagem: {str(e)}",
+                'thinking_process': None,
+                'error': True,
+                'search_used': False,
+                'code_executed': False,
+                'code_results': None,
+                'tokens_input': 0,
+                'tokens_output': 0,
+                'total_tokens': 0
+            }
+
+    def chat_stream(self, message, tipo_usuario='participante', history=None, 
+                    usar_pesquisa=True, usar_code_execution=True, analyze_url=None, 
+                    usar_contexto_bragantec=False, user_id=None, apelido=None, contexto_top_k=None,
+                    prioridade=None, on_fila=None, arquivos=None, perfil=None):
+        """
+        Versão em streaming do chat() (generate_content_stream).
+        Gera eventos {'type': 'thought' | 'text' | 'code' | 'code_result', 'data': ...}
+        conforme as parts chegam e, no fim, {'type': 'done', 'data': <mesmo dict de chat()>}
+        ou {'type': 'error', 'data': mensagem}
+        """
+        logger.info("🚀 Iniciando chat (streaming) com Gemini")
+        
+        start_time = time.time()
+        
+        try:
+            contents, config_base, system_instruction, tools, tools_key = self._preparar_chat(
+                message, tipo_usuario, history, usar_pesquisa, usar_code_execution,
+                usar_contexto_bragantec, apelido, contexto_top_k, arquivos, perfil
+            )
             
-            # Adiciona mensagem atual
-            contents.append(full_message)
+            # Verifica limites (espera vaga na API key se ela estiver no limite)
+            tokens_estimados = self._estimar_tokens(contents, system_instruction)
+            can_proceed, error_msg = self._admitir(user_id, tipo_usuario, tokens_estimados, prioridade, on_fila)
+            if not can_proceed:
+                logger.warning(f"⚠️ Rate limit excedido: {error_msg}")
+                yield {'type': 'error', 'data': f"⚠️ {error_msg}"}
+                return
+            start_time = time.time()
             
-            # Gera resposta
-            logger.debug("📤 Enviando requisição...")
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=contents,
-                config=config
+            stream = self._generate_with_prefix(
+                contents, config_base, tipo_usuario, usar_contexto_bragantec,
+                system_instruction, tools, tools_key, stream=True,
+                liberar=self._liberacao(user_id, tokens_estimados)
             )
             
-            # Extrai dados
-            thinking_process = None
+            thinking_parts = []
             response_text = ""
-            code_executed = False
             code_results = []
+            search_used = False
+            usage_metadata = None
+            primeiro_token = None
             
-            logger.debug(f"📦 Processando {len(response.candidates[0].content.parts)} parts")
-            
-            for i, part in enumerate(response.candidates[0].content.parts):
-                logger.debug(f"   Part {i}: {type(part).__name__}")
+            for chunk in stream:
+                if getattr(chunk, 'usage_metadata', None):
+                    usage_metadata = chunk.usage_metadata
                 
-                # Thinking process
-                if part.thought:
-                    thinking_process = part.text
-                    logger.info(f"💭 Thinking: {len(thinking_process)} chars")
+                if not chunk.candidates:
+                    continue
+                candidate = chunk.candidates[0]
                 
-                # Code execution
-                elif hasattr(part, 'executable_code') and part.executable_code:
-                    code_executed = True
-                    code_info = {
-                        'language': part.executable_code.language if hasattr(part.executable_code, 'language') else 'python',
-                        'code': part.executable_code.code if hasattr(part.executable_code, 'code') else str(part.executable_code)
-                    }
-                    logger.info(f"🐍 Código detectado: {code_info['language']}")
-                    code_results.append(code_info)
+                if not search_used:
+                    search_used = self._search_usado(candidate)
                 
-                # Resultado da execução
-                elif hasattr(part, 'code_execution_result') and part.code_execution_result:
-                    result_info = {
-                        'outcome': part.code_execution_result.outcome if hasattr(part.code_execution_result, 'outcome') else 'unknown',
-                        'output': part.code_execution_result.output if hasattr(part.code_execution_result, 'output') else str(part.code_execution_result)
-                    }
-                    logger.info(f"✅ Resultado: {result_info['outcome']}")
-                    
-                    if code_results:
-                        code_results[-1]['result'] = result_info
+                if not candidate.content or not candidate.content.parts:
+                    continue
                 
-                # Texto normal
-                elif part.text and not part.thought:
-                    response_text += part.text
-            
-            # Verifica Google Search
-            search_used = False
-            try:
-                if hasattr(response.candidates[0], 'grounding_metadata'):
-                    grounding = response.candidates[0].grounding_metadata
-                    if grounding and hasattr(grounding, 'web_search_queries'):
-                        queries = grounding.web_search_queries
-                        if queries and isinstance(queries, (list, tuple)) and len(queries) > 0:
-                            search_used = True
-                            logger.info(f"🔍 Google Search usado: {len(queries)} queries")
-                            gemini_stats.record_search(user_id)
-            except Exception as e:
-                logger.warning(f"⚠️ Erro ao verificar Google Search: {e}")
+                for part in candidate.content.parts:
+                    tipo, dados = self._extrair_part(part)
+                    if tipo is None:
+                        continue
+                    
+                    if primeiro_token is None:
+                        primeiro_token = (time.time() - start_time) * 1000
+                        logger.info(f"⚡ Primeiro token em {primeiro_token:.2f}ms")
+                    
+                    if tipo == 'thought':
+                        thinking_parts.append(dados)
+                    elif tipo == 'code':
+                        code_results.append(dados)
+                    elif tipo == 'code_result':
+                        if code_results:
+                            code_results[-1]['result'] = dados
+                    elif tipo == 'text':
+                        response_text += dados
+                    
+                    yield {'type': tipo, 'data': dados}
             
-            # Registra estatísticas
-            tokens_input = 0
-            tokens_output = 0
+            if search_used:
+                gemini_stats.record_search(user_id)
             
-            if hasattr(response, 'usage_metadata'):
-                tokens_input = response.usage_metadata.prompt_token_count
-                tokens_output = response.usage_metadata.candidates_token_count
-                
-                gemini_stats.record_request(user_id, tokens_input, tokens_output)
-                
-                logger.info(f"📊 Tokens - Input: {tokens_input:,} | Output: {tokens_output:,}")
-                
-                # ALERTA se consumo alto
-                if tokens_input > 100000:
-                    logger.warning(f"⚠️ CONSUMO ALTO DE TOKENS INPUT: {tokens_input:,}")
-                    logger.warning(f"💡 Considere desativar o Modo Bragantec para economizar")
-                
-                if hasattr(response.usage_metadata, 'cached_content_token_count'):
-                    cached = response.usage_metadata.cached_content_token_count
-                    if cached is not None and cached > 0:
-                        logger.info(f"💾 Cache usado: {cached:,} tokens economizados!")
+            thinking_process = ''.join(thinking_parts) or None
             
-            duration = (time.time() - start_time) * 1000
-            logger.info(f"✅ Resposta gerada em {duration:.2f}ms ({len(response_text)} chars)")
-            
-            # Log de uso
-            log_ai_usage(
-                self.model_name,
-                'CHAT',
-                tokens_input=tokens_input,
-                tokens_output=tokens_output,
-                thinking=bool(thinking_process),
-                search=search_used
+            # Registra estatísticas
+            tokens_input, tokens_output = self._registrar_uso(
+                usage_metadata, user_id, bool(thinking_process),
+                search_used, start_time, len(response_text), tokens_estimados,
+                prompt=None if arquivos else (system_instruction, contents),  # Tokens dos arquivos atrapalhariam a calibração
+                perfil=perfil
             )
             
-            return {
-                'response': response_text or response.text,
+            yield {'type': 'done', 'data': {
+                'response': response_text,
                 'thinking_process': thinking_process,
                 'search_used': search_used,
-                'code_executed': code_executed,
+                'code_executed': bool(code_results),
                 'code_results': code_results if code_results else None,
                 'tokens_input': tokens_input,
                 'tokens_output': tokens_output,
-                'total_tokens': tokens_input + tokens_output
-            }
+                'total_tokens': tokens_input + tokens_output,
+                'time_to_first_token_ms': round(primeiro_token) if primeiro_token is not None else None
+            }}
             
         except Exception as e:
             duration = (time.time() - start_time) * 1000
-            logger.error(f"❌ Erro após {duration:.2f}ms: {str(e)}")
+            logger.error(f"❌ Erro no streaming após {duration:.2f}ms: {str(e)}")
             import traceback
             logger.error(f"Traceback:\n{traceback.format_exc()}")
             
-            return {
-                'response': f"Erro ao processar mensagem: {str(e)}",
-                'thinking_process': None,
-                'error': True,
-                'search_used': False,
-                'code_executed': False,
-                'code_results': None,
-                'tokens_input': 0,
-                'tokens_output': 0,
-                'total_tokens': 0
-            }
+            yield {'type': 'error', 'data': f"Erro ao processar mensagem: {str(e)}"}
     
-    def upload_file(self, file_path, mime_type=None):
+    def resumir_historico(self, resumo_anterior, mensagens, user_id=None):
+        """
+        Atualiza o resumo acumulado de um chat com mensagens antigas (só as novas são enviadas)
+        Chamada curta, sem ferramentas nem thinking, com prioridade de lote na fila
+        Retorna o novo resumo ou None
+        """
+        trechos = []
+        for msg in mensagens:
+            autor = 'Usuário' if msg['role'] == 'user' else 'APBIA'
+            trechos.append(f"{autor}: {msg['conteudo']}")
+        
+        prompt = (
+            f"Resumo atual da conversa:\n{resumo_anterior or '(vazio)'}\n\n"
+            f"Novas mensagens:\n" + "\n\n".join(trechos) + "\n\n"
+            "Reescreva o resumo incorporando as novas mensagens. Guarde decisões, dados do projeto, "
+            "dúvidas em aberto e preferências do usuário; descarte saudações e repetições. "
+            f"No máximo {Config.HISTORICO_RESUMO_MAX_TOKENS // 2} palavras, em português, sem introdução."
+        )
+        system_instruction = "Você resume conversas entre estudantes e a APBIA, assistente de projetos da Bragantec."
+        contents = [prompt]
+        
+        tokens_estimados = self._estimar_tokens(contents, system_instruction)
+        can_proceed, error_msg = self._admitir(user_id, None, tokens_estimados, PRIORIDADE_LOTE)
+        if not can_proceed:
+            logger.warning(f"⚠️ Resumo do histórico adiado: {error_msg}")
+            return None
+        
+        start_time = time.time()
         
         try:
-            logger.info(f"📤 Upload: {file_path}")
-
-            # Define MIME type 
-            if mime_type:
-                logger.info(f"📋 Usando MIME type fornecido: {mime_type}")
-
-                with open(file_path, 'rb') as f:
-                    uploaded_file = self.client.files.upload(
-                        file=f,
-                        config={
-                            'mime_type': mime_type,
-                            'display_name': os.path.basename(file_path)
-                        }
+            # Chamada curta e idempotente: pode ganhar uma cópia se demorar além do normal
+            response = self.resiliencia.executar(
+                lambda: self.client.models.generate_content(
+                    model=self.model_name,
+                    contents=contents,
+                    config=types.GenerateContentConfig(
+                        system_instruction=system_instruction,
+                        temperature=0.2,
+                        max_output_tokens=Config.HISTORICO_RESUMO_MAX_TOKENS,
+                        safety_settings=self.safety_settings,
+                        thinking_config=types.ThinkingConfig(thinking_budget=0)
                     )
-            else:
-                # Fallback: deixa API detectar
-                logger.info(f"🔍 Deixando API detectar MIME type")
-                with open(file_path, 'rb') as f:
-                    uploaded_file = self.client.files.upload(file=f)
+                ),
+                tipo='resumo', hedge=True, reservar_extra=self._reserva_hedge(user_id, tokens_estimados),
+                liberar=self._liberacao(user_id, tokens_estimados)
+            )
+            
+            resumo = (response.text or '').strip()
+            self._registrar_uso(
+                getattr(response, 'usage_metadata', None), user_id, False, False,
+                start_time, len(resumo), tokens_estimados, prompt=(system_instruction, contents)
+            )
+            return resumo or None
+        
+        except Exception as e:
+            logger.error(f"❌ Erro ao resumir histórico: {e}")
+            return None
 
-            logger.info(f"✅ Upload concluído: {uploaded_file.display_name}")
-            logger.info(f"   URI: {uploaded_file.uri}")
-            logger.info(f"   MIME: {uploaded_file.mime_type}")
+    def gerar_estruturado(self, message, response_schema, tipo_usuario='participante', user_id=None,
+                          usar_contexto_bragantec=False, contexto_top_k=None, prioridade=None, on_fila=None,
+                          thinking_budget=None, hedge=False, cache_ttl=0):
+        """
+        Geração com saída estruturada (response_mime_type JSON + response_schema)
+        O Gemini devolve JSON já no formato do schema: nada de cercas ``` nem json.loads manual
+        Sem ferramentas (a API não aceita Google Search junto de response_schema)
+        thinking_budget limita o thinking (ex.: gerações pequenas e paralelas)
+        hedge: duplica a chamada se ela demorar além do normal (só para gerações curtas)
+        Pedidos idênticos simultâneos viram uma chamada só; cache_ttl guarda o resultado por alguns segundos
+        Retorna {'dados', 'tokens_input', 'tokens_output', 'total_tokens'} ou {'error': True, 'response': msg}
+        """
+        logger.info("🧩 Iniciando geração estruturada com Gemini")
 
-            # Aguarda processamento (para vídeos)
-            while uploaded_file.state.name == "PROCESSING":
-                logger.info("⏳ Processando...")
-                time.sleep(2)
-                uploaded_file = self.client.files.get(name=uploaded_file.name)
+        start_time = time.time()
+
+        try:
+            contents, config_base, system_instruction, tools, tools_key = self._preparar_chat(
+                message, tipo_usuario, None, False, False,
+                usar_contexto_bragantec, None, contexto_top_k
+            )
+            config_base['response_mime_type'] = 'application/json'
+            config_base['response_schema'] = response_schema
+            if thinking_budget is not None:
+                config_base['thinking_config'] = types.ThinkingConfig(thinking_budget=thinking_budget)
+
+            chave = chave_pedido('estruturado', self.model_name, system_instruction, contents, config_base)
+
+            def gerar():
+                tokens_estimados = self._estimar_tokens(contents, system_instruction)
+                can_proceed, error_msg = self._admitir(user_id, tipo_usuario, tokens_estimados, prioridade, on_fila)
+                if not can_proceed:
+                    logger.warning(f"⚠️ Rate limit excedido: {error_msg}")
+                    return {'response': f"⚠️ {error_msg}", 'error': True}
+                inicio = time.time()
+
+                response = self._generate_with_prefix(
+                    contents, config_base, tipo_usuario, usar_contexto_bragantec,
+                    system_instruction, tools, tools_key, hedge=hedge,
+                    reservar_extra=self._reserva_hedge(user_id, tokens_estimados) if hedge else None,
+                    tipo='estruturado', liberar=self._liberacao(user_id, tokens_estimados)
+                )
 
-            if uploaded_file.state.name == "FAILED":
-                raise ValueError(f"Falha no processamento: {uploaded_file.error}")
+                # Só as parts de texto (o thinking vem em parts separadas)
+                texto = ''.join(
+                    dados for tipo, dados in map(self._extrair_part, response.candidates[0].content.parts)
+                    if tipo == 'text'
+                )
+                dados = getattr(response, 'parsed', None)
+                if dados is None:
+                    dados = json.loads(texto)
 
-            logger.info("✅ Arquivo pronto!")
-            return uploaded_file
+                tokens_input, tokens_output = self._registrar_uso(
+                    getattr(response, 'usage_metadata', None), user_id, False, False,
+                    inicio, len(texto), tokens_estimados, prompt=(system_instruction, contents)
+                )
 
-        except Exception as e:
-            logger.error(f"❌ Erro no upload: {e}")
-            return None
+                return {
+                    'dados': dados,
+                    'tokens_input': tokens_input,
+                    'tokens_output': tokens_output,
+                    'total_tokens': tokens_input + tokens_output
+                }
 
+            return coalescedor.executar(chave, gerar, ttl=cache_ttl, guardar=lambda r: not r.get('error'))
 
-    def chat_with_file(self, message, file_path, tipo_usuario='participante', user_id=None, keep_file_on_gemini=False, mime_type=None):
+        except Exception as e:
+            duration = (time.time() - start_time) * 1000
+            logger.error(f"❌ Erro na geração estruturada após {duration:.2f}ms: {str(e)}")
+            return {'response': f"Erro ao gerar conteúdo: {str(e)}", 'error': True}
+
+    def upload_file(self, file_path, mime_type=None):
+        """
+        Envia um arquivo e espera ele ficar pronto (modo síncrono do UploadPipeline)
+        Retorna o types.File ou None se falhar
+        """
+        return self.uploads.enviar(file_path, mime_type=mime_type).aguardar()
+
+    def chat_with_file(self, message, file_path, tipo_usuario='participante', user_id=None, keep_file_on_gemini=False, mime_type=None,
+                       prioridade=None, on_fila=None, uploaded_file=None):
+        """
+        uploaded_file: arquivo já no Gemini (file_registry); nesse caso não há upload e ele nunca é deletado
+        """
         
-        # Verifica limites
-        can_proceed, error_msg = gemini_stats.check_limits(user_id)
+        # Verifica limites (o arquivo só é contado quando o Gemini devolve o uso real)
+        tokens_estimados = self._estimar_tokens([message], self._get_system_instruction(tipo_usuario))
+        can_proceed, error_msg = self._admitir(user_id, tipo_usuario, tokens_estimados, prioridade, on_fila)
         if not can_proceed:
             return {'response': f"⚠️ {error_msg}", 'error': True}
 
+        # Qualquer saída antes da chamada (upload falhou, exceção...) devolve a reserva;
+        # dentro de _generate_with_prefix quem cuida dela é a resiliência
+        liberar = self._liberacao(user_id, tokens_estimados)
+        reserva_pendente = True
+
         try:
-            # Upload com MIME type
-            uploaded_file = self.upload_file(file_path, mime_type=mime_type)
+            # Upload com MIME type (se ainda não estiver no Gemini)
+            if uploaded_file is not None:
+                keep_file_on_gemini = True
+            else:
+                uploaded_file = self.upload_file(file_path, mime_type=mime_type)
             if not uploaded_file:
                 return {'response': 'Erro ao fazer upload', 'error': True}
 
@@ -535,10 +906,11 @@ class GeminiService:
             # System instruction
             system_instruction = self._get_system_instruction(tipo_usuario)
 
-            full_message = f"{system_instruction}\n\n{self.context_files}\n\n{message}"
+            contexto_bragantec = self.retriever.montar_contexto(message)
+            full_message = f"{contexto_bragantec}\n\n{message}"
 
             # Config
-            config = types.GenerateContentConfig(
+            config_base = dict(
                 temperature=0.7,
                 max_output_tokens=65536,
                 safety_settings=self.safety_settings,
@@ -549,10 +921,10 @@ class GeminiService:
             )
 
             # Gera resposta
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=[full_message, uploaded_file],
-                config=config
+            reserva_pendente = False
+            response = self._generate_with_prefix(
+                [full_message, uploaded_file], config_base, tipo_usuario, False,
+                system_instruction, [], '', liberar=liberar
             )
 
             # Extrai dados
@@ -569,7 +941,7 @@ class GeminiService:
             if hasattr(response, 'usage_metadata'):
                 tokens_input = response.usage_metadata.prompt_token_count
                 tokens_output = response.usage_metadata.candidates_token_count
-                gemini_stats.record_request(user_id, tokens_input, tokens_output)
+                gemini_stats.record_request(user_id, tokens_input, tokens_output, tokens_estimados)
                 logger.info(f"📊 Tokens - Input: {tokens_input:,} | Output: {tokens_output:,}")
 
             # Decide se mantém ou deleta
@@ -596,42 +968,20 @@ class GeminiService:
         except Exception as e:
             logger.error(f"❌ Erro: {e}")
             return {'response': f"Erro: {str(e)}", 'error': True}
+
+        finally:
+            if reserva_pendente:
+                liberar()
     
     
     def count_tokens(self, text):
-
-        try:
-            
-        
-            # Cria conteúdo para contar
-            contents = [
-                Content(
-                    parts=[Part(text=text)],
-                    role='user'
-                )
-            ]
-        
-            result = self.client.models.count_tokens(
-                model=self.model_name,
-                contents=contents
-            )
-        
-            # Retorna contagem total
-            token_count = result.total_tokens
-        
-            logger.info(f"📊 Contagem de tokens: {token_count} tokens para {len(text)} caracteres")
-        
-            return token_count
-        
-        except Exception as e:
-            logger.warning(f"⚠️ Erro ao contar tokens via API: {e}")
-            logger.info("💡 Usando fallback: 1 token ≈ 4 caracteres")
-        
-            # Fallback: estimativa aproximada
-            # geralmente 1 token ≈ 4 caracteres
-            estimated_tokens = max(1, len(text) // 4)
-        
-            return estimated_tokens
+        """
+        Estimativa local de tokens de um texto (sem chamada à API,
+        então o contador da interface não gasta RPM)
+        """
+        token_count = token_estimator.estimar_texto(text)
+        logger.debug(f"📊 Contagem de tokens (estimada): {token_count} tokens para {len(text)} caracteres")
+        return token_count
     
     def get_stats(self):
         """Retorna estatísticas atuais"""
@@ -0,0 +1,129 @@
+"""
+Histórico do chat com orçamento de tokens
+As mensagens mais recentes vão na íntegra; as mais antigas viram um resumo
+acumulado, gravado no próprio chat e atualizado aos poucos (só com as mensagens novas).
+Assim o custo de entrada de cada turno fica limitado, por mais longa que seja a conversa
+"""
+
+from threading import Lock
+from config import Config
+from utils.advanced_logger import logger
+from services.token_estimator import token_estimator
+
+
+class HistoryManager:
+    """Monta o history enviado ao Gemini e compacta o que ficou fora da janela"""
+
+    def __init__(self, dao, gemini, orcamento_tokens=None):
+        self.dao = dao
+        self.gemini = gemini
+        self.orcamento_tokens = orcamento_tokens or Config.HISTORICO_MAX_TOKENS
+
+        self._compactando = set()
+        self._lock = Lock()
+
+    @staticmethod
+    def _cortar(texto, max_tokens):
+        """Corta uma mensagem muito longa (ex.: respostas enormes) para caber no orçamento"""
+        tokens = token_estimator.estimar_texto(texto)
+        if tokens <= max_tokens:
+            return texto, tokens
+        chars = int(len(texto) * max_tokens / tokens)
+        return texto[:chars] + "\n[... mensagem cortada para economizar tokens ...]", max_tokens
+
+    def _janela(self, mensagens, resumo, orcamento=None):
+        """
+        Escolhe, das mais novas para as mais velhas, as mensagens que cabem no orçamento
+        Retorna (mensagens na íntegra, mensagens que ficaram de fora)
+        """
+        orcamento = (orcamento or self.orcamento_tokens) - (token_estimator.estimar_texto(resumo) if resumo else 0)
+        janela = []
+
+        for i in range(len(mensagens) - 1, -1, -1):
+            conteudo, tokens = self._cortar(mensagens[i]['conteudo'], Config.HISTORICO_MAX_TOKENS_MENSAGEM)
+
+            # As últimas mensagens entram sempre (cortadas se preciso)
+            if tokens > orcamento and len(janela) >= Config.HISTORICO_MIN_MENSAGENS:
+                return list(reversed(janela)), mensagens[:i + 1]
+
+            orcamento -= tokens
+            janela.append(dict(mensagens[i], conteudo=conteudo))
+
+        return list(reversed(janela)), []
+
+    def montar(self, chat_id, orcamento=None):
+        """
+        Retorna (history no formato do GeminiService, precisa_compactar)
+        history = [resumo (se houver)] + mensagens recentes na íntegra
+        orcamento: tokens do histórico neste turno (None = HISTORICO_MAX_TOKENS)
+        """
+        estado = self.dao.obter_resumo_chat(chat_id)
+        resumo = estado['resumo']
+
+        mensagens = self.dao.obter_mensagens_apos(chat_id, estado['ate_mensagem_id'], n=Config.HISTORICO_MAX_MENSAGENS)
+        janela, fora = self._janela(mensagens, resumo, orcamento)
+
+        history = []
+        if resumo:
+            history.append({
+                'role': 'user',
+                'parts': [f"=== RESUMO DA CONVERSA ATÉ AQUI ===\n{resumo}\n=== FIM DO RESUMO ==="]
+            })
+
+        for msg in janela:
+            history.append({
+                'role': msg['role'],
+                'parts': [msg['conteudo']]
+            })
+
+        precisa_compactar = bool(fora) or len(mensagens) >= Config.HISTORICO_MAX_MENSAGENS
+        if fora:
+            logger.debug(f"🗜️ Chat {chat_id}: {len(janela)} mensagens na íntegra, {len(fora)} aguardando resumo")
+
+        return history, precisa_compactar
+
+    def compactar(self, chat_id, user_id=None):
+        """
+        Junta ao resumo as mensagens que não cabem mais na janela
+        Roda fora da requisição (fila de jobs); uma compactação por chat de cada vez
+        """
+        with self._lock:
+            if chat_id in self._compactando:
+                return False
+            self._compactando.add(chat_id)
+
+        try:
+            estado = self.dao.obter_resumo_chat(chat_id)
+            resumo = estado['resumo']
+
+            # Onde começa a janela depois de compactar: usa só parte do orçamento,
+            # para sobrar espaço e a próxima compactação demorar alguns turnos
+            recentes = self.dao.obter_mensagens_apos(chat_id, estado['ate_mensagem_id'], n=Config.HISTORICO_MAX_MENSAGENS)
+            janela, _ = self._janela(recentes, resumo, int(self.orcamento_tokens * Config.HISTORICO_COMPACTAR_PARA))
+            if not janela:
+                return False
+            corte = janela[0]['id']
+
+            # Mensagens mais antigas ainda não resumidas (em lotes, das mais velhas para as mais novas)
+            antigas = self.dao.obter_mensagens_apos(
+                chat_id, estado['ate_mensagem_id'], n=Config.HISTORICO_RESUMO_LOTE, mais_recentes=False
+            )
+            antigas = [m for m in antigas if m['id'] < corte]
+            if not antigas:
+                return False
+
+            novo_resumo = self.gemini.resumir_historico(resumo, antigas, user_id=user_id)
+            if not novo_resumo:
+                return False
+
+            self.dao.atualizar_resumo_chat(chat_id, novo_resumo, antigas[-1]['id'])
+            logger.info(f"🗜️ Chat {chat_id}: {len(antigas)} mensagens antigas incorporadas ao resumo")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Erro ao compactar histórico do chat {chat_id}: {e}")
+            return False
+
+        finally:
+            with self._lock:
+                self._compactando.discard(chat_id)
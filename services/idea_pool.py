@@ -0,0 +1,422 @@
+"""
+Estoque de ideias de projeto para /projetos/gerar-ideias
+Um gerador em segundo plano pede várias ideias por categoria de uma vez (chamada cara:
+corpus da Bragantec, saída estruturada em JSON), valida, remove repetidas e guarda num SQLite compartilhado
+entre os workers. Cada clique só retira um conjunto do estoque; a IA só é chamada
+quando o estoque fica baixo ou as ideias ficam velhas
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+import unicodedata
+from config import Config
+from utils.advanced_logger import logger
+from services.gemini_scheduler import PRIORIDADE_LOTE
+
+
+CATEGORIAS = [
+    "Ciências da Natureza e Exatas",
+    "Informática",
+    "Ciências Humanas e Linguagens",
+    "Engenharias"
+]
+
+CAMPOS_OBRIGATORIOS = ['titulo', 'resumo', 'palavras_chave']
+
+_CAMPOS_IDEIA = ['titulo', 'resumo', 'palavras_chave', 'inspiracao_vencedores',
+                 'diferenciais_competitivos', 'viabilidade_tecnica']
+
+# response_schema do lote: {categoria: [ideias]} (saída estruturada do Gemini)
+SCHEMA_IDEIAS = {
+    'type': 'OBJECT',
+    'properties': {
+        categoria: {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {campo: {'type': 'STRING'} for campo in _CAMPOS_IDEIA},
+                'required': _CAMPOS_IDEIA,
+                'property_ordering': _CAMPOS_IDEIA
+            },
+            'min_items': 1
+        }
+        for categoria in CATEGORIAS
+    },
+    'required': CATEGORIAS,
+    'property_ordering': CATEGORIAS
+}
+
+PROMPT_IDEIAS = """
+🎯 **MISSÃO CRÍTICA: CRIAR PROJETOS VENCEDORES PARA A BRAGANTEC 2025**
+
+Você recebeu uma seleção de resumos das edições anteriores da Bragantec (feira de ciências do IFSP Bragança Paulista), tirados dos cadernos de resumos dos projetos apresentados.
+
+**ANÁLISE OBRIGATÓRIA ANTES DE CRIAR:**
+
+1. **ESTUDE OS PROJETOS VENCEDORES** nos arquivos de contexto que você possui
+2. **IDENTIFIQUE PADRÕES DE SUCESSO:**
+   - Que temas/abordagens venceram mais?
+   - Quais características os projetos premiados têm em comum?
+   - Que nível de complexidade/inovação foi valorizado?
+   - Quais problemas reais foram abordados?
+   - Que metodologias foram bem avaliadas?
+
+3. **EXTRAIA INSIGHTS DOS VENCEDORES:**
+   - Títulos: Como eram formulados?
+   - Relevância: Que impacto social/científico tinham?
+   - Inovação: O que os diferenciava?
+   - Viabilidade: Eram projetos executáveis por estudantes?
+
+4. **ENTENDA OS CRITÉRIOS DE AVALIAÇÃO:**
+   - **Inovação e criatividade** (30 pontos)
+   - **Relevância científica/social** (25 pontos)
+   - **Fundamentação teórica** (20 pontos)
+   - **Viabilidade de execução** (15 pontos)
+   - **Impacto potencial** (10 pontos)
+
+---
+
+**AGORA CRIE {n} IDEIAS DE PROJETOS PARA CADA UMA DAS 4 CATEGORIAS:**
+
+Com base na sua análise dos projetos vencedores das edições anteriores da Bragantec, crie {n} ideias de projeto DIFERENTES ENTRE SI para CADA uma das 4 categorias:
+
+1. **Ciências da Natureza e Exatas**
+2. **Informática**
+3. **Ciências Humanas e Linguagens**
+4. **Engenharias**
+
+**REQUISITOS PARA CADA PROJETO:**
+
+✅ **DEVE SER INSPIRADO EM PROJETOS VENCEDORES ANTERIORES** (mas não cópia!)
+✅ **DEVE ABORDAR PROBLEMAS REAIS E ATUAIS DE 2025**
+✅ **DEVE SER INOVADOR** (trazer algo novo ou melhorado)
+✅ **DEVE SER VIÁVEL** para estudantes de ensino médio/técnico executarem
+✅ **DEVE TER IMPACTO** científico, social ou ambiental mensurável
+✅ **DEVE TER FUNDAMENTAÇÃO TEÓRICA** sólida
+
+
+---
+
+**PARA CADA IDEIA, FORNEÇA:**
+
+- **titulo**: Título atrativo, direto e científico (máx 80 caracteres)
+  * Exemplo de títulos vencedores: específicos, técnicos, com termos científicos
+
+- **resumo**: Resumo executivo COMPLETO E PROFISSIONAL (200-250 palavras) contendo:
+  * **Introdução**: Contexto e problema (2-3 frases)
+  * **Objetivos**: O que o projeto pretende alcançar (1-2 frases)
+  * **Metodologia**: Como será desenvolvido - materiais, métodos (3-4 frases)
+  * **Resultados Esperados**: Impactos e conclusões esperadas (2-3 frases)
+  * **Relevância**: Por que é importante (1-2 frases)
+
+- **palavras_chave**: Exatamente 3 palavras-chave técnicas/científicas separadas por vírgula
+  * Use termos que projetos vencedores usaram
+
+- **inspiracao_vencedores**: Liste 2-3 características de projetos vencedores que inspiraram esta ideia
+  * Exemplo: "Baseado no padrão de projetos premiados que abordam sustentabilidade com tecnologia IoT"
+
+- **diferenciais_competitivos**: O que torna este projeto um VENCEDOR POTENCIAL (máx 150 palavras)
+  * Compare com projetos vencedores anteriores
+  * Explique por que este seria bem avaliado pelos jurados
+
+- **viabilidade_tecnica**: Nível de dificuldade e recursos necessários (máx 100 palavras)
+  * Seja realista sobre o que estudantes podem fazer
+
+---
+
+**LEMBRE-SE:**
+- Você recebeu resumos selecionados dos cadernos das edições anteriores da Bragantec
+- USE esse conhecimento para criar projetos com padrões de sucesso comprovados
+- Não copie projetos, mas INSPIRE-SE nos elementos que fizeram eles vencerem
+- Pense como um jurado: O que ME impressionaria neste projeto?
+{evitar}
+"""
+
+
+def _normalizar_titulo(titulo):
+    """Título sem acentos, caixa e pontuação (para achar ideias repetidas)"""
+    texto = unicodedata.normalize('NFKD', titulo or '').encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', ' ', texto.lower()).strip()
+
+
+def validar_ideias(dados):
+    """
+    Aceita {categoria: ideia} ou {categoria: [ideias]} e devolve {categoria: [ideias válidas]}
+    Ideias sem os campos obrigatórios são descartadas
+    """
+    if not isinstance(dados, dict):
+        raise ValueError("Resposta não é um objeto JSON")
+
+    validas = {}
+    for categoria in CATEGORIAS:
+        if categoria not in dados:
+            raise ValueError(f"Categoria '{categoria}' não encontrada")
+
+        ideias = dados[categoria]
+        if isinstance(ideias, dict):
+            ideias = [ideias]
+
+        validas[categoria] = []
+        for ideia in ideias or []:
+            if not isinstance(ideia, dict) or any(not ideia.get(campo) for campo in CAMPOS_OBRIGATORIOS):
+                continue
+            # Metadado de que foi gerado com análise de vencedores
+            ideia['gerado_com_analise_vencedores'] = True
+            ideia['ano_geracao'] = 2025
+            validas[categoria].append(ideia)
+
+    return validas
+
+
+class IdeaPool:
+    """Estoque de ideias por categoria, num SQLite compartilhado entre os workers"""
+
+    def __init__(self, gemini, caminho=None):
+        self.gemini = gemini
+        self.caminho = caminho or Config.IDEIAS_POOL_DB_PATH
+        self._local = threading.local()
+        self._agendador = None
+        self._agendador_pid = None
+        self._lock = threading.Lock()
+
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+        conn = self._conexao()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS ideias (
+                id INTEGER PRIMARY KEY,
+                categoria TEXT NOT NULL,
+                titulo_norm TEXT NOT NULL UNIQUE,
+                dados TEXT NOT NULL,
+                criado_em REAL NOT NULL,
+                servido_em REAL,
+                servido_para INTEGER
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_ideias_estoque ON ideias (categoria, servido_em, criado_em)")
+        conn.execute("CREATE TABLE IF NOT EXISTS controle (chave TEXT PRIMARY KEY, ate REAL NOT NULL)")
+
+    def _conexao(self):
+        """Uma conexão por thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=Config.QUOTA_SQLITE_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transacao(self, func):
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            resultado = func(conn)
+            conn.execute("COMMIT")
+            return resultado
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    # ------------------------------------------------------------------
+    # Estoque
+    # ------------------------------------------------------------------
+
+    def _limite_validade(self):
+        return time.time() - Config.IDEIAS_POOL_VALIDADE
+
+    def estoque(self):
+        """Ideias disponíveis (não servidas e ainda válidas) por categoria"""
+        rows = self._conexao().execute(
+            "SELECT categoria, COUNT(*) FROM ideias WHERE servido_em IS NULL AND criado_em > ? GROUP BY categoria",
+            (self._limite_validade(),)
+        ).fetchall()
+        contagem = dict(rows)
+        return {categoria: contagem.get(categoria, 0) for categoria in CATEGORIAS}
+
+    def servir(self, user_id):
+        """
+        Retira um conjunto (uma ideia por categoria) do estoque
+        Retorna {categoria: ideia} ou None se alguma categoria estiver vazia
+        """
+        self.iniciar_agendador()  # Já roda desde o startup; só recria se o worker veio de um fork
+        limite = self._limite_validade()
+
+        def retirar(conn):
+            escolhidas = {}
+            for categoria in CATEGORIAS:
+                row = conn.execute(
+                    "SELECT id, dados FROM ideias WHERE categoria = ? AND servido_em IS NULL AND criado_em > ? "
+                    "ORDER BY criado_em LIMIT 1",
+                    (categoria, limite)
+                ).fetchone()
+                if row is None:
+                    return None
+                escolhidas[categoria] = row
+
+            agora = time.time()
+            conn.executemany(
+                "UPDATE ideias SET servido_em = ?, servido_para = ? WHERE id = ?",
+                [(agora, user_id, row[0]) for row in escolhidas.values()]
+            )
+            return {categoria: json.loads(row[1]) for categoria, row in escolhidas.items()}
+
+        ideias = self._transacao(retirar)
+        if ideias:
+            logger.info(f"💡 Ideias servidas do estoque para User {user_id} (restam {self.estoque()})")
+        return ideias
+
+    def adicionar(self, ideias_por_categoria):
+        """Guarda ideias novas; as repetidas (mesmo título de alguma já gerada) são ignoradas"""
+        agora = time.time()
+        linhas = []
+        for categoria, ideias in ideias_por_categoria.items():
+            for ideia in ideias:
+                titulo_norm = _normalizar_titulo(ideia.get('titulo'))
+                if titulo_norm:
+                    linhas.append((categoria, titulo_norm, json.dumps(ideia, ensure_ascii=False), agora))
+
+        def inserir(conn):
+            antes = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO ideias (categoria, titulo_norm, dados, criado_em) VALUES (?, ?, ?, ?)",
+                linhas
+            )
+            return conn.total_changes - antes
+
+        inseridas = self._transacao(inserir)
+        if inseridas < len(linhas):
+            logger.info(f"💡 {len(linhas) - inseridas} ideia(s) repetida(s) descartada(s)")
+        return inseridas
+
+    def _titulos_recentes(self, n=40):
+        rows = self._conexao().execute(
+            "SELECT dados FROM ideias ORDER BY criado_em DESC LIMIT ?", (n,)
+        ).fetchall()
+        return [json.loads(row[0]).get('titulo') for row in rows]
+
+    def limpar(self):
+        """Remove ideias vencidas do estoque e o histórico de servidas mais antigo que IDEIAS_POOL_HISTORICO"""
+        self._transacao(lambda conn: (
+            conn.execute("DELETE FROM ideias WHERE servido_em IS NULL AND criado_em <= ?", (self._limite_validade(),)),
+            conn.execute("DELETE FROM ideias WHERE servido_em IS NOT NULL AND servido_em <= ?",
+                         (time.time() - Config.IDEIAS_POOL_HISTORICO,))
+        ))
+
+    # ------------------------------------------------------------------
+    # Geração
+    # ------------------------------------------------------------------
+
+    def precisa_reabastecer(self):
+        return min(self.estoque().values()) < Config.IDEIAS_POOL_MINIMO
+
+    def _adquirir(self, chave, duracao):
+        """Lease no SQLite entre os workers (expira sozinho se o processo morrer)"""
+        agora = time.time()
+
+        def adquirir(conn):
+            row = conn.execute("SELECT ate FROM controle WHERE chave = ?", (chave,)).fetchone()
+            if row and row[0] > agora:
+                return False
+            conn.execute(
+                "INSERT INTO controle (chave, ate) VALUES (?, ?) "
+                "ON CONFLICT (chave) DO UPDATE SET ate = excluded.ate",
+                (chave, agora + duracao)
+            )
+            return True
+
+        return self._transacao(adquirir)
+
+    def _adquirir_geracao(self):
+        """Só um worker gera por vez"""
+        return self._adquirir('gerando', Config.IDEIAS_POOL_LEASE)
+
+    def _liberar_geracao(self):
+        self._transacao(lambda conn: conn.execute("DELETE FROM controle WHERE chave = 'gerando'"))
+
+    def gerar_lote(self, user_id=None, on_fila=None):
+        """
+        Chama a IA pedindo IDEIAS_POR_GERACAO ideias por categoria (saída estruturada) e guarda as válidas
+        Retorna a quantidade inserida
+        """
+        titulos = [t for t in self._titulos_recentes() if t]
+        evitar = ''
+        if titulos:
+            evitar = "- NÃO repita nem crie variações destes títulos já usados: " + "; ".join(titulos)
+
+        prompt = PROMPT_IDEIAS.format(n=Config.IDEIAS_POR_GERACAO, evitar=evitar)
+
+        logger.info("🤖 Gerando lote de ideias (Modo Bragantec OBRIGATÓRIO)")
+        logger.debug(f"📚 Enviando os {Config.BRAGANTEC_TOP_K_IDEIAS} resumos mais relevantes da Bragantec")
+
+        response = self.gemini.gerar_estruturado(
+            prompt,
+            SCHEMA_IDEIAS,
+            tipo_usuario='participante',
+            user_id=user_id,
+            usar_contexto_bragantec=True,  # OBRIGATÓRIO
+            contexto_top_k=Config.BRAGANTEC_TOP_K_IDEIAS,
+            prioridade=PRIORIDADE_LOTE,
+            on_fila=on_fila
+        )
+
+        if response.get('error'):
+            raise RuntimeError(response.get('response'))
+
+        inseridas = self.adicionar(validar_ideias(response['dados']))
+        logger.info(f"✅ {inseridas} ideias novas no estoque ({response.get('tokens_input', 0):,} tokens de entrada)")
+        return inseridas
+
+    def reabastecer(self):
+        """Gera um lote se o estoque estiver baixo e nenhum outro worker estiver gerando"""
+        if not self.precisa_reabastecer() or not self._adquirir_geracao():
+            return False
+        try:
+            inseridas = self.gerar_lote()
+            return inseridas > 0
+        except Exception as e:
+            logger.error(f"❌ Erro ao reabastecer ideias: {e}")
+            return False
+        finally:
+            self._liberar_geracao()
+
+    def reabastecer_async(self):
+        """Dispara o reabastecimento na fila de jobs, sem segurar a requisição"""
+        if self.precisa_reabastecer():
+            from services.job_queue import job_queue
+            job_queue.submit(None, 'reabastecer_ideias', lambda job: ({'success': self.reabastecer()}, 200))
+
+    def iniciar_agendador(self):
+        """
+        Verifica o estoque a cada IDEIAS_POOL_INTERVALO (renova ideias vencidas). Chamado no startup do app
+        Cada worker tem sua thread, mas o lease 'agendador' deixa só um ciclo por intervalo no servidor
+        """
+        if self._agendador is not None and self._agendador_pid == os.getpid():
+            return
+        with self._lock:
+            if self._agendador is not None and self._agendador_pid == os.getpid():
+                return
+            # Threads não sobrevivem ao fork (gunicorn --preload): cada processo inicia a sua
+            self._agendador_pid = os.getpid()
+            self._agendador = threading.Thread(target=self._loop_agendador, name='apbia-ideias', daemon=True)
+            self._agendador.start()
+        logger.info("💡 Agendador do estoque de ideias iniciado")
+
+    def _loop_agendador(self):
+        while True:
+            try:
+                # O worker que pegar o lease faz o ciclo; os outros pulam até ele vencer
+                if self._adquirir('agendador', Config.IDEIAS_POOL_INTERVALO * 0.9):
+                    self.limpar()
+                    self.reabastecer()
+            except Exception as e:
+                logger.error(f"❌ Erro no agendador de ideias: {e}")
+            time.sleep(Config.IDEIAS_POOL_INTERVALO)
+
+    def get_stats(self):
+        return {'estoque': self.estoque()}
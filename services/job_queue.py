@@ -0,0 +1,322 @@
+"""
+Fila de jobs para as chamadas lentas à IA
+As rotas devolvem um job_id na hora e o navegador consulta /jobs/<id>,
+assim gerações de 20-60s rodam num pool próprio e não prendem as threads do servidor web
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import traceback
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from utils.advanced_logger import logger
+
+
+# Processo (worker do gunicorn) que executa o job: a posição na fila só conta os jobs dele
+_PROCESSO = f"{os.uname().nodename}:{os.getpid()}" if hasattr(os, 'uname') else str(os.getpid())
+
+
+class JobStore:
+    """
+    Estado, eventos e resultado dos jobs num SQLite compartilhado entre os workers
+    O job roda no worker que o aceitou, mas /jobs/<id> pode cair em qualquer outro
+    """
+
+    def __init__(self, caminho=None):
+        self.caminho = caminho or Config.AI_JOB_DB_PATH
+        self._local = threading.local()
+
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+        conn = self._conexao()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER,
+                tipo TEXT NOT NULL,
+                processo TEXT NOT NULL,
+                status TEXT NOT NULL,
+                resultado TEXT,
+                http_status INTEGER,
+                eventos INTEGER NOT NULL DEFAULT 0,
+                criado_em REAL NOT NULL,
+                atualizado_em REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_fila ON jobs (processo, status, criado_em)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS job_eventos (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                tipo TEXT NOT NULL,
+                dados TEXT,
+                PRIMARY KEY (job_id, seq)
+            )
+        """)
+
+    def _conexao(self):
+        """Uma conexão por thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=Config.QUOTA_SQLITE_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def criar(self, job):
+        self._conexao().execute(
+            "INSERT INTO jobs (id, user_id, tipo, processo, status, criado_em, atualizado_em) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job.id, job.user_id, job.tipo, _PROCESSO, job.status, job.criado_em, job.atualizado_em)
+        )
+
+    def status(self, job):
+        self._conexao().execute(
+            "UPDATE jobs SET status = ?, atualizado_em = ? WHERE id = ?", (job.status, job.atualizado_em, job.id)
+        )
+
+    def evento(self, job, seq, tipo, dados):
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO job_eventos (job_id, seq, tipo, dados) VALUES (?, ?, ?, ?)",
+                (job.id, seq, tipo, json.dumps(dados, ensure_ascii=False, default=str))
+            )
+            conn.execute("UPDATE jobs SET eventos = ?, atualizado_em = ? WHERE id = ?", (seq + 1, job.atualizado_em, job.id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def concluir(self, job):
+        self._conexao().execute(
+            "UPDATE jobs SET status = ?, resultado = ?, http_status = ?, atualizado_em = ? WHERE id = ?",
+            (job.status, json.dumps(job.resultado, ensure_ascii=False, default=str), job.http_status,
+             job.atualizado_em, job.id)
+        )
+
+    def carregar(self, job_id):
+        row = self._conexao().execute(
+            "SELECT id, user_id, tipo, processo, status, resultado, http_status, eventos, criado_em FROM jobs WHERE id = ?",
+            (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        chaves = ('id', 'user_id', 'tipo', 'processo', 'status', 'resultado', 'http_status', 'eventos', 'criado_em')
+        registro = dict(zip(chaves, row))
+        registro['resultado'] = json.loads(registro['resultado']) if registro['resultado'] else None
+        return registro
+
+    def eventos(self, job_id, desde=0):
+        rows = self._conexao().execute(
+            "SELECT tipo, dados FROM job_eventos WHERE job_id = ? AND seq >= ? ORDER BY seq", (job_id, desde)
+        ).fetchall()
+        return [{'type': tipo, 'data': json.loads(dados) if dados else None} for tipo, dados in rows]
+
+    def posicao(self, processo, criado_em):
+        """Jobs pendentes do mesmo worker criados antes"""
+        return self._conexao().execute(
+            "SELECT COUNT(*) FROM jobs WHERE processo = ? AND status = 'pendente' AND criado_em < ?",
+            (processo, criado_em)
+        ).fetchone()[0]
+
+    def limpar(self, ttl):
+        """Remove jobs finalizados há mais que ttl e os abandonados (worker morto no meio)"""
+        agora = time.time()
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM jobs WHERE (status IN ('concluido', 'erro') AND atualizado_em < ?) OR atualizado_em < ?",
+                (agora - ttl, agora - Config.AI_JOB_ABANDONADO)
+            )
+            conn.execute("DELETE FROM job_eventos WHERE job_id NOT IN (SELECT id FROM jobs)")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def contagem(self):
+        """Jobs por status deste worker"""
+        return dict(self._conexao().execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE processo = ? GROUP BY status", (_PROCESSO,)
+        ).fetchall())
+
+
+class Job:
+    """Um pedido à IA rodando (ou esperando) no pool; cada mudança vai para o JobStore"""
+
+    def __init__(self, user_id, tipo, store=None):
+        self.id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.tipo = tipo
+        self.status = 'pendente'     # pendente -> executando -> concluido | erro
+        self.resultado = None        # corpo JSON que a rota síncrona devolveria
+        self.http_status = None
+        self.n_eventos = 0           # eventos parciais já publicados (ex.: texto do chat chegando)
+        self.criado_em = time.time()
+        self.atualizado_em = self.criado_em
+        self._store = store
+        self._lock = Lock()          # emitir() pode vir de várias threads (ex.: campos do autocompletar)
+
+    def _marcar(self, status):
+        self.status = status
+        self.atualizado_em = time.time()
+        if self._store:
+            self._store.status(self)
+
+    def emitir(self, tipo, dados):
+        """Publica um evento parcial para quem está consultando o job"""
+        with self._lock:
+            seq = self.n_eventos
+            self.n_eventos += 1
+            self.atualizado_em = time.time()
+            if self._store:
+                self._store.evento(self, seq, tipo, dados)
+
+    def concluir(self, corpo, http_status):
+        """Grava o resultado final (quem consulta o job para de esperar)"""
+        self.resultado = corpo
+        self.http_status = http_status
+        self.status = 'concluido' if http_status < 400 else 'erro'
+        self.atualizado_em = time.time()
+        if self._store:
+            self._store.concluir(self)
+
+    def on_fila(self, posicao):
+        """Callback para a fila da API key (gemini_scheduler): publica a posição do pedido"""
+        self.emitir('fila', {'posicao': posicao})
+
+    @property
+    def finalizado(self):
+        return self.status in ('concluido', 'erro')
+
+
+class JobConsulta:
+    """Job lido do JobStore (por qualquer worker) para responder /jobs/<id>"""
+
+    def __init__(self, store, registro):
+        self._store = store
+        self.id = registro['id']
+        self.user_id = registro['user_id']
+        self.tipo = registro['tipo']
+        self.processo = registro['processo']
+        self.status = registro['status']
+        self.resultado = registro['resultado']
+        self.http_status = registro['http_status']
+        self.n_eventos = registro['eventos']
+        self.criado_em = registro['criado_em']
+
+    @property
+    def finalizado(self):
+        return self.status in ('concluido', 'erro')
+
+    def to_dict(self, desde=0, posicao=None):
+        eventos = self._store.eventos(self.id, desde) if desde < self.n_eventos else []
+        dados = {
+            'job_id': self.id,
+            'tipo': self.tipo,
+            'status': self.status,
+            'eventos': eventos,
+            'proximo_evento': desde + len(eventos)
+        }
+        if posicao is not None:
+            dados['posicao_fila'] = posicao
+        if self.finalizado:
+            dados['resultado'] = self.resultado
+            dados['http_status'] = self.http_status
+        return dados
+
+
+class JobQueue:
+    """
+    Pool de threads dedicado às chamadas da IA
+    A função do job recebe o Job (para emitir eventos) e retorna (corpo, http_status)
+    Se retornar None, o job continua depois (callback chama continuar() ou job.concluir())
+    sem ocupar uma thread do pool enquanto espera
+    Estado e resultado ficam no JobStore (SQLite), então qualquer worker responde /jobs/<id>
+    """
+
+    def __init__(self, max_workers=None, ttl_seconds=None, store=None):
+        self.max_workers = max_workers or Config.AI_JOB_WORKERS
+        self.ttl_seconds = ttl_seconds or Config.AI_JOB_TTL
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='apbia-ia')
+        self.store = store or JobStore()
+        self._ultima_limpeza = 0.0
+
+        logger.info(f"🧵 Fila de jobs da IA: {self.max_workers} workers")
+
+    def submit(self, user_id, tipo, func, *args, **kwargs):
+        """Enfileira func(job, *args, **kwargs) e retorna o Job imediatamente"""
+        self._limpar()
+
+        job = Job(user_id, tipo, self.store)
+        self.store.criar(job)
+
+        self.executor.submit(self._executar, job, func, args, kwargs)
+        logger.debug(f"📥 Job {job.id} ({tipo}) enfileirado para usuário {user_id}")
+        return job
+
+    def continuar(self, job, func, *args, **kwargs):
+        """Roda mais uma etapa func(job, *args, **kwargs) de um job já existente"""
+        self.executor.submit(self._executar, job, func, args, kwargs)
+
+    def _executar(self, job, func, args, kwargs):
+        job._marcar('executando')
+        inicio = time.time()
+
+        try:
+            retorno = func(job, *args, **kwargs)
+            if retorno is not None:
+                job.concluir(*retorno)
+
+        except Exception as e:
+            logger.error(f"❌ Erro no job {job.id} ({job.tipo}): {traceback.format_exc()}")
+            job.concluir({'error': True, 'message': f'Erro: {str(e)}'}, 500)
+
+        finally:
+            logger.info(f"🧵 Job {job.tipo} {job.status} em {(time.time() - inicio):.1f}s")
+
+    def get(self, job_id, user_id):
+        """Retorna o job (lido do JobStore) se ele existir e pertencer ao usuário"""
+        registro = self.store.carregar(job_id)
+        if registro and registro['user_id'] == user_id:
+            return JobConsulta(self.store, registro)
+        return None
+
+    def posicao(self, job):
+        """Quantos jobs pendentes foram criados antes deste (no pool do worker que o executa)"""
+        if job.status != 'pendente':
+            return 0
+        return self.store.posicao(getattr(job, 'processo', _PROCESSO), job.criado_em)
+
+    def _limpar(self):
+        """Remove jobs finalizados há mais tempo que o TTL (no máximo uma vez por minuto)"""
+        if time.time() - self._ultima_limpeza < 60:
+            return
+        self._ultima_limpeza = time.time()
+        try:
+            self.store.limpar(self.ttl_seconds)
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Erro limpando jobs antigos: {e}")
+
+    def get_stats(self):
+        status = self.store.contagem()
+        return {
+            'workers': self.max_workers,
+            'pendentes': status.get('pendente', 0),
+            'executando': status.get('executando', 0),
+            'finalizados': status.get('concluido', 0) + status.get('erro', 0)
+        }
+
+
+# Instância global
+job_queue = JobQueue()
@@ -0,0 +1,418 @@
+"""
+Motor de cotas da IA (RPM / TPM / RPD / buscas por dia)
+Um único conjunto de contadores usado pelo RateLimiter e pelo GeminiStats.
+Com o backend SQLite (WAL) todos os workers do gunicorn enxergam os mesmos contadores,
+então o limite configurado vale para o servidor inteiro e não N vezes
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from collections import deque
+from config import Config
+from utils.advanced_logger import logger
+
+
+# Janelas deslizantes: (segundos por bucket, quantidade de buckets)
+JANELA_MINUTO = (1, 60)      # RPM/TPM em buckets de 1 segundo
+JANELA_DIA = (60, 1440)      # RPD em buckets de 1 minuto
+
+
+class ContadorJanela:
+    """
+    Janela deslizante dividida em buckets de tamanho fixo (ring buffer esparso)
+    Guarda só os buckets com uso e mantém as somas acumuladas,
+    então registrar e consultar custam O(1) amortizado
+    """
+
+    __slots__ = ('largura', 'n_buckets', 'buckets', 'requisicoes', 'tokens')
+
+    def __init__(self, largura_bucket, n_buckets):
+        self.largura = largura_bucket      # segundos por bucket
+        self.n_buckets = n_buckets         # tamanho da janela em buckets
+        self.buckets = deque()             # [bucket_id, requisicoes, tokens]
+        self.requisicoes = 0
+        self.tokens = 0
+
+    def _expirar(self, bucket_atual):
+        limite = bucket_atual - self.n_buckets
+        buckets = self.buckets
+        while buckets and buckets[0][0] <= limite:
+            _, requisicoes, tokens = buckets.popleft()
+            self.requisicoes -= requisicoes
+            self.tokens -= tokens
+
+    def adicionar(self, agora, requisicoes=1, tokens=0):
+        bucket = int(agora // self.largura)
+        self._expirar(bucket)
+
+        if self.buckets and self.buckets[-1][0] == bucket:
+            ultimo = self.buckets[-1]
+            ultimo[1] += requisicoes
+            ultimo[2] += tokens
+        else:
+            self.buckets.append([bucket, requisicoes, tokens])
+
+        self.requisicoes += requisicoes
+        self.tokens += tokens
+
+    def totais(self, agora):
+        """Retorna (requisicoes, tokens) dentro da janela"""
+        self._expirar(int(agora // self.largura))
+        return self.requisicoes, self.tokens
+
+
+class MemoryQuotaBackend:
+    """
+    Contadores na memória do processo
+    Só serve para um worker (desenvolvimento / flask run)
+    """
+
+    compartilhado = False
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.contadores = {}   # (chave, largura, n_buckets) -> ContadorJanela
+
+    def _contador(self, chave, largura, n_buckets, criar=False):
+        ident = (chave, largura, n_buckets)
+        contador = self.contadores.get(ident)
+        if contador is None and criar:
+            contador = self.contadores[ident] = ContadorJanela(largura, n_buckets)
+        return contador
+
+    def _totais(self, chave, largura, n_buckets, agora):
+        contador = self._contador(chave, largura, n_buckets)
+        return contador.totais(agora) if contador else (0, 0)
+
+    def _aplicar(self, registros, agora):
+        for chave, (largura, n_buckets), requisicoes, tokens in registros:
+            self._contador(chave, largura, n_buckets, criar=True).adicionar(agora, requisicoes, tokens)
+
+    def reservar(self, verificacoes, registros, agora):
+        """
+        Verifica todos os limites e, se nenhum estourar, aplica os registros (atômico)
+        Retorna o índice da primeira verificação que falhou, ou None
+        """
+        with self.lock:
+            for i, (chave, janela, limite_req, limite_tokens, tokens_extra) in enumerate(verificacoes):
+                requisicoes, tokens = self._totais(chave, *janela, agora)
+                if limite_req is not None and requisicoes >= limite_req:
+                    return i
+                if limite_tokens is not None and tokens + tokens_extra > limite_tokens:
+                    return i
+
+            self._aplicar(registros, agora)
+            return None
+
+    def adicionar(self, registros, agora):
+        with self.lock:
+            self._aplicar(registros, agora)
+
+    def totais(self, chave, janela, agora):
+        with self.lock:
+            return self._totais(chave, *janela, agora)
+
+    def chaves_ativas(self, prefixo, sufixo, janela, agora):
+        """Chaves com alguma requisição dentro da janela (descarta contadores vazios)"""
+        with self.lock:
+            ativas = []
+            for ident in list(self.contadores):
+                chave, largura, n_buckets = ident
+                if (largura, n_buckets) != tuple(janela) or not chave.startswith(prefixo) or not chave.endswith(sufixo):
+                    continue
+                if self.contadores[ident].totais(agora)[0] > 0:
+                    ativas.append(chave)
+                else:
+                    del self.contadores[ident]
+            return ativas
+
+    def remover(self, prefixo):
+        with self.lock:
+            for ident in [i for i in self.contadores if i[0].startswith(prefixo)]:
+                del self.contadores[ident]
+
+
+class SQLiteQuotaBackend:
+    """
+    Contadores num arquivo SQLite em modo WAL, compartilhado por todos os workers da máquina
+    Cada reserva roda numa transação BEGIN IMMEDIATE (verifica e grava sem corrida entre processos)
+    """
+
+    compartilhado = True
+
+    INTERVALO_LIMPEZA = 60       # Segundos entre remoções de buckets antigos
+    RETENCAO = 86400 + 120       # Buckets mais velhos que isso não entram em nenhuma janela
+
+    def __init__(self, caminho, timeout=None):
+        self.caminho = caminho
+        self.timeout = timeout or Config.QUOTA_SQLITE_TIMEOUT
+        self._local = threading.local()
+        self._ultima_limpeza = 0
+
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+        conn = self._conexao()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS cota_buckets (
+                chave TEXT NOT NULL,
+                largura INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                requisicoes INTEGER NOT NULL DEFAULT 0,
+                tokens INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (chave, largura, bucket)
+            ) WITHOUT ROWID
+        """)
+
+    def _conexao(self):
+        """Uma conexão por thread (sqlite3 não compartilha conexões entre threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _totais(conn, chave, largura, n_buckets, agora):
+        primeiro_bucket = int(agora // largura) - n_buckets
+        row = conn.execute(
+            "SELECT COALESCE(SUM(requisicoes), 0), COALESCE(SUM(tokens), 0) FROM cota_buckets "
+            "WHERE chave = ? AND largura = ? AND bucket > ?",
+            (chave, largura, primeiro_bucket)
+        ).fetchone()
+        return row[0], row[1]
+
+    @staticmethod
+    def _aplicar(conn, registros, agora):
+        conn.executemany(
+            "INSERT INTO cota_buckets (chave, largura, bucket, requisicoes, tokens) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (chave, largura, bucket) DO UPDATE SET "
+            "requisicoes = requisicoes + excluded.requisicoes, tokens = tokens + excluded.tokens",
+            [(chave, largura, int(agora // largura), requisicoes, tokens)
+             for chave, (largura, _), requisicoes, tokens in registros]
+        )
+
+    def _transacao(self, func):
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            resultado = func(conn)
+            conn.execute("COMMIT")
+            return resultado
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _limpar(self, conn, agora):
+        if agora - self._ultima_limpeza < self.INTERVALO_LIMPEZA:
+            return
+        self._ultima_limpeza = agora
+        conn.execute("DELETE FROM cota_buckets WHERE (bucket + 1) * largura < ?", (agora - self.RETENCAO,))
+
+    def reservar(self, verificacoes, registros, agora):
+        """
+        Verifica todos os limites e, se nenhum estourar, aplica os registros (atômico entre processos)
+        Retorna o índice da primeira verificação que falhou, ou None
+        """
+        def executar(conn):
+            for i, (chave, janela, limite_req, limite_tokens, tokens_extra) in enumerate(verificacoes):
+                requisicoes, tokens = self._totais(conn, chave, *janela, agora)
+                if limite_req is not None and requisicoes >= limite_req:
+                    return i
+                if limite_tokens is not None and tokens + tokens_extra > limite_tokens:
+                    return i
+
+            self._aplicar(conn, registros, agora)
+            self._limpar(conn, agora)
+            return None
+
+        return self._transacao(executar)
+
+    def adicionar(self, registros, agora):
+        self._transacao(lambda conn: self._aplicar(conn, registros, agora))
+
+    def totais(self, chave, janela, agora):
+        return self._totais(self._conexao(), chave, *janela, agora)
+
+    def chaves_ativas(self, prefixo, sufixo, janela, agora):
+        largura, n_buckets = janela
+        rows = self._conexao().execute(
+            "SELECT chave FROM cota_buckets WHERE largura = ? AND bucket > ? AND chave LIKE ? "
+            "GROUP BY chave HAVING SUM(requisicoes) > 0",
+            (largura, int(agora // largura) - n_buckets, f"{prefixo}%{sufixo}")
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def remover(self, prefixo):
+        self._transacao(lambda conn: conn.execute(
+            "DELETE FROM cota_buckets WHERE substr(chave, 1, ?) = ?", (len(prefixo), prefixo)
+        ))
+
+
+class QuotaEngine:
+    """
+    Limites por usuário (RPM, TPM, RPD e buscas/dia) e contadores globais
+    reservar() verifica e conta a requisição numa única operação atômica
+    """
+
+    def __init__(self, backend, rpm=10, tpm=250_000, rpd=250, search_rpd=500,
+                 global_rpm=None, global_tpm=None):
+        self.backend = backend
+
+        # Limites FREE tier do Gemini 2.5 Flash
+        self.RPM_LIMIT = rpm
+        self.TPM_LIMIT = tpm
+        self.RPD_LIMIT = rpd
+        self.SEARCH_RPD_LIMIT = search_rpd
+
+        # Limites da GEMINI_API_KEY (somando todos os usuários)
+        self.GLOBAL_RPM_LIMIT = global_rpm or Config.GEMINI_GLOBAL_RPM
+        self.GLOBAL_TPM_LIMIT = global_tpm or Config.GEMINI_GLOBAL_TPM
+
+    @staticmethod
+    def _chave(user_id, metrica):
+        return f"u:{user_id}:{metrica}" if user_id is not None else f"g:{metrica}"
+
+    @staticmethod
+    def _user_id(chave):
+        user_id = chave.split(':')[1]
+        return int(user_id) if user_id.isdigit() else user_id
+
+    def _verificacoes(self, user_id, tokens_estimados):
+        """Limites checados antes de cada requisição, com a mensagem de cada um"""
+        chave = self._chave(user_id, 'req')
+        return [
+            ((chave, JANELA_MINUTO, self.RPM_LIMIT, None, 0),
+             f"Limite de {self.RPM_LIMIT} requisições/minuto excedido. Aguarde."),
+            ((chave, JANELA_MINUTO, None, self.TPM_LIMIT, tokens_estimados),
+             f"Limite de {self.TPM_LIMIT:,} tokens/minuto excedido. Aguarde."),
+            ((chave, JANELA_DIA, self.RPD_LIMIT, None, 0),
+             f"Limite diário de {self.RPD_LIMIT} requisições excedido. Volte amanhã."),
+        ]
+
+    def _registros(self, user_id, metrica, requisicoes, tokens):
+        """Mesma contagem na janela do minuto e do dia, para o usuário e para o global"""
+        chaves = [self._chave(None, metrica)]
+        if user_id is not None:
+            chaves.append(self._chave(user_id, metrica))
+        return [(chave, janela, requisicoes, tokens)
+                for chave in chaves for janela in (JANELA_MINUTO, JANELA_DIA)]
+
+    def _verificacoes_globais(self, tokens_estimados):
+        # Estimativa maior que o TPM inteiro nunca caberia: basta a janela estar vazia (conta-se o valor todo)
+        chave = self._chave(None, 'req')
+        return [
+            ((chave, JANELA_MINUTO, self.GLOBAL_RPM_LIMIT, None, 0),
+             "A IA está atendendo muitos pedidos agora. Tente novamente em instantes."),
+            ((chave, JANELA_MINUTO, None, self.GLOBAL_TPM_LIMIT, min(tokens_estimados, self.GLOBAL_TPM_LIMIT)),
+             "A IA está atendendo muitos pedidos agora. Tente novamente em instantes."),
+        ]
+
+    def _checar(self, verificacoes, registros):
+        """Retorna (ok, mensagem, índice da verificação que falhou)"""
+        falha = self.backend.reservar([v for v, _ in verificacoes], registros, time.time())
+        if falha is not None:
+            return False, verificacoes[falha][1], falha
+        return True, "", None
+
+    def reservar(self, user_id, tokens_estimados=0):
+        """
+        Verifica RPM/TPM/RPD do usuário e já conta a requisição (check-and-reserve atômico)
+        Os tokens estimados ficam reservados; a diferença para o real entra via registrar_tokens()
+        """
+        verificacoes = self._verificacoes(user_id, tokens_estimados) if user_id is not None else []
+        ok, msg, _ = self._checar(verificacoes, self._registros(user_id, 'req', 1, tokens_estimados))
+        return ok, msg
+
+    def reservar_global(self, user_id, tokens_estimados=0):
+        """
+        Igual a reservar(), mas também respeita o RPM/TPM da API key (todos os usuários)
+        Retorna (ok, mensagem, lotado); lotado=True quando só o limite global impediu,
+        ou seja, vale a pena esperar na fila em vez de devolver erro
+        """
+        verificacoes = self._verificacoes(user_id, tokens_estimados) if user_id is not None else []
+        n_usuario = len(verificacoes)
+        verificacoes += self._verificacoes_globais(tokens_estimados)
+
+        ok, msg, falha = self._checar(verificacoes, self._registros(user_id, 'req', 1, tokens_estimados))
+        return ok, msg, falha is not None and falha >= n_usuario
+
+    def verificar(self, user_id, tokens_estimados=0):
+        """Só verifica (não conta nada). Usado como checagem rápida antes de enfileirar"""
+        if user_id is None:
+            return True, ""
+        return self._checar(self._verificacoes(user_id, tokens_estimados), [])[:2]
+
+    def registrar_tokens(self, user_id, tokens, tokens_reservados=0):
+        """Soma os tokens consumidos por uma requisição já reservada (descontando a estimativa reservada)"""
+        ajuste = int(tokens) - int(tokens_reservados)
+        if ajuste:
+            self.backend.adicionar(self._registros(user_id, 'req', 0, ajuste), time.time())
+
+    def liberar(self, user_id, tokens_reservados=0):
+        """Devolve uma reserva que não chegou a ser usada"""
+        self.backend.adicionar(self._registros(user_id, 'req', -1, -int(tokens_reservados)), time.time())
+
+    def registrar_busca(self, user_id):
+        self.backend.adicionar(self._registros(user_id, 'busca', 1, 0), time.time())
+
+    def verificar_busca(self, user_id):
+        verificacoes = [((self._chave(user_id, 'busca'), JANELA_DIA, self.SEARCH_RPD_LIMIT, None, 0),
+                         f"Limite de {self.SEARCH_RPD_LIMIT} buscas/dia excedido.")]
+        return self._checar(verificacoes, [])[:2]
+
+    def uso(self, user_id=None):
+        """Uso atual de um usuário (ou global, com user_id=None)"""
+        agora = time.time()
+        requests_minute, tokens_minute = self.backend.totais(self._chave(user_id, 'req'), JANELA_MINUTO, agora)
+        requests_day, tokens_day = self.backend.totais(self._chave(user_id, 'req'), JANELA_DIA, agora)
+        searches_day, _ = self.backend.totais(self._chave(user_id, 'busca'), JANELA_DIA, agora)
+
+        return {
+            'requests_minute': requests_minute,
+            'tokens_minute': tokens_minute,
+            'requests_day': requests_day,
+            'tokens_day': tokens_day,
+            'searches_day': searches_day,
+        }
+
+    def usuarios_ativos(self, janela=JANELA_DIA):
+        """IDs dos usuários com alguma requisição dentro da janela"""
+        chaves = self.backend.chaves_ativas('u:', ':req', janela, time.time())
+        return [self._user_id(chave) for chave in chaves]
+
+    def reset_usuario(self, user_id):
+        self.backend.remover(f"u:{user_id}:")
+
+
+# Instância global
+_quota_engine = None
+_quota_lock = threading.Lock()
+
+
+def get_quota_engine():
+    """
+    Retorna o motor de cotas do processo
+    QUOTA_BACKEND=sqlite (padrão) compartilha os contadores entre workers; memory é só do processo
+    """
+    global _quota_engine
+    if _quota_engine is None:
+        with _quota_lock:
+            if _quota_engine is None:
+                backend = None
+                if Config.QUOTA_BACKEND == 'sqlite':
+                    try:
+                        backend = SQLiteQuotaBackend(Config.QUOTA_DB_PATH)
+                        logger.info(f"📏 Cotas da IA compartilhadas em {Config.QUOTA_DB_PATH}")
+                    except Exception as e:
+                        logger.error(f"❌ Erro ao abrir banco de cotas ({e}). Usando contadores em memória")
+                if backend is None:
+                    backend = MemoryQuotaBackend()
+                    logger.warning("⚠️ Cotas da IA em memória: cada worker terá seus próprios limites")
+                _quota_engine = QuotaEngine(backend)
+    return _quota_engine
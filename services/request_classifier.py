@@ -0,0 +1,112 @@
+"""
+Classificador local de pedidos do chat (sem chamar a IA)
+Escolhe, por mensagem, o thinking_budget, as ferramentas e o teto de saída:
+"obrigado!" não paga raciocínio nem Google Search; dúvidas de metodologia continuam
+com o orçamento completo. As escolhas do usuário (toggles) continuam sendo o limite
+"""
+
+import re
+import unicodedata
+from config import Config
+
+
+# Perfis em ordem crescente de custo
+PERFIS = {
+    'trivial':  {'thinking_budget': 0,     'include_thoughts': False, 'max_output_tokens': 1024,  'pesquisa': False, 'codigo': False},
+    'simples':  {'thinking_budget': 1024,  'include_thoughts': True,  'max_output_tokens': 4096,  'pesquisa': False, 'codigo': False},
+    'pesquisa': {'thinking_budget': 4096,  'include_thoughts': True,  'max_output_tokens': 8192,  'pesquisa': True,  'codigo': False},
+    'media':    {'thinking_budget': 8192,  'include_thoughts': True,  'max_output_tokens': 32768, 'pesquisa': True,  'codigo': False},
+    'codigo':   {'thinking_budget': 8192,  'include_thoughts': True,  'max_output_tokens': 16384, 'pesquisa': False, 'codigo': True},
+    'complexa': {'thinking_budget': 24000, 'include_thoughts': True,  'max_output_tokens': 65536, 'pesquisa': True,  'codigo': True},
+}
+
+# Mensagens feitas só destas palavras são conversa social
+_TRIVIAIS = {
+    'oi', 'ola', 'ei', 'opa', 'bom', 'boa', 'dia', 'tarde', 'noite', 'tudo', 'bem', 'e', 'ai', 'voce',
+    'obrigado', 'obrigada', 'obg', 'brigado', 'brigada', 'valeu', 'vlw', 'muito', 'mto', 'mt',
+    'ok', 'okay', 'certo', 'entendi', 'beleza', 'blz', 'show', 'legal', 'perfeito', 'otimo', 'top',
+    'massa', 'sim', 'nao', 'claro', 'tchau', 'ate', 'mais', 'logo', 'flw', 'falou', 'kk', 'kkk',
+    'haha', 'rs', 'ajudou', 'me', 'isso', 'ta', 'bacana', 'demais', 'gostei'
+}
+
+# Radicais (sem acento) que puxam cada perfil
+_RADICAIS = {
+    'complexa': (
+        'metodolog', 'hipotes', 'analis', 'justificativ', 'experiment', 'delineament', 'amostr',
+        'variave', 'discuss', 'conclus', 'revis', 'compar', 'avali', 'estrutur', 'objetivo',
+        'introduc', 'fundamenta', 'problema de pesquisa', 'resumo do projeto', 'planej', 'cronograma'
+    ),
+    'codigo': (
+        'calcul', 'codigo', 'python', 'grafico', 'estatistic', 'media ', 'desvio', 'planilha',
+        'porcent', 'regress', 'equac', 'formula', 'simul', 'program', 'algoritm', 'tabela'
+    ),
+    'pesquisa': (
+        'pesquis', 'busque', 'procure', 'noticia', 'atual', 'recente', 'artigo', 'referenc',
+        'fonte', 'link', 'site', 'hoje', 'ultim', 'scielo', 'google'
+    ),
+}
+
+# Em conversas já começadas, estas palavras apontam para o que veio antes (o contexto pesa)
+_CONTINUACAO = (
+    'isso', 'isto', 'esse', 'essa', 'acima', 'anterior', 'continue', 'continua', 'reescrev',
+    'refac', 'refaz', 'melhor', 'corrij', 'corrig', 'detalh', 'aprofund', 'expliqu'
+)
+
+_ANO = re.compile(r"\b20\d\d\b")
+_PALAVRAS = re.compile(r"\w+", re.UNICODE)
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos (para comparar radicais)"""
+    texto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in texto if not unicodedata.combining(c))
+
+
+def _tem(texto, radicais):
+    return any(r in texto for r in radicais)
+
+
+def classe_do_pedido(mensagem, tem_historico=False):
+    """Nome do perfil (chave de PERFIS) para a mensagem do usuário"""
+    texto = normalizar(mensagem).strip()
+    palavras = _PALAVRAS.findall(texto)
+
+    if not palavras or (len(palavras) <= 6 and all(p in _TRIVIAIS for p in palavras)):
+        return 'trivial'
+
+    if _tem(texto, _RADICAIS['complexa']) or len(palavras) > 60 or texto.count('?') >= 2:
+        return 'complexa'
+
+    if _tem(texto + ' ', _RADICAIS['codigo']):
+        return 'codigo'
+
+    if _tem(texto, _RADICAIS['pesquisa']) or _ANO.search(texto):
+        return 'pesquisa'
+
+    if tem_historico and _tem(texto, _CONTINUACAO):
+        return 'media'
+
+    return 'simples' if len(palavras) <= 25 else 'media'
+
+
+def classificar_pedido(mensagem, tem_historico=False, usar_pesquisa=True, usar_code_execution=True):
+    """
+    Perfil da mensagem: dict com classe, thinking_budget, include_thoughts, max_output_tokens,
+    pesquisa e codigo (já limitados pelos toggles do usuário) e o que deixou de ser ligado
+    Retorna None com o classificador desligado (tudo como antes: orçamento e ferramentas completos)
+    """
+    if not Config.CLASSIFICADOR_PEDIDOS:
+        return None
+
+    classe = classe_do_pedido(mensagem, tem_historico)
+    perfil = dict(PERFIS[classe], classe=classe)
+
+    # Pedido explícito de busca liga o Search em qualquer perfil (menos conversa social)
+    if classe != 'trivial' and _tem(normalizar(mensagem), _RADICAIS['pesquisa']):
+        perfil['pesquisa'] = True
+
+    perfil['pesquisa_evitada'] = usar_pesquisa and not perfil['pesquisa']
+    perfil['codigo_evitado'] = usar_code_execution and not perfil['codigo']
+    perfil['pesquisa'] = usar_pesquisa and perfil['pesquisa']
+    perfil['codigo'] = usar_code_execution and perfil['codigo']
+    return perfil
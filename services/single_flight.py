@@ -0,0 +1,129 @@
+"""
+Coalescência de chamadas idênticas ao Gemini (single-flight)
+Pedidos com o mesmo prompt, config e ferramentas feitos ao mesmo tempo viram uma chamada só:
+o primeiro (líder) chama a API e os outros esperam e recebem uma cópia do resultado, sem reservar
+cota. Endpoints determinísticos podem ainda guardar o resultado por alguns segundos (cache_ttl)
+"""
+
+import copy
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from config import Config
+from utils.advanced_logger import logger
+
+
+def _normalizar(valor):
+    """Texto com espaços colapsados; objetos do google-genai pelo repr (estável entre chamadas)"""
+    if isinstance(valor, str):
+        return ' '.join(valor.split())
+    if isinstance(valor, dict):
+        return {str(k): _normalizar(v) for k, v in valor.items()}
+    if isinstance(valor, (list, tuple)):
+        return [_normalizar(v) for v in valor]
+    if valor is None or isinstance(valor, (int, float, bool)):
+        return valor
+    return repr(valor)
+
+
+def chave_pedido(*partes):
+    """sha256 do pedido normalizado (prompt, system instruction, config, ferramentas...)"""
+    texto = json.dumps(_normalizar(partes), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+
+
+class _Voo:
+    __slots__ = ('evento', 'resultado', 'erro', 'seguidores')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro = None
+        self.seguidores = 0
+
+
+class SingleFlight:
+    """Chamadas em andamento por chave + cache curto de resultados (LRU com TTL)"""
+
+    def __init__(self, max_cache=None):
+        self.max_cache = max_cache or Config.GEMINI_RESULTADO_CACHE_MAX
+        self.lock = threading.Lock()
+        self._voos = {}                  # chave -> _Voo
+        self._cache = OrderedDict()      # chave -> (expira_em, resultado)
+
+        self.stats = {'lideres': 0, 'seguidores': 0, 'cache_hits': 0, 'tokens_economizados': 0}
+
+    def _do_cache(self, chave):
+        """Resultado guardado e ainda válido (chamar com self.lock)"""
+        item = self._cache.get(chave)
+        if item is None:
+            return None
+        if item[0] < time.time():
+            del self._cache[chave]
+            return None
+        self._cache.move_to_end(chave)
+        return item[1]
+
+    def _economia(self, resultado):
+        if isinstance(resultado, dict):
+            self.stats['tokens_economizados'] += int(resultado.get('total_tokens') or 0)
+
+    def executar(self, chave, func, ttl=0, guardar=None):
+        """
+        func() uma vez por chave de cada vez; quem chega enquanto ela roda recebe o mesmo resultado (cópia)
+        ttl > 0 guarda o resultado por ttl segundos se guardar(resultado) (padrão: sempre)
+        Exceções do líder chegam a todos os que esperavam
+        """
+        with self.lock:
+            if ttl:
+                guardado = self._do_cache(chave)
+                if guardado is not None:
+                    self.stats['cache_hits'] += 1
+                    self._economia(guardado)
+                    logger.info(f"💾 Resultado idêntico em cache ({chave[:12]})")
+                    return copy.deepcopy(guardado)
+
+            voo = self._voos.get(chave)
+            lider = voo is None
+            if lider:
+                voo = self._voos[chave] = _Voo()
+                self.stats['lideres'] += 1
+            else:
+                voo.seguidores += 1
+                self.stats['seguidores'] += 1
+
+        if not lider:
+            logger.info(f"🔗 Pedido idêntico já em andamento ({chave[:12]}): aguardando o mesmo resultado")
+            voo.evento.wait()
+            if voo.erro is not None:
+                raise voo.erro
+            with self.lock:
+                self._economia(voo.resultado)
+            return copy.deepcopy(voo.resultado)
+
+        try:
+            voo.resultado = func()
+            return voo.resultado
+        except Exception as e:
+            voo.erro = e
+            raise
+        finally:
+            with self.lock:
+                del self._voos[chave]
+                if ttl and voo.erro is None and (guardar is None or guardar(voo.resultado)):
+                    self._cache[chave] = (time.time() + ttl, copy.deepcopy(voo.resultado))
+                    while len(self._cache) > self.max_cache:
+                        self._cache.popitem(last=False)
+            if voo.seguidores:
+                logger.info(f"🔗 {voo.seguidores} pedido(s) idêntico(s) atendidos pela mesma chamada ({chave[:12]})")
+            voo.evento.set()
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, em_andamento=len(self._voos), em_cache=len(self._cache))
+
+
+# Instância global
+coalescedor = SingleFlight()
@@ -0,0 +1,116 @@
+"""
+Estimativa local de tokens (sem chamar client.models.count_tokens)
+Conta por heurística (palavras e pontuação) e corrige a escala com o uso real
+devolvido pelo Gemini (usage_metadata), separando o prefixo (system prompt)
+do conteúdo (Bragantec, histórico e mensagem)
+"""
+
+import re
+from functools import lru_cache
+from threading import Lock
+from config import Config
+from utils.advanced_logger import logger
+
+
+_PECAS = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+@lru_cache(maxsize=4096)
+def tokens_brutos(texto):
+    """
+    Estimativa sem calibração: cada palavra vale 1 token a cada 4 letras, cada pontuação vale 1
+    Em cache porque system prompt, resumos da Bragantec e histórico se repetem entre chamadas
+    """
+    if not texto:
+        return 0
+    total = 0
+    for peca in _PECAS.findall(texto):
+        total += 1 + (len(peca) - 1) // 4
+    return total
+
+
+class TokenEstimator:
+    """
+    Estimador calibrado por média móvel exponencial (EWMA) da razão real / bruto
+    O prefixo usa a contagem exata quando o Gemini informa cached_content_token_count
+    """
+
+    AMOSTRA_MINIMA = 50      # Tokens brutos mínimos para uma amostra entrar na calibração
+    MAX_PREFIXOS = 32
+
+    def __init__(self, alpha=None):
+        self.alpha = alpha or Config.TOKEN_ESTIMATOR_ALPHA
+        self.lock = Lock()
+        self.fatores = {'prefixo': 1.0, 'conteudo': 1.0}
+        self.prefixos = {}       # system_instruction -> tokens reais (vindos do cache de contexto)
+        self.amostras = 0
+        self.erro_medio = None   # EWMA do erro relativo da estimativa total
+
+    def estimar_texto(self, texto):
+        """Tokens de um texto solto (ex.: contador da interface)"""
+        return max(1, round(tokens_brutos(texto) * self.fatores['conteudo'])) if texto else 0
+
+    def _estimar_prefixo(self, system_instruction):
+        if not system_instruction:
+            return 0
+        exato = self.prefixos.get(system_instruction)
+        if exato is not None:
+            return exato
+        return round(tokens_brutos(system_instruction) * self.fatores['prefixo'])
+
+    @staticmethod
+    def _conteudo_bruto(contents):
+        return sum(tokens_brutos(item) for item in contents if isinstance(item, str))
+
+    def estimar_prompt(self, system_instruction, contents):
+        """Tokens de entrada de uma chamada: system prompt + histórico + contexto + mensagem"""
+        return self._estimar_prefixo(system_instruction) + round(self._conteudo_bruto(contents) * self.fatores['conteudo'])
+
+    def _ewma(self, atual, amostra):
+        return atual + self.alpha * (amostra - atual)
+
+    def calibrar(self, system_instruction, contents, usage_metadata):
+        """Ajusta os fatores com o prompt_token_count real de uma chamada"""
+        real_total = getattr(usage_metadata, 'prompt_token_count', None) or 0
+        if real_total <= 0:
+            return
+
+        estimado = self.estimar_prompt(system_instruction, contents)
+        cached = getattr(usage_metadata, 'cached_content_token_count', None) or 0
+        conteudo_bruto = self._conteudo_bruto(contents)
+
+        with self.lock:
+            if cached and system_instruction:
+                # Prefixo veio do cache: contagem exata
+                if system_instruction not in self.prefixos and len(self.prefixos) >= self.MAX_PREFIXOS:
+                    self.prefixos.pop(next(iter(self.prefixos)))
+                self.prefixos[system_instruction] = cached
+
+                prefixo_bruto = tokens_brutos(system_instruction)
+                if prefixo_bruto >= self.AMOSTRA_MINIMA:
+                    self.fatores['prefixo'] = self._ewma(self.fatores['prefixo'], cached / prefixo_bruto)
+                real_conteudo = real_total - cached
+            else:
+                real_conteudo = real_total - self._estimar_prefixo(system_instruction)
+
+            if conteudo_bruto >= self.AMOSTRA_MINIMA and real_conteudo > 0:
+                self.fatores['conteudo'] = self._ewma(self.fatores['conteudo'], real_conteudo / conteudo_bruto)
+
+            erro = abs(estimado - real_total) / real_total
+            self.erro_medio = erro if self.erro_medio is None else self._ewma(self.erro_medio, erro)
+            self.amostras += 1
+
+        logger.debug(f"📏 Tokens estimados {estimado:,} x reais {real_total:,} (fator conteúdo {self.fatores['conteudo']:.3f})")
+
+    def get_stats(self):
+        return {
+            'amostras': self.amostras,
+            'fator_prefixo': round(self.fatores['prefixo'], 4),
+            'fator_conteudo': round(self.fatores['conteudo'], 4),
+            'prefixos_exatos': len(self.prefixos),
+            'erro_medio_percent': round(self.erro_medio * 100, 1) if self.erro_medio is not None else None
+        }
+
+
+# Instância global
+token_estimator = TokenEstimator()
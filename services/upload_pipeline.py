@@ -0,0 +1,202 @@
+"""
+Envio de arquivos ao Gemini sem prender threads
+Os uploads rodam num pool limitado (GEMINI_UPLOAD_CONCORRENTES); arquivos que ficam em
+PROCESSING (vídeos, áudios longos) são consultados por uma única thread, com intervalo
+crescente (backoff exponencial), e avisam por callback quando ficam prontos ou falham
+"""
+
+import os
+import time
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from utils.advanced_logger import logger
+from services.gemini_resilience import resiliencia, classificar, CircuitoAberto
+
+
+class Envio:
+    """Um arquivo sendo enviado; aguardar() bloqueia até ficar pronto (para quem precisa do modo síncrono)"""
+
+    def __init__(self, caminho, mime_type, on_status, on_pronto, on_erro):
+        self.caminho = caminho
+        self.mime_type = mime_type
+        self.on_status = on_status
+        self.on_pronto = on_pronto
+        self.on_erro = on_erro
+        self.arquivo = None
+        self.erro = None
+        self.consultas = 0
+        self.espera = 0
+        self.inicio = time.time()
+        self.evento = threading.Event()
+
+    def aguardar(self, timeout=None):
+        """Arquivo pronto (types.File) ou None se falhou"""
+        self.evento.wait(timeout)
+        return self.arquivo
+
+
+class UploadPipeline:
+    """Pool de uploads + uma thread que consulta os arquivos em processamento"""
+
+    def __init__(self, files, max_concorrentes=None, intervalo_inicial=None, intervalo_max=None, timeout=None):
+        self.files = files
+        self.max_concorrentes = max_concorrentes or Config.GEMINI_UPLOAD_CONCORRENTES
+        self.intervalo_inicial = intervalo_inicial or Config.GEMINI_UPLOAD_POLL_INICIAL
+        self.intervalo_max = intervalo_max or Config.GEMINI_UPLOAD_POLL_MAX
+        self.timeout = timeout or Config.GEMINI_UPLOAD_TIMEOUT
+
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concorrentes, thread_name_prefix='apbia-upload')
+        self.cond = threading.Condition()
+        self._agenda = []            # heap de (quando consultar, seq, Envio)
+        self._seq = itertools.count()
+        self._consultor = None
+
+        self.stats = {'enviados': 0, 'prontos': 0, 'falhas': 0, 'consultas': 0, 'segundos_processando': 0.0}
+
+    def enviar(self, caminho, mime_type=None, on_status=None, on_pronto=None, on_erro=None):
+        """
+        Enfileira o upload e retorna o Envio na hora
+        on_status(estado) recebe 'enviando', 'processando' e 'pronto'; on_pronto(arquivo) e on_erro(erro) são
+        chamados uma vez, na thread do pool ou do consultor (devem ser rápidos: no máximo agendar outro trabalho)
+        """
+        envio = Envio(caminho, mime_type, on_status, on_pronto, on_erro)
+        self.executor.submit(self._enviar, envio)
+        return envio
+
+    def _avisar(self, envio, estado):
+        if envio.on_status:
+            try:
+                envio.on_status(estado)
+            except Exception as e:
+                logger.debug(f"on_status falhou: {e}")
+
+    def _enviar(self, envio):
+        self._avisar(envio, 'enviando')
+        try:
+            logger.info(f"📤 Upload: {envio.caminho}")
+
+            def subir():
+                # Reabre a cada tentativa (uma repetição precisa ler o arquivo do início)
+                with open(envio.caminho, 'rb') as f:
+                    if envio.mime_type:
+                        logger.info(f"📋 Usando MIME type fornecido: {envio.mime_type}")
+                        return self.files.upload(
+                            file=f,
+                            config={
+                                'mime_type': envio.mime_type,
+                                'display_name': os.path.basename(envio.caminho)
+                            }
+                        )
+                    # Fallback: deixa API detectar
+                    logger.info("🔍 Deixando API detectar MIME type")
+                    return self.files.upload(file=f)
+
+            # Upload cria um arquivo novo: só repete erros em que a API garantidamente não o recebeu
+            arquivo = resiliencia.executar(subir, tipo='upload', idempotente=False)
+
+            self.stats['enviados'] += 1
+            logger.info(f"✅ Upload concluído: {arquivo.display_name}")
+            logger.info(f"   URI: {arquivo.uri}")
+            logger.info(f"   MIME: {arquivo.mime_type}")
+
+            self._verificar(envio, arquivo)
+
+        except Exception as e:
+            self._falhar(envio, e)
+
+    def _verificar(self, envio, arquivo):
+        """Decide o que fazer com o estado atual do arquivo"""
+        estado = arquivo.state.name
+
+        if estado == "PROCESSING":
+            if time.time() - envio.inicio > self.timeout:
+                self._falhar(envio, TimeoutError(f"Processamento passou de {self.timeout}s"))
+                return
+            if envio.consultas == 0:
+                self._avisar(envio, 'processando')
+            envio.arquivo = arquivo
+            envio.espera = min(self.intervalo_max, envio.espera * 2 or self.intervalo_inicial)
+            self._agendar(envio, envio.espera)
+            return
+
+        if estado == "FAILED":
+            self._falhar(envio, ValueError(f"Falha no processamento: {arquivo.error}"))
+            return
+
+        self._concluir(envio, arquivo)
+
+    def _agendar(self, envio, espera):
+        with self.cond:
+            heapq.heappush(self._agenda, (time.time() + espera, next(self._seq), envio))
+            if self._consultor is None:
+                self._consultor = threading.Thread(target=self._loop, name='apbia-upload-consultor', daemon=True)
+                self._consultor.start()
+            self.cond.notify()
+
+    def _loop(self):
+        """Consulta os arquivos em processamento quando chega a vez de cada um"""
+        while True:
+            with self.cond:
+                while not self._agenda or self._agenda[0][0] > time.time():
+                    self.cond.wait(self._agenda[0][0] - time.time() if self._agenda else None)
+                _, _, envio = heapq.heappop(self._agenda)
+
+            try:
+                envio.consultas += 1
+                self.stats['consultas'] += 1
+                # Uma tentativa só: quem espera entre as consultas é a própria agenda (não prende o consultor)
+                arquivo = resiliencia.executar(lambda: self.files.get(name=envio.arquivo.name), tipo='arquivo', tentativas=1)
+            except Exception as e:
+                passageiro = isinstance(e, CircuitoAberto) or classificar(e) == 'passageiro'
+                if passageiro and time.time() - envio.inicio <= self.timeout:
+                    logger.warning(f"⚠️ Consulta do arquivo {envio.arquivo.name} falhou ({e}); tentando de novo")
+                    self._agendar(envio, max(envio.espera, getattr(e, 'segundos', 0)))
+                else:
+                    self._falhar(envio, e)
+                continue
+
+            try:
+                self._verificar(envio, arquivo)
+            except Exception as e:
+                self._falhar(envio, e)
+
+    def _concluir(self, envio, arquivo):
+        envio.arquivo = arquivo
+        self.stats['prontos'] += 1
+        self.stats['segundos_processando'] += time.time() - envio.inicio
+        logger.info(f"✅ Arquivo pronto em {time.time() - envio.inicio:.1f}s ({envio.consultas} consulta(s))")
+
+        self._avisar(envio, 'pronto')
+        if envio.on_pronto:
+            try:
+                envio.on_pronto(arquivo)
+            except Exception as e:
+                logger.error(f"❌ Erro no callback de upload pronto: {e}")
+        envio.evento.set()
+
+    def _falhar(self, envio, erro):
+        envio.arquivo = None
+        envio.erro = erro
+        self.stats['falhas'] += 1
+        logger.error(f"❌ Erro no upload: {erro}")
+
+        if envio.on_erro:
+            try:
+                envio.on_erro(erro)
+            except Exception as e:
+                logger.error(f"❌ Erro no callback de upload com falha: {e}")
+        envio.evento.set()
+
+    def get_stats(self):
+        with self.cond:
+            processando = len(self._agenda)
+        prontos = self.stats['prontos']
+        return dict(
+            self.stats,
+            processando=processando,
+            segundos_processando=round(self.stats['segundos_processando'], 1),
+            media_segundos=round(self.stats['segundos_processando'] / prontos, 2) if prontos else None
+        )
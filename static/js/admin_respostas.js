@@ -0,0 +1,131 @@
+// =============================================
+// APBIA - Admin Perguntas Frequentes JavaScript
+// =============================================
+
+document.addEventListener('DOMContentLoaded', function() {
+    initRespostasHandlers();
+});
+
+function initRespostasHandlers() {
+    // Nova resposta fixada
+    const btnSalvar = document.getElementById('btnSalvarResposta');
+    if (btnSalvar) {
+        btnSalvar.addEventListener('click', salvarResposta);
+    }
+    
+    // Fixar / desafixar
+    document.querySelectorAll('.fixar-resposta').forEach(btn => {
+        btn.addEventListener('click', fixarResposta);
+    });
+    
+    // Remover
+    document.querySelectorAll('.remover-resposta').forEach(btn => {
+        btn.addEventListener('click', removerResposta);
+    });
+    
+    // Filtros
+    ['filtroTipo', 'filtroFixada'].forEach(id => {
+        const filtro = document.getElementById(id);
+        if (filtro) {
+            filtro.addEventListener('change', filtrarTabela);
+        }
+    });
+}
+
+async function salvarResposta() {
+    const pergunta = document.getElementById('respostaPergunta').value.trim();
+    const resposta = document.getElementById('respostaTexto').value.trim();
+    
+    if (!pergunta || !resposta) {
+        APBIA.showNotification('Preencha a pergunta e a resposta', 'error');
+        return;
+    }
+    
+    APBIA.showLoadingOverlay('Salvando resposta...');
+    
+    try {
+        const response = await fetch('/admin/respostas-frequentes/criar', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                pergunta: pergunta,
+                resposta: resposta,
+                tipo_usuario: document.getElementById('respostaTipo').value,
+                bragantec: document.getElementById('respostaBragantec').checked
+            })
+        });
+        
+        const data = await response.json();
+        
+        APBIA.hideLoadingOverlay();
+        
+        if (data.success) {
+            APBIA.showNotification(data.message, 'success');
+            setTimeout(() => location.reload(), 1500);
+        } else {
+            APBIA.showNotification('Erro: ' + data.message, 'error');
+        }
+    } catch (error) {
+        APBIA.hideLoadingOverlay();
+        APBIA.showNotification('Erro ao salvar resposta', 'error');
+        console.error(error);
+    }
+}
+
+async function fixarResposta() {
+    const fixada = this.dataset.fixada !== '1';
+    
+    try {
+        const response = await fetch(`/admin/respostas-frequentes/${this.dataset.id}/fixar`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ fixada: fixada })
+        });
+        
+        const data = await response.json();
+        
+        if (data.success) {
+            APBIA.showNotification(data.message, 'success');
+            setTimeout(() => location.reload(), 1000);
+        } else {
+            APBIA.showNotification('Erro: ' + data.message, 'error');
+        }
+    } catch (error) {
+        APBIA.showNotification('Erro ao fixar resposta', 'error');
+        console.error(error);
+    }
+}
+
+async function removerResposta() {
+    if (!confirm('Remover esta resposta? A próxima pergunta parecida volta a chamar a IA.')) return;
+    
+    const row = this.closest('tr');
+    
+    try {
+        const response = await fetch(`/admin/respostas-frequentes/${this.dataset.id}`, {
+            method: 'DELETE'
+        });
+        
+        const data = await response.json();
+        
+        if (data.success) {
+            APBIA.showNotification(data.message, 'success');
+            row.remove();
+        } else {
+            APBIA.showNotification('Erro: ' + data.message, 'error');
+        }
+    } catch (error) {
+        APBIA.showNotification('Erro ao remover resposta', 'error');
+        console.error(error);
+    }
+}
+
+function filtrarTabela() {
+    const tipo = document.getElementById('filtroTipo').value;
+    const fixada = document.getElementById('filtroFixada').value;
+    
+    document.querySelectorAll('#tabelaRespostas tbody tr').forEach(row => {
+        const mostrar = (!tipo || row.dataset.tipo === tipo) && (!fixada || row.dataset.fixada === fixada);
+        row.style.display = mostrar ? '' : 'none';
+    });
+}
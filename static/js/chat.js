@@ -7,6 +7,7 @@ document.addEventListener('DOMContentLoaded', function () {
     initializeChatHandlers();
     loadSearchPreference();
     loadBragantecPreference();
+    verificarStatusIA();
 });
 
 function initializeChatHandlers() {
@@ -64,9 +65,9 @@ function initializeChatHandlers() {
             updateBragantecIndicator();
 
             const msg = usarContextoBragantec ?
-                '⚠️ Modo Bragantec ATIVADO - Consome muitos tokens!' :
+                '📚 Modo Bragantec ATIVADO - Resumos relevantes das edições anteriores serão consultados' :
                 '✅ Modo Bragantec desativado - Economia de tokens';
-            APBIA.showNotification(msg, usarContextoBragantec ? 'warning' : 'success');
+            APBIA.showNotification(msg, usarContextoBragantec ? 'info' : 'success');
         });
     }
 
@@ -152,31 +153,21 @@ async function handleSendMessage(e) {
     // Mostra indicador de pensamento
     showThinking(true);
 
-    try {
-        const response = await fetch('/chat/send', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-            },
-            body: JSON.stringify({
-                message: message,
-                chat_id: currentChatId,
-                usar_pesquisa: usarPesquisaGoogle,
-                usar_code_execution: true,
-                usar_contexto_bragantec: usarContextoBragantec
-            })
-        });
-
-        // Verifica se a resposta foi OK
-        if (!response.ok) {
-            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-        }
+    const payload = {
+        message: message,
+        chat_id: currentChatId,
+        usar_pesquisa: usarPesquisaGoogle,
+        usar_code_execution: true,
+        usar_contexto_bragantec: usarContextoBragantec
+    };
 
-        const data = await response.json();
+    try {
+        const data = await sendMessageJob(payload);
 
         showThinking(false);
 
         if (data.error) {
+            if (data.degradado) verificarStatusIA();
             showError(data.message || 'Erro ao processar mensagem');
             return;
         }
@@ -194,12 +185,12 @@ async function handleSendMessage(e) {
             if (data.tokens_input && data.tokens_input > 100000) {
                 APBIA.showNotification(
                     `⚠️ Alto consumo de tokens: ${data.tokens_input.toLocaleString('pt-BR')} tokens de entrada!\n` +
-                    `Dica: Desative o Modo Bragantec se não precisar do histórico completo.`,
+                    `Dica: Conversas muito longas ou arquivos grandes aumentam o consumo.`,
                     'warning'
                 );
             }
 
-            // Adiciona resposta da IA
+            // Adiciona resposta da IA (versão final, com badges)
             addMessageToChat(
                 'assistant',
                 data.response,
@@ -208,14 +199,7 @@ async function handleSendMessage(e) {
                 data.code_results
             );
 
-            // Só mostra aviso se for REALMENTE uma nova conversa
-            if (data.chat_id && !currentChatId) {
-                currentChatId = data.chat_id;
-                addChatToSidebar(data.chat_id, message);
-            } else if (data.chat_id) {
-                // Atualiza ID se mudou
-                currentChatId = data.chat_id;
-            }
+            registrarChatAtual(data.chat_id, message);
         }
 
     } catch (error) {
@@ -226,6 +210,145 @@ async function handleSendMessage(e) {
     }
 }
 
+function registrarChatAtual(chatId, message) {
+    // Só mostra aviso se for REALMENTE uma nova conversa
+    if (chatId && !currentChatId) {
+        currentChatId = chatId;
+        addChatToSidebar(chatId, message);
+    } else if (chatId) {
+        // Atualiza ID se mudou
+        currentChatId = chatId;
+    }
+}
+
+/**
+ * Envia pelo /chat/send (que devolve um job_id) e mostra a resposta
+ * enquanto ela é gerada, consultando os trechos parciais do job.
+ * Retorna o resultado final do job.
+ */
+async function sendMessageJob(payload) {
+    const response = await fetch('/chat/send', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify(payload)
+    });
+
+    const job = await response.json();
+
+    // Erros antes de enfileirar (rate limit, IA offline...)
+    if (!job.job_id) {
+        if (!response.ok && !job.message) {
+            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+        return job;
+    }
+
+    registrarChatAtual(job.chat_id, payload.message);
+
+    if (job.degradacao) {
+        mostrarDegradacao(job.degradacao);
+        if (job.degradacao.nivel > 0) verificarStatusIA();
+    }
+
+    const live = createStreamingMessage();
+
+    try {
+        return await APBIA.waitForJob(job.job_id, eventos => {
+            eventos.forEach(evento => {
+                switch (evento.type) {
+                    case 'thought':
+                        showThinking(false);
+                        live.appendThought(evento.data);
+                        break;
+                    case 'text':
+                        showThinking(false);
+                        live.appendText(evento.data);
+                        break;
+                    case 'code':
+                    case 'code_result':
+                        showThinking(false);
+                        live.setStatus('🐍 Executando código...');
+                        break;
+                    case 'fila':
+                        live.setStatus(`⏳ Muitos pedidos à IA agora. Você é o ${evento.data.posicao}º da fila...`);
+                        break;
+                    case 'arquivo':
+                        live.setStatus(ESTADOS_ARQUIVO[evento.data.estado] || evento.data.estado);
+                        break;
+                }
+            });
+        }, 300);
+    } finally {
+        live.remove();
+    }
+}
+
+/**
+ * Mensagem temporária da IA que vai sendo preenchida durante o streaming.
+ * É removida no fim e trocada pela mensagem final (addMessageToChat).
+ */
+function createStreamingMessage() {
+    const messagesContainer = document.getElementById('chatMessages');
+
+    const welcome = document.getElementById('welcomeMessage');
+    if (welcome) {
+        welcome.remove();
+    }
+
+    const messageDiv = document.createElement('div');
+    messageDiv.className = 'message assistant fade-in streaming';
+    messageDiv.innerHTML = `
+        <div class="alert alert-light border mb-2 streaming-thinking" style="display: none;">
+            <div class="d-flex align-items-center mb-2">
+                <i class="fas fa-brain text-primary me-2"></i>
+                <strong>Pensando...</strong>
+            </div>
+            <div class="thinking-content" style="font-size: 0.9em; color: #666; max-height: 150px; overflow-y: auto;"></div>
+        </div>
+        <small class="text-muted streaming-status" style="display: none;"></small>
+        <div class="message-content"></div>
+    `;
+
+    messagesContainer.appendChild(messageDiv);
+
+    const thinkingBox = messageDiv.querySelector('.streaming-thinking');
+    const thinkingContent = thinkingBox.querySelector('.thinking-content');
+    const status = messageDiv.querySelector('.streaming-status');
+    const content = messageDiv.querySelector('.message-content');
+    let thinking = '';
+    let texto = '';
+
+    function scroll() {
+        messagesContainer.scrollTop = messagesContainer.scrollHeight;
+    }
+
+    return {
+        appendThought(parte) {
+            thinking += parte;
+            thinkingBox.style.display = 'block';
+            thinkingContent.innerHTML = formatMessageContent(thinking);
+            thinkingContent.scrollTop = thinkingContent.scrollHeight;
+            scroll();
+        },
+        appendText(parte) {
+            texto += parte;
+            status.style.display = 'none';
+            content.innerHTML = formatMessageContent(texto);
+            scroll();
+        },
+        setStatus(msg) {
+            status.textContent = msg;
+            status.style.display = 'block';
+            scroll();
+        },
+        remove() {
+            messageDiv.remove();
+        }
+    };
+}
+
 function addChatToSidebar(chatId, firstMessage) {
     const chatHistory = document.getElementById('chatHistory');
 
@@ -717,6 +840,14 @@ function showChatNotes(notas) {
     messagesContainer.insertBefore(notesDiv, messagesContainer.firstChild);
 }
 
+const ESTADOS_ARQUIVO = {
+    enviando: '📤 Enviando arquivo para a IA...',
+    processando: '⚙️ A IA está processando o arquivo (vídeos podem demorar)...',
+    pronto: '✅ Arquivo pronto',
+    reenviando: '📎 Os arquivos desta conversa expiraram na IA: reenviando...',
+    analisando: '🧠 Analisando o arquivo...'
+};
+
 async function handleFileUpload(e) {
     const file = e.target.files[0];
     if (!file) return;
@@ -741,7 +872,25 @@ async function handleFileUpload(e) {
             body: formData
         });
 
-        const data = await response.json();
+        // O upload e a análise rodam no servidor: acompanha o estado do arquivo até o job terminar
+        const job = await response.json();
+        let data = job;
+        if (job.job_id) {
+            const live = createStreamingMessage();
+            try {
+                data = await APBIA.waitForJob(job.job_id, eventos => {
+                    eventos.forEach(evento => {
+                        if (evento.type === 'arquivo') {
+                            live.setStatus(ESTADOS_ARQUIVO[evento.data.estado] || evento.data.estado);
+                        } else if (evento.type === 'fila') {
+                            live.setStatus(`⏳ Muitos pedidos à IA agora. Você é o ${evento.data.posicao}º da fila...`);
+                        }
+                    });
+                });
+            } finally {
+                live.remove();
+            }
+        }
 
         showThinking(false);
 
@@ -757,6 +906,7 @@ async function handleFileUpload(e) {
 
             APBIA.showNotification('Arquivo processado com sucesso!', 'success');
         } else {
+            if (data.degradado) verificarStatusIA();
             showError(data.message || 'Erro ao processar arquivo');
         }
 
@@ -769,6 +919,52 @@ async function handleFileUpload(e) {
     e.target.value = '';
 }
 
+/**
+ * Modo degradado: enquanto a API do Gemini estiver instável (circuito aberto no servidor)
+ * ou a cota estiver apertada (modo econômico), mostra o aviso e consulta /chat/status até normalizar
+ */
+let statusIATimer = null;
+
+async function verificarStatusIA() {
+    clearTimeout(statusIATimer);
+    try {
+        const response = await fetch('/chat/status');
+        const estado = await response.json();
+        mostrarIADegradada(estado);
+        if (estado.degradacao) mostrarDegradacao(estado.degradacao);
+
+        if (estado.degradado) {
+            statusIATimer = setTimeout(verificarStatusIA, Math.max(5, estado.retry_em || 10) * 1000);
+        } else if (estado.degradacao && estado.degradacao.nivel > 0) {
+            statusIATimer = setTimeout(verificarStatusIA, 15000);
+        }
+    } catch (error) {
+        console.error('Erro ao consultar status da IA:', error);
+    }
+}
+
+function mostrarIADegradada(estado) {
+    const aviso = document.getElementById('iaDegradada');
+    if (!aviso) return;
+
+    aviso.style.display = estado.degradado ? 'block' : 'none';
+    if (estado.degradado) {
+        const quando = estado.retry_em ? ` Nova tentativa em ~${estado.retry_em}s.` : '';
+        document.getElementById('iaDegradadaTexto').textContent = ` ${estado.mensagem}${quando}`;
+    }
+}
+
+function mostrarDegradacao(degradacao) {
+    const aviso = document.getElementById('modoEconomia');
+    if (!aviso) return;
+
+    aviso.style.display = degradacao.nivel > 0 ? 'block' : 'none';
+    if (degradacao.nivel > 0) {
+        document.getElementById('modoEconomiaTexto').textContent =
+            ` Muitos pedidos à IA agora: ${degradacao.reduzido.join(', ')}.`;
+    }
+}
+
 function clearChatMessages() {
     const messagesContainer = document.getElementById('chatMessages');
     messagesContainer.innerHTML = `
@@ -53,8 +53,100 @@ function updateStats(data) {
     document.getElementById('search-remaining').textContent = `Disponível: ${global.search_remaining}`;
     updateProgress('search', global.searches_today, global.search_limit);
     
+    // Resiliência (retries, circuit breaker, hedge)
+    if (data.resiliencia) {
+        updateResiliencia(data.resiliencia);
+    }
+    
+    // Pedidos idênticos (single-flight + cache curto)
+    if (data.coalescencia) {
+        updateCoalescencia(data.coalescencia);
+    }
+    
+    // Perguntas frequentes (cache de respostas)
+    if (data.respostas_frequentes) {
+        updateRespostasFrequentes(data.respostas_frequentes);
+    }
+    
+    // Classificador de pedidos
+    if (data.perfis) {
+        updatePerfis(data.perfis);
+    }
+    
     // Alertas
-    updateAlerts(global);
+    updateAlerts(global, data.resiliencia, data.degradacao);
+}
+
+/**
+ * Atualiza a tabela de pedidos por classe (classificador de pedidos)
+ */
+function updatePerfis(perfis) {
+    const ordem = ['trivial', 'simples', 'pesquisa', 'codigo', 'media', 'complexa'];
+    const classes = Object.keys(perfis.classes).sort((a, b) => ordem.indexOf(a) - ordem.indexOf(b));
+    
+    document.getElementById('perfis-economia').textContent =
+        perfis.tokens_thinking_economizados !== null ? perfis.tokens_thinking_economizados.toLocaleString('pt-BR') : '-';
+    document.getElementById('perfis-pesquisas-evitadas').textContent = perfis.pesquisas_evitadas;
+    document.getElementById('perfis-codigo-evitado').textContent = perfis.codigo_evitado;
+    
+    if (!classes.length) return;
+    
+    document.getElementById('perfis-tabela').innerHTML = classes.map(classe => {
+        const c = perfis.classes[classe];
+        return `
+            <tr>
+                <td><strong>${classe}</strong></td>
+                <td>${c.pedidos}</td>
+                <td>${c.orcamento_thinking.toLocaleString('pt-BR')}</td>
+                <td>${c.thinking_medio.toLocaleString('pt-BR')}</td>
+                <td>${c.output_medio.toLocaleString('pt-BR')}</td>
+                <td>${(c.tempo_medio_ms / 1000).toFixed(1)}s</td>
+            </tr>
+        `;
+    }).join('');
+}
+
+/**
+ * Atualiza os contadores da camada de resiliência
+ */
+function updateResiliencia(res) {
+    const contadores = [
+        'sucesso', 'sucesso_apos_retry', 'retries', 'falha_passageira', 'retry_after_longo',
+        'falha_permanente', 'rejeitadas_circuito', 'circuito_aberturas', 'hedges', 'hedges_venceram'
+    ];
+    contadores.forEach(chave => {
+        document.getElementById(`res-${chave.replace(/_/g, '-')}`).textContent = res[chave];
+    });
+    
+    document.getElementById('res-taxa-sucesso').textContent =
+        res.taxa_sucesso_percent !== null ? `${res.taxa_sucesso_percent}%` : '-';
+    
+    const badge = document.getElementById('circuito-estado');
+    const cores = { fechado: 'success', meio_aberto: 'warning', aberto: 'danger' };
+    badge.className = `badge ${cores[res.circuito] || 'info'}`;
+    badge.textContent = res.circuito.replace('_', ' ').toUpperCase() +
+        (res.reabre_em_s ? ` (${res.reabre_em_s}s)` : '');
+}
+
+/**
+ * Atualiza os contadores de pedidos idênticos atendidos por uma chamada só
+ */
+function updateCoalescencia(coal) {
+    document.getElementById('coal-seguidores').textContent = coal.seguidores;
+    document.getElementById('coal-cache-hits').textContent = coal.cache_hits;
+    document.getElementById('coal-tokens-economizados').textContent = coal.tokens_economizados.toLocaleString('pt-BR');
+}
+
+/**
+ * Atualiza a taxa de acerto do cache de perguntas frequentes
+ */
+function updateRespostasFrequentes(faq) {
+    ['hits', 'consultas', 'hits_fixadas', 'entradas', 'fixadas', 'recusadas_privadas'].forEach(chave => {
+        document.getElementById(`faq-${chave.replace(/_/g, '-')}`).textContent = faq[chave];
+    });
+    document.getElementById('faq-tokens-economizados').textContent = faq.tokens_economizados.toLocaleString('pt-BR');
+    document.getElementById('faq-taxa-acerto').textContent =
+        faq.taxa_acerto_percent !== null ? `${faq.taxa_acerto_percent}%` : '-';
 }
 
 /**
@@ -98,7 +190,7 @@ function updateProgress(type, current, limit) {
 /**
  * Atualiza alertas de limite
  */
-function updateAlerts(global) {
+function updateAlerts(global, resiliencia, degradacao) {
     const alertsDiv = document.getElementById('limit-alerts');
     alertsDiv.innerHTML = '';
     
@@ -120,6 +212,22 @@ function updateAlerts(global) {
         });
     }
     
+    // Alerta de modo econômico (degradação pela cota)
+    if (degradacao && degradacao.nivel > 0) {
+        alerts.push({
+            type: 'warning',
+            message: `🎛️ Modo econômico nível ${degradacao.nivel} (${degradacao.nome}): pressão em ${degradacao.pressao_percent}% do limite global`
+        });
+    }
+    
+    // Alerta de circuito aberto (chat em modo degradado)
+    if (resiliencia && resiliencia.circuito === 'aberto') {
+        alerts.push({
+            type: 'danger',
+            message: `🔌 API do Gemini instável: circuito aberto, pedidos recusados por mais ${resiliencia.reabre_em_s || 0}s`
+        });
+    }
+    
     // Alerta de Google Search
     if (global.searches_today >= global.search_limit * 0.9) {
         alerts.push({
@@ -315,6 +315,35 @@ function hideLoadingOverlay() {
     }
 }
 
+/**
+ * Espera um job da IA terminar consultando /jobs/<id>.
+ * onEvents(eventos) recebe os trechos parciais (ex.: texto do chat) conforme chegam.
+ * Retorna o corpo final (o mesmo que a rota devolveria de forma síncrona).
+ */
+async function waitForJob(jobId, onEvents = null, interval = 400) {
+    let desde = 0;
+
+    while (true) {
+        const response = await fetch(`/jobs/${jobId}?desde=${desde}`);
+        const job = await response.json();
+
+        if (!response.ok || job.error) {
+            return { error: true, message: job.message || `HTTP ${response.status}` };
+        }
+
+        if (job.eventos && job.eventos.length && onEvents) {
+            onEvents(job.eventos, job);
+        }
+        desde = job.proximo_evento;
+
+        if (job.status === 'concluido' || job.status === 'erro') {
+            return job.resultado;
+        }
+
+        await new Promise(resolve => setTimeout(resolve, interval));
+    }
+}
+
 // Exporta funções globais
 window.APBIA = {
     showNotification,
@@ -324,7 +353,8 @@ window.APBIA = {
     isValidEmail,
     formatPhone,
     showLoadingOverlay,
-    hideLoadingOverlay
+    hideLoadingOverlay,
+    waitForJob
 };
 
 // Log de boas-vindas
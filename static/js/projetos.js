@@ -42,6 +42,16 @@ function showLoading(message) {
     }
 }
 
+/**
+ * Mostra a posição na fila da IA (eventos 'fila' do job) na mensagem de carregamento
+ */
+function mostrarPosicaoFila(eventos) {
+    const fila = eventos.filter(evento => evento.type === 'fila').pop();
+    if (fila) {
+        showLoading(`⏳ Muitos pedidos à IA agora. Posição na fila: ${fila.data.posicao}`);
+    }
+}
+
 function hideLoading() {
     const loadingEl = document.getElementById('loadingIA');
     
@@ -132,7 +142,7 @@ function initProjetosHandlers() {
     }
     
     // ===== AUTOCOMPLETAR (CRÍTICO) =====
-    const btnsAutocompletar = document.querySelectorAll('.btn-ia-autocompletar');
+    const btnsAutocompletar = document.querySelectorAll('.btn-ia-autocompletar[data-campo]');
     
     if (btnsAutocompletar.length > 0) {
         btnsAutocompletar.forEach((btn, index) => {
@@ -142,6 +152,11 @@ function initProjetosHandlers() {
         console.warn('⚠️ Nenhum botão .btn-ia-autocompletar encontrado');
     }
     
+    const btnAutocompletarTodos = document.getElementById('btnAutocompletarTodos');
+    if (btnAutocompletarTodos) {
+        btnAutocompletarTodos.addEventListener('click', handleAutocompletarTodos);
+    }
+    
     // Salvar projeto
     const formProjeto = document.getElementById('formProjeto');
     if (formProjeto && !document.getElementById('projeto_id')) {
@@ -156,10 +171,9 @@ async function handleGerarIdeias() {
     // Confirmação
     const confirmacao = confirm(
         '🎯 MODO BRAGANTEC AUTOMÁTICO\n\n' +
-        'A IA vai analisar TODOS os projetos vencedores das edições anteriores da Bragantec.\n\n' +
+        'A IA vai analisar os projetos das edições anteriores da Bragantec mais relevantes para as ideias.\n\n' +
         '⚠️ ATENÇÃO:\n' +
-        '• Processo pode levar 20-40 segundos\n' +
-        '• Consome ~100k-200k tokens\n\n' +
+        '• Processo pode levar 20-40 segundos\n\n' +
         'Deseja continuar?'
     );
     
@@ -183,7 +197,9 @@ async function handleGerarIdeias() {
             throw new Error(`HTTP ${response.status}: ${response.statusText}`);
         }
         
-        const data = await response.json();
+        // A geração roda numa fila no servidor: espera o job terminar
+        const job = await response.json();
+        const data = job.job_id ? await APBIA.waitForJob(job.job_id, mostrarPosicaoFila) : job;
         
         hideLoading();
         
@@ -240,7 +256,9 @@ async function handleAutocompletar() {
             throw new Error(`HTTP ${response.status}: ${response.statusText}`);
         }
         
-        const data = await response.json();
+        // A geração roda numa fila no servidor: espera o job terminar
+        const job = await response.json();
+        const data = job.job_id ? await APBIA.waitForJob(job.job_id, mostrarPosicaoFila) : job;
         
         hideLoading();
         
@@ -259,6 +277,88 @@ async function handleAutocompletar() {
     }
 }
 
+// ===== AUTOCOMPLETAR TODOS OS CAMPOS VAZIOS =====
+// O servidor gera cada campo num pedido separado; cada um aparece no formulário assim que fica pronto
+const CAMPOS_TEXTO_IA = {
+    introducao: 'introducao',
+    objetivos: 'objetivo_geral',
+    metodologia: 'metodologia',
+    resultados_esperados: 'resultados_esperados'
+};
+
+async function handleAutocompletarTodos() {
+    const campos = Object.keys(CAMPOS_TEXTO_IA)
+        .filter(campo => !document.getElementById(CAMPOS_TEXTO_IA[campo])?.value.trim());
+    
+    if (!campos.length) {
+        showNotification('Todos os campos já estão preenchidos', 'info');
+        return;
+    }
+    
+    if (!confirm(`A IA vai gerar: ${campos.join(', ')}. Continuar?`)) {
+        return;
+    }
+    
+    showLoading(`Gerando ${campos.length} campos...`);
+    let prontos = 0;
+    
+    try {
+        const response = await fetch('/projetos/autocompletar', {
+            method: 'POST',
+            headers: { 
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                campos: campos,
+                projeto: coletarDadosParciais()
+            })
+        });
+        
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+        }
+        
+        const job = await response.json();
+        const data = job.job_id ? await APBIA.waitForJob(job.job_id, eventos => {
+            mostrarPosicaoFila(eventos);
+            eventos.filter(evento => evento.type === 'campo').forEach(evento => {
+                preencherCampo(evento.data.chave, evento.data.texto);
+                prontos++;
+                showLoading(`${prontos}/${campos.length} campos prontos...`);
+            });
+        }) : job;
+        
+        hideLoading();
+        
+        if (data.success) {
+            // Sem fila (ou eventos perdidos): aplica o resultado final
+            Object.entries(data.conteudo || {}).forEach(([chave, texto]) => preencherCampo(chave, texto));
+            
+            if (data.falhas && data.falhas.length) {
+                showNotification(`Não foi possível gerar: ${data.falhas.join(', ')}. Tente esses de novo.`, 'warning');
+            } else {
+                showNotification('Conteúdo gerado! Revise e ajuste', 'success');
+            }
+        } else {
+            console.error('❌ Erro no backend:', data.message);
+            showNotification('Erro: ' + (data.message || 'Erro desconhecido'), 'error');
+        }
+        
+    } catch (error) {
+        console.error('❌ ERRO na requisição:', error);
+        hideLoading();
+        showNotification('Erro ao conectar com IA: ' + error.message, 'error');
+    }
+}
+
+function preencherCampo(chave, texto) {
+    const el = document.getElementById(chave);
+    if (el && texto) {
+        el.value = texto;
+        el.dispatchEvent(new Event('input'));
+    }
+}
+
 // ===== MOSTRAR IDEIAS =====
 function mostrarIdeias(ideias, metadata) {
     // Parse se vier como string
@@ -283,9 +383,10 @@ function mostrarIdeias(ideias, metadata) {
                     <i class="fas fa-check-circle"></i> <strong>Modo Bragantec ativado:</strong> 
                     ${metadata.contexto_usado}
                 </p>
+                ${metadata.tokens_input ? `
                 <small class="text-muted">
-                    <i class="fas fa-info-circle"></i> ${metadata.aviso_tokens}
-                </small>
+                    <i class="fas fa-info-circle"></i> ${metadata.tokens_input.toLocaleString('pt-BR')} tokens de entrada
+                </small>` : ''}
             </div>
         `;
     }
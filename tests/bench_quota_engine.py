@@ -0,0 +1,112 @@
+"""
+Micro-benchmark do motor de cotas (ContadorJanela e os dois backends)
+Simula 10 mil usuários e 1 milhão de requisições registradas; mede vazão, latência por
+reserva e o custo de usuarios_ativos() com todos esses contadores
+
+    python -m tests.bench_quota_engine
+    python -m tests.bench_quota_engine --usuarios 10000 --requisicoes 1000000 --sqlite 50000
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from services.quota_engine import (
+    ContadorJanela, MemoryQuotaBackend, SQLiteQuotaBackend, QuotaEngine, JANELA_MINUTO, JANELA_DIA
+)
+
+
+def _percentil(amostras, p):
+    ordenadas = sorted(amostras)
+    return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p))]
+
+
+def _relatorio(nome, n, segundos, latencias=None):
+    if n == 1:
+        print(f"{nome:<42} {segundos * 1000:9.1f} ms")
+        return
+    linha = f"{nome:<42} {n:>9,} ops  {segundos:7.2f}s  {n / segundos:>11,.0f} ops/s"
+    if latencias:
+        linha += (f"  p50 {_percentil(latencias, 0.5) * 1e6:6.1f}us"
+                  f"  p99 {_percentil(latencias, 0.99) * 1e6:6.1f}us")
+    print(linha)
+
+
+def bench_contador(n_usuarios, n_requisicoes):
+    """ContadorJanela puro, com o relógio simulado: 1M requisições espalhadas por um dia"""
+    contadores = {}
+    passo = 86400 / n_requisicoes
+    agora = time.time()
+    sorteio = random.Random(1)
+
+    inicio = time.perf_counter()
+    for _ in range(n_requisicoes):
+        user_id = sorteio.randrange(n_usuarios)
+        par = contadores.get(user_id)
+        if par is None:
+            par = contadores[user_id] = (ContadorJanela(*JANELA_MINUTO), ContadorJanela(*JANELA_DIA))
+        minuto, dia = par
+        minuto.totais(agora)
+        dia.totais(agora)
+        minuto.adicionar(agora, 1, 800)
+        dia.adicionar(agora, 1, 800)
+        agora += passo
+    _relatorio("ContadorJanela (verifica + registra)", n_requisicoes, time.perf_counter() - inicio)
+
+    buckets = sum(len(m.buckets) + len(d.buckets) for m, d in contadores.values())
+    print(f"{'':<42} {len(contadores):,} usuários, {buckets:,} buckets vivos no fim do dia")
+
+
+def bench_engine(nome, engine, n_usuarios, n_requisicoes, amostra_latencia=50_000):
+    """reservar_global() de usuários sorteados (verificações do usuário + globais numa operação)"""
+    sorteio = random.Random(2)
+    latencias = []
+    intervalo_amostra = max(1, n_requisicoes // amostra_latencia)
+
+    inicio = time.perf_counter()
+    for i in range(n_requisicoes):
+        user_id = sorteio.randrange(n_usuarios)
+        if i % intervalo_amostra:
+            engine.reservar_global(user_id, 800)
+        else:
+            t0 = time.perf_counter()
+            engine.reservar_global(user_id, 800)
+            latencias.append(time.perf_counter() - t0)
+    _relatorio(f"{nome}: reservar_global", n_requisicoes, time.perf_counter() - inicio, latencias)
+
+    inicio = time.perf_counter()
+    ativos = engine.usuarios_ativos()
+    _relatorio(f"{nome}: usuarios_ativos ({len(ativos):,})", 1, time.perf_counter() - inicio)
+
+
+def _engine(backend):
+    # Limites altos: o benchmark mede o custo das verificações, não as recusas
+    infinito = 10 ** 12
+    return QuotaEngine(backend, rpm=infinito, tpm=infinito, rpd=infinito,
+                       global_rpm=infinito, global_tpm=infinito)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--usuarios', type=int, default=10_000)
+    parser.add_argument('--requisicoes', type=int, default=1_000_000)
+    parser.add_argument('--sqlite', type=int, default=50_000,
+                        help='requisições no backend SQLite (cada uma é uma transação em disco)')
+    args = parser.parse_args()
+
+    print(f"{args.usuarios:,} usuários, {args.requisicoes:,} requisições\n")
+
+    bench_contador(args.usuarios, args.requisicoes)
+    bench_engine("Memória", _engine(MemoryQuotaBackend()), args.usuarios, args.requisicoes)
+
+    if args.sqlite:
+        with tempfile.TemporaryDirectory() as pasta:
+            backend = SQLiteQuotaBackend(os.path.join(pasta, 'bench_quota.sqlite3'))
+            bench_engine("SQLite", _engine(backend), args.usuarios, args.sqlite)
+            backend._conexao().close()
+
+
+if __name__ == '__main__':
+    main()
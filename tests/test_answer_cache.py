@@ -0,0 +1,130 @@
+"""
+AnswerCache.buscar: limiares de similaridade (normal e fixada), negações, escopos e
+perguntas/respostas que não podem ser reaproveitadas
+
+    python -m unittest tests.test_answer_cache -v
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from config import Config
+from services.answer_cache import AnswerCache, termos_da_pergunta, negacoes_da_pergunta
+
+
+PRAZO = "Qual é o prazo de inscrição da Bragantec?"
+RESUMO = "Como escrever um bom resumo para a feira?"
+CATEGORIAS = "Quais são as categorias da Bragantec?"
+
+
+def _resposta(texto, tokens=500):
+    return {'response': texto, 'total_tokens': tokens}
+
+
+class AnswerCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.caminho = os.path.join(pasta.name, 'respostas.sqlite3')
+        self.cache = AnswerCache(self.caminho)
+
+        ligado = mock.patch.object(Config, 'RESPOSTAS_CACHE', True)
+        ligado.start()
+        self.addCleanup(ligado.stop)
+
+    def _guardar_base(self, fixar_prazo=False):
+        if fixar_prazo:
+            self.cache.criar_fixada(PRAZO, "Inscrições até 30/06.", 'participante', False)
+        else:
+            self.assertTrue(self.cache.guardar(PRAZO, _resposta("Inscrições até 30/06."), 'participante', False))
+        self.cache.guardar(RESUMO, _resposta("Seja objetivo."), 'participante', False)
+        self.cache.guardar(CATEGORIAS, _resposta("Informática, Biológicas..."), 'participante', False)
+
+    def _similaridade(self, pergunta):
+        achada = self.cache._indice('participante|geral').mais_parecida(
+            termos_da_pergunta(pergunta), negacoes_da_pergunta(pergunta))
+        return achada[1] if achada else 0.0
+
+    def _buscar(self, pergunta, tipo_usuario='participante', bragantec=False):
+        return self.cache.buscar(pergunta, tipo_usuario, bragantec)
+
+    def test_mesma_pergunta_com_outras_palavras_e_hit(self):
+        self._guardar_base()
+
+        for pergunta in ("Qual o prazo de inscrição da Bragantec?", "qual o prazo da inscricao na bragantec"):
+            resposta = self._buscar(pergunta)
+            self.assertIsNotNone(resposta, pergunta)
+            self.assertEqual(resposta['response'], "Inscrições até 30/06.")
+            self.assertTrue(resposta['do_cache'])
+            self.assertEqual(resposta['total_tokens'], 0)
+
+        self.assertEqual(self.cache.stats['hits'], 2)
+        self.assertEqual(self.cache.stats['tokens_economizados'], 1000)
+
+    def test_outro_assunto_ou_outro_interrogativo_e_miss(self):
+        self._guardar_base()
+
+        for pergunta in ("Qual é o prazo de entrega do relatório da Bragantec?",   # prazo de outra coisa
+                         "Onde é a inscrição da Bragantec?",                       # onde != qual prazo
+                         "Quais são as categorias da feira?"):
+            self.assertLess(self._similaridade(pergunta), Config.RESPOSTAS_CACHE_SIMILARIDADE_FIXADA, pergunta)
+            self.assertIsNone(self._buscar(pergunta), pergunta)
+
+    def test_fixadas_tem_limiar_menor(self):
+        pergunta = "Qual é o prazo de inscrição da Bragantec este ano?"
+
+        self._guardar_base()
+        similaridade = self._similaridade(pergunta)
+        self.assertGreaterEqual(similaridade, Config.RESPOSTAS_CACHE_SIMILARIDADE_FIXADA)
+        self.assertLess(similaridade, Config.RESPOSTAS_CACHE_SIMILARIDADE)
+        self.assertIsNone(self._buscar(pergunta))
+
+        # Mesma pergunta guardada como fixada por um admin: agora passa
+        outro = AnswerCache(os.path.join(os.path.dirname(self.caminho), 'fixadas.sqlite3'))
+        self.cache = outro
+        self._guardar_base(fixar_prazo=True)
+        self.assertEqual(self._similaridade(pergunta), similaridade)
+        self.assertEqual(self._buscar(pergunta)['response'], "Inscrições até 30/06.")
+        self.assertEqual(self.cache.stats['hits_fixadas'], 1)
+
+    def test_negacao_nao_casa_com_a_pergunta_afirmativa(self):
+        self._guardar_base()
+        negada = "Como não escrever um bom resumo para a feira?"
+
+        self.assertIsNone(self._buscar(negada))
+
+        self.assertTrue(self.cache.guardar(negada, _resposta("Evite jargões."), 'participante', False))
+        self.assertEqual(self._buscar(negada)['response'], "Evite jargões.")
+        self.assertEqual(self._buscar(RESUMO)['response'], "Seja objetivo.")
+        self.assertIsNone(self._buscar("Como escrever um bom resumo para a feira sem jargões?"))
+
+    def test_escopos_separados(self):
+        self._guardar_base()
+
+        self.assertIsNone(self._buscar(PRAZO, tipo_usuario='orientador'))
+        self.assertIsNone(self._buscar(PRAZO, bragantec=True))
+        self.assertIsNotNone(self._buscar(PRAZO))
+
+    def test_perguntas_pessoais_e_respostas_que_citam_o_usuario_ficam_de_fora(self):
+        pessoal = "Qual é o prazo de inscrição do meu projeto?"
+        self.assertFalse(self.cache.guardar(pessoal, _resposta("Até 30/06."), 'participante', False))
+        self.assertIsNone(self._buscar(pessoal))
+
+        self.assertFalse(self.cache.guardar(PRAZO, _resposta("Ana, as inscrições vão até 30/06."),
+                                            'participante', False, termos_privados=['Ana']))
+        self.assertIsNone(self._buscar(PRAZO))
+        self.assertEqual(self.cache.stats['recusadas_privadas'], 1)
+
+    def test_outro_worker_enxerga_o_que_foi_guardado(self):
+        outro_worker = AnswerCache(self.caminho)
+        self.assertIsNone(outro_worker.buscar(PRAZO, 'participante', False))
+
+        self._guardar_base()
+        self.assertEqual(outro_worker.buscar(PRAZO, 'participante', False)['response'], "Inscrições até 30/06.")
+
+
+if __name__ == '__main__':
+    unittest.main()
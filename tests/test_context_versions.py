@@ -0,0 +1,57 @@
+"""
+Versões do contexto de projetos compartilhadas entre os workers (dao/context_versions.py)
+
+    python -m unittest tests.test_context_versions -v
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from dao.context_versions import VersoesContexto
+from dao.dao import SupabaseDAO
+
+
+class VersoesContextoTest(unittest.TestCase):
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.caminho = os.path.join(pasta.name, 'contexto.sqlite3')
+
+    def test_escrita_num_worker_invalida_os_outros(self):
+        # Duas instâncias no mesmo arquivo = dois workers do gunicorn
+        worker_a, worker_b = VersoesContexto(self.caminho), VersoesContexto(self.caminho)
+        self.assertEqual(worker_b.versao(1), 0)
+
+        worker_a.incrementar([1, 2])
+        self.assertEqual(worker_b.versao(1), 1)
+        self.assertEqual(worker_b.versao(2), 1)
+        self.assertEqual(worker_b.versao(3), 0)  # Outros usuários não mudam
+
+        worker_b.incrementar([1, None])
+        self.assertEqual(worker_a.versao(1), 2)
+
+    def test_dao_invalida_so_os_usuarios_do_projeto(self):
+        versoes = VersoesContexto(self.caminho)
+        client = mock.MagicMock()
+        dao = SupabaseDAO(client=client, versoes_contexto=versoes)
+
+        # Projeto 10: orientador 7
+        client.table.return_value.select.return_value.eq.return_value.execute.return_value.data = [{'orientador_id': 7}]
+        dao.associar_participante_projeto(3, 10)
+        self.assertEqual((versoes.versao(3), versoes.versao(7), versoes.versao(4)), (1, 1, 0))
+
+        dao.criar_orientacao(8, 10)
+        dao.remover_orientacao(8, 10)
+        self.assertEqual(versoes.versao(8), 2)
+
+        # Escritas fora dos cinco caminhos não invalidam nada
+        dao.atualizar_usuario(3, nome_completo='Outro Nome')
+        dao.deletar_usuario(4)
+        self.assertEqual((versoes.versao(3), versoes.versao(4)), (1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
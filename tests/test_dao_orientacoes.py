@@ -0,0 +1,173 @@
+"""
+Consultas de SupabaseDAO.listar_orientacoes_completas
+Roda contra um cliente Supabase falso que conta as consultas e, como o PostgREST, corta cada
+resposta em max-rows linhas: todas as orientações têm que voltar, e o número de consultas
+cresce com as páginas/lotes de ids, não com as orientações (sem N+1)
+
+    python -m unittest tests.test_dao_orientacoes -v
+"""
+
+import unittest
+from collections import Counter
+from unittest import mock
+
+from config import Config
+from dao.dao import SupabaseDAO
+
+
+class _Resultado:
+    def __init__(self, data):
+        self.data = data
+        self.count = len(data)
+
+
+class _Consulta:
+    """Só o que o DAO usa do query builder do postgrest (select, filtros, order, range e execute)"""
+
+    def __init__(self, cliente, tabela):
+        self.cliente = cliente
+        self.tabela = tabela
+        self.filtros = []
+        self.ordem = []
+        self.intervalo = None
+
+    def select(self, colunas='*', count=None):
+        self.colunas = colunas
+        return self
+
+    def eq(self, coluna, valor):
+        self.filtros.append(lambda row: row.get(coluna) == valor)
+        return self
+
+    def in_(self, coluna, valores):
+        valores = set(valores)
+        self.filtros.append(lambda row: row.get(coluna) in valores)
+        return self
+
+    def order(self, coluna, desc=False):
+        self.ordem.append(coluna)
+        return self
+
+    def range(self, inicio, fim):
+        self.intervalo = (inicio, fim)
+        return self
+
+    def execute(self):
+        self.cliente.consultas.append(self.tabela)
+        rows = [dict(row) for row in self.cliente.tabelas.get(self.tabela, []) if all(f(row) for f in self.filtros)]
+        if self.ordem:
+            rows.sort(key=lambda row: tuple(row.get(c) for c in self.ordem))
+        if self.intervalo:
+            rows = rows[self.intervalo[0]:self.intervalo[1] + 1]
+        # max-rows do PostgREST: a resposta nunca passa disso, peça o que pedir
+        return _Resultado(rows[:self.cliente.max_linhas])
+
+
+class ClienteContador:
+    """Cliente Supabase falso que guarda a tabela de cada consulta executada"""
+
+    def __init__(self, tabelas, max_linhas=1000):
+        self.tabelas = tabelas
+        self.max_linhas = max_linhas
+        self.consultas = []
+
+    def table(self, nome):
+        return _Consulta(self, nome)
+
+
+def _dados(n_projetos, participantes_por_projeto=3):
+    """n_projetos projetos, um orientador para cada dois projetos e alguns projetos sem participantes"""
+    usuarios, projetos, orientacoes, participacoes = [], [], [], []
+    proximo_id = 1
+
+    for p in range(1, n_projetos + 1):
+        projetos.append({'id': p, 'nome': f'Projeto {p}', 'categoria': 'Informática'})
+
+        if p % 2 == 1:
+            orientador_id = proximo_id
+            proximo_id += 1
+            usuarios.append({'id': orientador_id, 'nome_completo': f'Orientador {orientador_id}',
+                             'email': f'o{orientador_id}@ifsp.edu.br', 'numero_inscricao': None})
+        orientacoes.append({'orientador_id': orientador_id, 'projeto_id': p})
+
+        if p % 5 == 0:
+            continue
+        for _ in range(participantes_por_projeto):
+            usuarios.append({'id': proximo_id, 'nome_completo': f'Aluno {proximo_id}',
+                             'email': f'a{proximo_id}@aluno.ifsp.edu.br', 'numero_inscricao': f'BP{proximo_id:08d}X'})
+            participacoes.append({'projeto_id': p, 'participante_id': proximo_id})
+            proximo_id += 1
+
+    return {
+        'usuarios': usuarios,
+        'projetos': projetos,
+        'orientadores_projetos': orientacoes,
+        'participantes_projetos': participacoes
+    }
+
+
+def _limite_consultas(dados):
+    """Máximo de consultas sem N+1: uma por página de cada tabela, mais uma por lote de ids"""
+    lotes = lambda ids: -(-len(ids) // Config.SUPABASE_LOTE_IN)
+    paginas = lambda tabela: len(dados[tabela]) // Config.SUPABASE_PAGINA
+    projeto_ids = {row['projeto_id'] for row in dados['orientadores_projetos']}
+    return {
+        'orientadores_projetos': 1 + paginas('orientadores_projetos'),
+        'participantes_projetos': lotes(projeto_ids) + paginas('participantes_projetos'),
+        'usuarios': lotes(dados['usuarios']) + paginas('usuarios'),
+        'projetos': lotes(projeto_ids) + paginas('projetos'),
+    }
+
+
+class ListarOrientacoesCompletasTest(unittest.TestCase):
+
+    def _listar(self, dados, max_linhas=1000):
+        cliente = ClienteContador(dados, max_linhas)
+        dao = SupabaseDAO(client=cliente)
+        return dao.listar_orientacoes_completas(), Counter(cliente.consultas)
+
+    def _esperadas(self, n_projetos):
+        sem_participantes = n_projetos // 5
+        return (n_projetos - sem_participantes) * 3 + sem_participantes
+
+    def test_consultas_nao_crescem_com_as_orientacoes(self):
+        for n_projetos in (10, 100, 3000):
+            dados = _dados(n_projetos)
+            orientacoes, consultas = self._listar(dados)
+
+            # 3000 projetos passa do max-rows em todas as tabelas: nada pode ficar de fora
+            self.assertEqual(len(orientacoes), self._esperadas(n_projetos))
+            self.assertEqual(len({o['id'] for o in orientacoes}), len(orientacoes))
+
+            for tabela, limite in _limite_consultas(dados).items():
+                self.assertLessEqual(consultas[tabela], limite, f"{n_projetos} projetos, {tabela}: {consultas}")
+
+        # Dados pequenos: uma consulta por tabela
+        _, consultas = self._listar(_dados(10))
+        self.assertEqual(sum(consultas.values()), 4)
+
+    def test_pagina_dentro_de_cada_lote(self):
+        # Página menor que os participantes de um lote de projetos: cada lote precisa de várias páginas
+        with mock.patch.object(Config, 'SUPABASE_PAGINA', 50):
+            orientacoes, consultas = self._listar(_dados(400), max_linhas=50)
+
+        self.assertEqual(len(orientacoes), self._esperadas(400))
+        self.assertGreater(consultas['participantes_projetos'], 400 // Config.SUPABASE_LOTE_IN)
+
+    def test_junta_os_dados_de_cada_tabela(self):
+        orientacoes, _ = self._listar(_dados(5))
+        por_id = {o['id']: o for o in orientacoes}
+
+        # Projeto 1: orientador 1, alunos 2, 3 e 4
+        linha = por_id['1-1-2']
+        self.assertEqual(linha['orientador_nome'], 'Orientador 1')
+        self.assertEqual(linha['participante_nome'], 'Aluno 2')
+        self.assertEqual(linha['participante_bp'], 'BP00000002X')
+        self.assertEqual(linha['projeto_nome'], 'Projeto 1')
+
+        # Projeto 5 (orientador 15) não tem participantes: uma linha só, do orientador
+        self.assertEqual(por_id['15-5']['participante_nome'], '(Sem participantes)')
+
+
+if __name__ == '__main__':
+    unittest.main()
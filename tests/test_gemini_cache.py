@@ -0,0 +1,113 @@
+"""
+ContextCacheManager contra o FakeCachesClient (sem rede)
+
+    python -m unittest tests.test_gemini_cache -v
+"""
+
+import unittest
+from unittest import mock
+
+from config import Config
+from services.gemini_cache import ContextCacheManager, FakeCachesClient
+
+
+PROMPT = "Você é a APBIA, assistente de projetos da Bragantec."
+
+
+class ContextCacheManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.agora = 1_000_000.0
+        relogio = mock.patch('services.gemini_cache.time.time', side_effect=lambda: self.agora)
+        relogio.start()
+        self.addCleanup(relogio.stop)
+
+    def _manager(self, client):
+        return ContextCacheManager(client, 'gemini-2.5-flash', ttl_seconds=3600, refresh_margin=300, enabled=True)
+
+    def test_um_cache_por_tipo_bragantec_e_ferramentas(self):
+        client = FakeCachesClient()
+        manager = self._manager(client)
+
+        nomes = {
+            chave: manager.get_cache_name(*chave[:2], PROMPT, tools_key=chave[2])
+            for chave in [
+                ('participante', False, ''),
+                ('participante', True, ''),
+                ('orientador', False, ''),
+                ('participante', False, 'search'),
+            ]
+        }
+        self.assertEqual(client.chamadas['create'], 4)
+        self.assertEqual(len(set(nomes.values())), 4)
+
+        # Mesma chave de novo: reaproveita sem chamar a API
+        self.assertEqual(manager.get_cache_name('participante', True, PROMPT), nomes[('participante', True, '')])
+        self.assertEqual(client.chamadas['create'], 4)
+        self.assertEqual(manager.stats['hits'], 1)
+
+    def test_prompt_diferente_recria_o_cache(self):
+        client = FakeCachesClient()
+        manager = self._manager(client)
+
+        antigo = manager.get_cache_name('participante', False, PROMPT)
+        novo = manager.get_cache_name('participante', False, PROMPT + " Seja breve.")
+
+        self.assertNotEqual(antigo, novo)
+        self.assertEqual(client.chamadas['delete'], 1)
+        self.assertNotIn(antigo, client.caches)
+
+    def test_renova_antes_do_ttl_acabar(self):
+        client = FakeCachesClient()
+        manager = self._manager(client)
+        nome = manager.get_cache_name('participante', False, PROMPT)
+
+        # Longe de expirar: só hit
+        self.agora += 3000
+        self.assertEqual(manager.get_cache_name('participante', False, PROMPT), nome)
+        self.assertEqual(client.chamadas['update'], 0)
+
+        # Dentro da margem: renova o mesmo cache
+        self.agora += 400
+        self.assertEqual(manager.get_cache_name('participante', False, PROMPT), nome)
+        self.assertEqual(client.chamadas['update'], 1)
+        self.assertEqual(manager.stats['renovados'], 1)
+
+        # O TTL renovado conta a partir da renovação
+        self.agora += 3000
+        self.assertEqual(manager.get_cache_name('participante', False, PROMPT), nome)
+        self.assertEqual(client.chamadas['create'], 1)
+
+        # Expirou sem ninguém usar: cria outro
+        self.agora += 4000
+        self.assertNotEqual(manager.get_cache_name('participante', False, PROMPT), nome)
+        self.assertEqual(client.chamadas['create'], 2)
+
+    def test_falha_na_criacao_usa_o_prompt_direto(self):
+        client = FakeCachesClient(falhar_criacao=True)
+        manager = self._manager(client)
+
+        self.assertIsNone(manager.get_cache_name('participante', False, PROMPT))
+        self.assertEqual(manager.stats['falhas'], 1)
+
+        # Não tenta de novo antes de GEMINI_CACHE_RETRY_AFTER
+        self.agora += Config.GEMINI_CACHE_RETRY_AFTER - 1
+        self.assertIsNone(manager.get_cache_name('participante', False, PROMPT))
+        self.assertEqual(client.chamadas['create'], 1)
+
+        # Depois da espera, a API voltou a aceitar
+        client.falhar_criacao = False
+        self.agora += 2
+        self.assertIsNotNone(manager.get_cache_name('participante', False, PROMPT))
+        self.assertEqual(client.chamadas['create'], 2)
+
+    def test_desligado_nao_chama_a_api(self):
+        client = FakeCachesClient()
+        manager = ContextCacheManager(client, 'gemini-2.5-flash', enabled=False)
+
+        self.assertIsNone(manager.get_cache_name('participante', False, PROMPT))
+        self.assertEqual(client.chamadas['create'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
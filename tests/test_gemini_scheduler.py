@@ -0,0 +1,137 @@
+"""
+Ordem da fila justa (FairScheduler) com uma cota falsa que só abre vagas quando o teste manda:
+prioridade primeiro, round-robin entre usuários, pedidos menores passando um travado no TPM
+(até GEMINI_FILA_MAX_PULOS vezes) e desistência por tempo
+
+    python -m unittest tests.test_gemini_scheduler -v
+"""
+
+import time
+import threading
+import unittest
+from unittest import mock
+
+from config import Config
+from services.gemini_scheduler import FairScheduler, PRIORIDADE_CHAT, PRIORIDADE_ORIENTADOR
+
+
+class CotaFalsa:
+    """reservar_global() do QuotaEngine: vagas e tokens por pedido controlados pelo teste"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.vagas = 0
+        self.max_tokens = float('inf')
+        self.admitidos = []      # (user_id, tokens) na ordem das reservas
+        self.liberados = []
+
+    def reservar_global(self, user_id, tokens_estimados=0):
+        with self.lock:
+            if self.vagas <= 0 or tokens_estimados > self.max_tokens:
+                return False, "lotado", True
+            self.vagas -= 1
+            self.admitidos.append((user_id, tokens_estimados))
+            return True, "", False
+
+    def liberar(self, user_id, tokens_reservados=0):
+        with self.lock:
+            self.liberados.append((user_id, tokens_reservados))
+
+    def abrir(self, vagas=1, max_tokens=None):
+        with self.lock:
+            self.vagas += vagas
+            if max_tokens is not None:
+                self.max_tokens = max_tokens
+
+
+def _esperar(condicao, timeout=5.0):
+    limite = time.time() + timeout
+    while not condicao():
+        if time.time() > limite:
+            raise AssertionError("condição não aconteceu a tempo")
+        time.sleep(0.005)
+
+
+class FairSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cota = CotaFalsa()
+        self.scheduler = FairScheduler(quota=self.cota, max_espera=10, intervalo=0.005)
+        self.resultados = {}
+        self.threads = []
+
+    def tearDown(self):
+        # Libera quem ainda estiver esperando para as threads terminarem
+        self.cota.abrir(vagas=100, max_tokens=float('inf'))
+        for t in self.threads:
+            t.join(timeout=5)
+
+    def _pedir(self, nome, user_id, tokens=100, prioridade=PRIORIDADE_CHAT):
+        """admitir() numa thread; só volta quando o pedido já está na fila (ordem de chegada garantida)"""
+        na_fila = self.scheduler.get_stats()['na_fila']
+
+        def pedir():
+            self.resultados[nome] = self.scheduler.admitir(user_id, tokens, prioridade)
+
+        t = threading.Thread(target=pedir)
+        t.start()
+        self.threads.append(t)
+        _esperar(lambda: self.scheduler.get_stats()['na_fila'] == na_fila + 1)
+
+    def test_prioridade_e_round_robin_entre_usuarios(self):
+        self._pedir('a1', 'A')
+        self._pedir('a2', 'A')
+        self._pedir('a3', 'A')
+        self._pedir('b1', 'B')
+        self._pedir('orientador', 'O', prioridade=PRIORIDADE_ORIENTADOR)
+
+        # Posição informada ao usuário
+        with self.scheduler.cond:
+            ordem = [(p.user_id, p.seq) for p in self.scheduler._ordem()]
+        self.assertEqual([u for u, _ in ordem], ['O', 'A', 'B', 'A', 'A'])
+
+        self.cota.abrir(vagas=5)
+        _esperar(lambda: len(self.resultados) == 5)
+
+        # Orientador primeiro; depois um pedido de cada usuário por vez
+        self.assertEqual([u for u, _ in self.cota.admitidos], ['O', 'A', 'B', 'A', 'A'])
+        self.assertTrue(all(ok for ok, _ in self.resultados.values()))
+        self.assertEqual(self.scheduler.get_stats()['admitidos_fila'], 5)
+
+    def test_pedidos_menores_passam_um_travado_no_tpm_ate_o_limite(self):
+        with mock.patch.object(Config, 'GEMINI_FILA_MAX_PULOS', 3), \
+             mock.patch.object(Config, 'GEMINI_FILA_CANDIDATOS', 4):
+            self._pedir('grande', 'G', tokens=5000)
+            for i in range(5):
+                self._pedir(f'p{i}', f'P{i}', tokens=100)
+
+            # Só pedidos pequenos cabem no TPM: eles passam na frente, mas só 3 vezes
+            self.cota.abrir(vagas=10, max_tokens=1000)
+            _esperar(lambda: len(self.cota.admitidos) == 3)
+            time.sleep(0.05)
+            self.assertEqual([u for u, _ in self.cota.admitidos], ['P0', 'P1', 'P2'])
+            self.assertNotIn('grande', self.resultados)
+            self.assertEqual(self.scheduler.get_stats()['pulos'], 3)
+
+            # Com o grande cabendo de novo, ele sai antes dos que sobraram
+            self.cota.abrir(vagas=0, max_tokens=float('inf'))
+            _esperar(lambda: len(self.resultados) == 6)
+
+        self.assertEqual([u for u, _ in self.cota.admitidos], ['P0', 'P1', 'P2', 'G', 'P3', 'P4'])
+
+    def test_desiste_depois_de_max_espera(self):
+        ok, msg = self.scheduler.admitir('A', 100, max_espera=0.2)
+
+        self.assertFalse(ok)
+        self.assertIn("muitos pedidos", msg)
+        stats = self.scheduler.get_stats()
+        self.assertEqual((stats['desistencias'], stats['na_fila']), (1, 0))
+
+        # A vaga que abrir depois não é gasta com quem já foi embora
+        self.cota.abrir(vagas=1)
+        time.sleep(0.05)
+        self.assertEqual(self.cota.admitidos, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+"""
+Check-and-reserve do QuotaEngine atômico entre workers (SQLiteQuotaBackend no mesmo arquivo):
+com N processos disputando um limite K, exatamente K reservas passam (e não N×K)
+
+    python -m unittest tests.test_quota_engine -v
+"""
+
+import os
+import tempfile
+import threading
+import unittest
+import multiprocessing
+
+from services.quota_engine import SQLiteQuotaBackend, QuotaEngine
+
+
+LIMITE = 25          # rpm do teste
+TENTATIVAS = 20      # por worker: 4 workers × 20 tentativas > LIMITE
+ALTO = 10 ** 9
+
+
+def _engine(caminho, **limites):
+    # Cada "worker" abre o próprio backend no arquivo compartilhado, como no gunicorn
+    padrao = dict(rpm=ALTO, tpm=ALTO, rpd=ALTO, global_rpm=ALTO, global_tpm=ALTO)
+    padrao.update(limites)
+    return QuotaEngine(SQLiteQuotaBackend(caminho), **padrao)
+
+
+def _worker(caminho, limites, global_, barreira, fila):
+    engine = _engine(caminho, **limites)
+    barreira.wait()
+    aceitas = 0
+    for i in range(TENTATIVAS):
+        if global_:
+            # Um usuário diferente por tentativa: só o limite da API key segura
+            aceitas += engine.reservar_global(f"{os.getpid()}-{i}", 100)[0]
+        else:
+            aceitas += engine.reservar(1, 100)[0]
+    fila.put(aceitas)
+
+
+class ReservaEntreWorkersTest(unittest.TestCase):
+
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.caminho = os.path.join(pasta.name, 'cotas.sqlite3')
+        SQLiteQuotaBackend(self.caminho)  # cria a tabela antes dos workers
+
+    def _processos(self, limites, global_=False, n_workers=4):
+        ctx = multiprocessing.get_context('spawn')
+        barreira, fila = ctx.Barrier(n_workers), ctx.Queue()
+        processos = [ctx.Process(target=_worker, args=(self.caminho, limites, global_, barreira, fila))
+                     for _ in range(n_workers)]
+        for p in processos:
+            p.start()
+        aceitas = [fila.get(timeout=60) for _ in processos]
+        for p in processos:
+            p.join(timeout=60)
+            self.assertEqual(p.exitcode, 0)
+        return aceitas
+
+    def test_rpm_do_usuario_vale_para_todos_os_processos(self):
+        aceitas = self._processos({'rpm': LIMITE})
+        self.assertEqual(sum(aceitas), LIMITE, f"por worker: {aceitas}")
+        self.assertEqual(_engine(self.caminho).uso(1)['requests_minute'], LIMITE)
+
+    def test_rpm_da_api_key_vale_para_todos_os_processos(self):
+        aceitas = self._processos({'global_rpm': LIMITE}, global_=True)
+        self.assertEqual(sum(aceitas), LIMITE, f"por worker: {aceitas}")
+
+    def test_threads_no_mesmo_backend(self):
+        engine = _engine(self.caminho, rpm=LIMITE)
+        barreira = threading.Barrier(8)
+        aceitas = []
+
+        def worker():
+            barreira.wait()
+            aceitas.extend(engine.reservar(1, 100)[0] for _ in range(TENTATIVAS))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(sum(aceitas), LIMITE)
+
+    def test_liberar_devolve_a_vaga(self):
+        engine = _engine(self.caminho, rpm=2)
+        self.assertTrue(engine.reservar(1)[0])
+        self.assertTrue(engine.reservar(1)[0])
+        self.assertFalse(engine.reservar(1)[0])
+
+        engine.liberar(1)
+        self.assertTrue(engine.reservar(1)[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+"""
+SingleFlight.executar: um líder por chave, seguidores recebendo cópias do resultado (ou o mesmo erro)
+e o cache curto dos endpoints determinísticos
+
+    python -m unittest tests.test_single_flight -v
+"""
+
+import time
+import threading
+import unittest
+from unittest import mock
+
+from services.single_flight import SingleFlight, chave_pedido
+
+
+def _esperar(condicao, timeout=5.0):
+    limite = time.time() + timeout
+    while not condicao():
+        if time.time() > limite:
+            raise AssertionError("condição não aconteceu a tempo")
+        time.sleep(0.005)
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        self.voo = SingleFlight(max_cache=2)
+        self.liberar = threading.Event()
+        self.chamadas = 0
+
+    def _func(self, resultado=None, erro=None):
+        """Chamada "à API" que só termina quando o teste liberar"""
+        def func():
+            self.chamadas += 1
+            self.liberar.wait(5)
+            if erro is not None:
+                raise erro
+            return resultado
+        return func
+
+    def _simultaneos(self, n, chave, func, **kwargs):
+        """n threads pedindo a mesma chave; volta [(resultado, erro)] depois que o líder termina"""
+        saidas = [None] * n
+
+        def pedir(i):
+            try:
+                saidas[i] = (self.voo.executar(chave, func, **kwargs), None)
+            except Exception as e:
+                saidas[i] = (None, e)
+
+        threads = [threading.Thread(target=pedir, args=(i,)) for i in range(n)]
+        for t in threads:
+            t.start()
+        _esperar(lambda: self.voo.get_stats()['seguidores'] == n - 1)
+        self.liberar.set()
+        for t in threads:
+            t.join(5)
+        return saidas
+
+    def test_seguidores_recebem_copia_do_resultado_do_lider(self):
+        resultado = {'response': 'ideias', 'total_tokens': 1000}
+        saidas = self._simultaneos(5, 'k', self._func(resultado))
+
+        self.assertEqual(self.chamadas, 1)
+        self.assertTrue(all(s == (resultado, None) for s in saidas))
+
+        # Cópias: um pedido mexer no seu resultado não afeta os outros
+        respostas = [r for r, _ in saidas]
+        respostas[0]['response'] = 'alterada'
+        self.assertEqual(sum(r['response'] == 'ideias' for r in respostas), 4)
+
+        stats = self.voo.get_stats()
+        self.assertEqual((stats['lideres'], stats['seguidores'], stats['em_andamento']), (1, 4, 0))
+        self.assertEqual(stats['tokens_economizados'], 4000)
+
+    def test_erro_do_lider_chega_a_todos_e_nao_fica_guardado(self):
+        erro = RuntimeError("API caiu")
+        saidas = self._simultaneos(4, 'k', self._func(erro=erro), ttl=60)
+
+        self.assertEqual(self.chamadas, 1)
+        self.assertTrue(all(e is erro for _, e in saidas))
+
+        # Próximo pedido tenta de novo (sem voo preso nem erro em cache)
+        self.assertEqual(self.voo.executar('k', lambda: 'ok', ttl=60), 'ok')
+
+    def test_chaves_diferentes_nao_se_esperam(self):
+        self.liberar.set()
+        self.assertEqual(self.voo.executar('a', lambda: 1), 1)
+        self.assertEqual(self.voo.executar('b', lambda: 2), 2)
+        self.assertEqual(self.voo.get_stats()['seguidores'], 0)
+
+    def test_cache_com_ttl_e_guardar(self):
+        agora = [1000.0]
+        with mock.patch('services.single_flight.time.time', side_effect=lambda: agora[0]):
+            self.assertEqual(self.voo.executar('k', lambda: {'n': 1}, ttl=30), {'n': 1})
+            self.assertEqual(self.voo.executar('k', lambda: {'n': 2}, ttl=30), {'n': 1})
+            self.assertEqual(self.voo.get_stats()['cache_hits'], 1)
+
+            # Venceu: chama de novo
+            agora[0] += 31
+            self.assertEqual(self.voo.executar('k', lambda: {'n': 3}, ttl=30), {'n': 3})
+
+            # Sem ttl não guarda; guardar() recusando também não
+            self.assertEqual(self.voo.executar('x', lambda: {'n': 1}), {'n': 1})
+            self.assertEqual(self.voo.executar('x', lambda: {'n': 2}, ttl=30, guardar=lambda r: False), {'n': 2})
+            self.assertEqual(self.voo.executar('x', lambda: {'n': 3}, ttl=30), {'n': 3})
+
+    def test_chave_ignora_espacos_mas_nao_a_config(self):
+        self.assertEqual(chave_pedido("Gere  ideias\n", {'temperature': 0.7}),
+                         chave_pedido("Gere ideias", {'temperature': 0.7}))
+        self.assertNotEqual(chave_pedido("Gere ideias", {'temperature': 0.7}),
+                            chave_pedido("Gere ideias", {'temperature': 0.9}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -148,10 +148,8 @@ def require_valid_session(f):
             return f(*args, **kwargs)
         
         # Importa aqui para evitar circular import
-        from dao.dao import SupabaseDAO
-        from utils.session_manager import SessionManager
-        dao = SupabaseDAO()
-        session_manager = SessionManager(dao)
+        from utils.session_manager import get_session_manager
+        session_manager = get_session_manager()
         
         # Valida sessão
         if not session_manager.validate_session(current_user.id):
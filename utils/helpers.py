@@ -4,10 +4,10 @@ Funções auxiliares para o APBIA
 
 import os
 import re
+import hashlib
 import uuid
 import time
 import mimetypes
-from threading import Lock
 from datetime import datetime
 from werkzeug.utils import secure_filename
 from config import Config
@@ -163,58 +163,66 @@ def detect_mime_type(filename, content_type=None):
     
     # 4. Retorna tipo baseado em extensão ou genérico
     return fallback_types.get(ext, 'application/octet-stream')
-def save_uploaded_file(file, base_dir, user_id, subfolder=None):
+def save_uploaded_file(file, base_dir, user_id, subfolder=None, bloco=1024 * 1024):
     """
-    Salva arquivo com nome único e proteção contra race conditions
+    Salva arquivo com nome único numa única passada pelo corpo da requisição
+    Calcula o sha256 e o tamanho enquanto grava (o mesmo arquivo é usado no upload ao Gemini)
+    O nome é reservado com O_EXCL, sem lock global
     """
+    # Monta estrutura de diretórios
+    user_dir = os.path.join(base_dir, str(user_id))
     
-    # Lock global para evitar race conditions
-    if not hasattr(save_uploaded_file, 'lock'):
-        save_uploaded_file.lock = Lock()
-    
-    with save_uploaded_file.lock:
-        # Monta estrutura de diretórios
-        user_dir = os.path.join(base_dir, str(user_id))
-        
-        if subfolder:
-            final_dir = os.path.join(user_dir, str(subfolder))
-        else:
-            final_dir = user_dir
-            
-        os.makedirs(final_dir, exist_ok=True)
+    if subfolder:
+        final_dir = os.path.join(user_dir, str(subfolder))
+    else:
+        final_dir = user_dir
         
-        # Nome único COM timestamp + contador
-        original_filename = secure_filename(file.filename)
-        unique_id = str(uuid.uuid4())[:8]
-        timestamp = int(time.time() * 1000)  # Milissegundos
+    os.makedirs(final_dir, exist_ok=True)
+    
+    # Nome único COM timestamp + contador (O_EXCL garante que ninguém mais pegou o mesmo nome)
+    original_filename = secure_filename(file.filename)
+    unique_id = str(uuid.uuid4())[:8]
+    timestamp = int(time.time() * 1000)  # Milissegundos
+    
+    counter = 0
+    while True:
+        suffix = f"_{counter}" if counter > 0 else ""
+        unique_filename = f"{unique_id}_{timestamp}{suffix}_{original_filename}"
+        full_path = os.path.join(final_dir, unique_filename)
         
-        counter = 0
-        while True:
-            suffix = f"_{counter}" if counter > 0 else ""
-            unique_filename = f"{unique_id}_{timestamp}{suffix}_{original_filename}"
-            full_path = os.path.join(final_dir, unique_filename)
-            
-            if not os.path.exists(full_path):
-                break
+        try:
+            fd = os.open(full_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+            break
+        except FileExistsError:
             counter += 1
-        
-        file.save(full_path)
-        
-        # Caminho relativo (para salvar no banco)
-        if subfolder:
-            relative_path = os.path.join(os.path.basename(base_dir), str(user_id), str(subfolder), unique_filename)
-        else:
-            relative_path = os.path.join(os.path.basename(base_dir), str(user_id), unique_filename)
-        
-        # Tamanho do arquivo
-        file_size = os.path.getsize(full_path)
-        
-        # MIME type
-        mime_type = detect_mime_type(original_filename, file.content_type)
-        
-        return {
-            'filepath': relative_path,
-            'filename': original_filename,
-            'mime_type': mime_type,
-            'size': file_size
-        }
\ No newline at end of file
+    
+    # Grava em blocos, calculando hash e tamanho no caminho
+    sha256 = hashlib.sha256()
+    file_size = 0
+    try:
+        with os.fdopen(fd, 'wb') as destino:
+            for pedaco in iter(lambda: file.stream.read(bloco), b''):
+                sha256.update(pedaco)
+                destino.write(pedaco)
+                file_size += len(pedaco)
+    except Exception:
+        os.remove(full_path)
+        raise
+    
+    # Caminho relativo (para salvar no banco)
+    if subfolder:
+        relative_path = os.path.join(os.path.basename(base_dir), str(user_id), str(subfolder), unique_filename)
+    else:
+        relative_path = os.path.join(os.path.basename(base_dir), str(user_id), unique_filename)
+    
+    # MIME type
+    mime_type = detect_mime_type(original_filename, file.content_type)
+    
+    return {
+        'filepath': relative_path,
+        'full_path': full_path,
+        'filename': original_filename,
+        'mime_type': mime_type,
+        'size': file_size,
+        'hash': sha256.hexdigest()
+    }
\ No newline at end of file
@@ -3,20 +3,38 @@ Sistema de Sessão Única para APBIA
 Impede que a mesma conta seja acessada simultaneamente de múltiplos dispositivos
 """
 
+import time
 import secrets
+from threading import Lock, Thread, Event
 from datetime import datetime, timedelta, timezone
 from functools import wraps
 from flask import session, redirect, url_for, flash, request
 from flask_login import current_user, logout_user
+from config import Config
 from utils.advanced_logger import logger
 from utils.decorators import require_valid_session #só por precaução
 
 class SessionManager:
     """Gerencia sessões únicas por usuário"""
     
-    def __init__(self, dao):
+    def __init__(self, dao, cache_ttl=None, flush_interval=None):
         self.dao = dao
         self.session_timeout = timedelta(hours=1)  # Timeout de 1 hora
+        
+        # Cache de validação: token -> {'user_id', 'last_activity', 'validado_em'}
+        # Evita o SELECT em usuarios a cada requisição; o TTL curto limita quanto tempo
+        # um login feito em outro processo demora para derrubar esta sessão
+        self.cache_ttl = cache_ttl if cache_ttl is not None else Config.SESSION_CACHE_TTL
+        self._cache = {}
+        self._tokens_por_usuario = {}   # user_id -> {tokens no cache}
+        self._cache_lock = Lock()
+        
+        # last_activity pendente de gravação: user_id -> datetime
+        # Um flusher em background grava no máximo uma vez a cada flush_interval por usuário
+        self.flush_interval = flush_interval or Config.SESSION_ACTIVITY_FLUSH_INTERVAL
+        self._atividade_pendente = {}
+        self._flusher = None
+        self._parar_flusher = Event()
     
     def generate_session_token(self):
         """Gera token único de sessão"""
@@ -39,6 +57,10 @@ class SessionManager:
             'last_activity': now.isoformat()
         }).eq('id', user_id).execute()
         
+        # Tokens antigos deste usuário deixam de valer na hora (sessão única)
+        self._esquecer_usuario(user_id)
+        self._guardar_no_cache(token, user_id, now)
+        
         # Armazena token na sessão Flask
         session['session_token'] = token
         session.permanent = True
@@ -64,6 +86,19 @@ class SessionManager:
     
         logger.debug(f"🔍 Validando sessão - User {user_id} | Token Flask: {current_token[:10]}...")
     
+        # Caminho rápido: token validado há pouco tempo neste processo
+        entry = self._buscar_no_cache(current_token, user_id)
+        if entry:
+            if datetime.now(timezone.utc) - entry['last_activity'] > self.session_timeout:
+                logger.warning(f"💤 SESSÃO EXPIRADA - User {user_id}: Inatividade > 1 hora")
+                self._remover_do_cache(current_token)
+                return False
+            
+            if update_activity:
+                self.update_activity(user_id)
+            logger.debug(f"✅ Sessão válida (cache) - User {user_id}")
+            return True
+    
         # Busca dados do banco
         result = self.dao.supabase.table('usuarios')\
             .select('session_token, session_created_at, last_activity')\
@@ -89,9 +124,16 @@ class SessionManager:
             return False
     
         # Verifica inatividade de 1 hora
+        last_activity_dt = None
         if last_activity:
             try:
                 last_activity_dt = datetime.fromisoformat(last_activity.replace('Z', '+00:00'))
+                
+                # Atividade ainda não gravada pelo flusher também conta
+                pendente = self._atividade_pendente.get(user_id)
+                if pendente and pendente > last_activity_dt:
+                    last_activity_dt = pendente
+                
                 now_utc = datetime.now(timezone.utc)
                 inactivity_duration = now_utc - last_activity_dt
             
@@ -103,6 +145,8 @@ class SessionManager:
             except Exception as e:
                 logger.error(f"❌ Erro ao verificar inatividade - User {user_id}: {e}")
     
+        self._guardar_no_cache(current_token, user_id, last_activity_dt or datetime.now(timezone.utc))
+    
         # Só atualiza se não for polling
         if update_activity:
             self.update_activity(user_id)
@@ -113,12 +157,116 @@ class SessionManager:
         return True
     
     def update_activity(self, user_id):
-        """Atualiza timestamp de última atividade"""
+        """
+        Registra a última atividade em memória
+        O flusher em background grava no banco (no máximo uma vez por flush_interval)
+        """
         now = datetime.now(timezone.utc)  # UTC timezone
-        self.dao.supabase.table('usuarios').update({
-            'last_activity': now.isoformat()
-        }).eq('id', user_id).execute()
-        logger.debug(f"🔄 Atividade atualizada - User {user_id}: {now.isoformat()}")
+        
+        with self._cache_lock:
+            self._atividade_pendente[user_id] = now
+            for token in self._tokens_por_usuario.get(user_id, ()):
+                self._cache[token]['last_activity'] = now
+        
+        self._iniciar_flusher()
+        logger.debug(f"🔄 Atividade registrada - User {user_id}: {now.isoformat()}")
+    
+    def flush_activity(self):
+        """Grava no banco o last_activity pendente de cada usuário e poda o cache de validação"""
+        with self._cache_lock:
+            pendentes = self._atividade_pendente
+            self._atividade_pendente = {}
+        
+        self._podar_cache()
+        
+        for user_id, quando in pendentes.items():
+            try:
+                self.dao.supabase.table('usuarios').update({
+                    'last_activity': quando.isoformat()
+                }).eq('id', user_id).execute()
+            except Exception as e:
+                logger.error(f"❌ Erro ao gravar atividade - User {user_id}: {e}")
+                # Tenta de novo no próximo ciclo (sem sobrescrever atividade mais nova)
+                with self._cache_lock:
+                    if user_id not in self._atividade_pendente:
+                        self._atividade_pendente[user_id] = quando
+        
+        if pendentes:
+            logger.debug(f"💾 Atividade gravada para {len(pendentes)} usuário(s)")
+    
+    def _iniciar_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._cache_lock:
+            if self._flusher is not None:
+                return
+            self._flusher = Thread(target=self._loop_flusher, name='apbia-session-flusher', daemon=True)
+            self._flusher.start()
+    
+    def _loop_flusher(self):
+        while not self._parar_flusher.wait(self.flush_interval):
+            self.flush_activity()
+    
+    # ------------------------------------------------------------------
+    # Cache de validação
+    # ------------------------------------------------------------------
+    
+    def _guardar_no_cache(self, token, user_id, last_activity):
+        with self._cache_lock:
+            anterior = self._cache.get(token)
+            if anterior and anterior['user_id'] != user_id:
+                self._desindexar(token, anterior['user_id'])
+            self._cache[token] = {
+                'user_id': user_id,
+                'last_activity': last_activity,
+                'validado_em': time.monotonic()
+            }
+            self._tokens_por_usuario.setdefault(user_id, set()).add(token)
+        self._iniciar_flusher()
+    
+    def _buscar_no_cache(self, token, user_id):
+        with self._cache_lock:
+            entry = self._cache.get(token)
+            if not entry:
+                return None
+            if entry['user_id'] != user_id or time.monotonic() - entry['validado_em'] > self.cache_ttl:
+                self._apagar(token)
+                return None
+            return entry
+    
+    def _remover_do_cache(self, token):
+        with self._cache_lock:
+            self._apagar(token)
+    
+    def _apagar(self, token):
+        """Tira o token do cache e do índice por usuário (chamar com _cache_lock)"""
+        entry = self._cache.pop(token, None)
+        if entry:
+            self._desindexar(token, entry['user_id'])
+    
+    def _desindexar(self, token, user_id):
+        tokens = self._tokens_por_usuario.get(user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_por_usuario[user_id]
+    
+    def _podar_cache(self):
+        """Remove tokens validados há mais que cache_ttl (sessões abandonadas nunca voltam a ser consultadas)"""
+        limite = time.monotonic() - self.cache_ttl
+        with self._cache_lock:
+            vencidos = [token for token, entry in self._cache.items() if entry['validado_em'] < limite]
+            for token in vencidos:
+                self._apagar(token)
+        if vencidos:
+            logger.debug(f"🧹 {len(vencidos)} sessão(ões) removida(s) do cache de validação")
+    
+    def _esquecer_usuario(self, user_id):
+        """Remove do cache todos os tokens do usuário e a atividade pendente"""
+        with self._cache_lock:
+            for token in list(self._tokens_por_usuario.get(user_id, ())):
+                self._apagar(token)
+            self._atividade_pendente.pop(user_id, None)
     
     def invalidate_session(self, user_id):
         """Invalida sessão de um usuário"""
@@ -128,6 +276,8 @@ class SessionManager:
             'session_created_at': None
         }).eq('id', user_id).execute()
         
+        self._esquecer_usuario(user_id)
+        
         if 'session_token' in session:
             session.pop('session_token')
         
@@ -140,7 +290,6 @@ def get_session_manager():
     """Retorna instância global do SessionManager"""
     global _session_manager
     if _session_manager is None:
-        from dao.dao import SupabaseDAO
-        dao = SupabaseDAO()
-        _session_manager = SessionManager(dao)
+        from dao.dao import get_dao
+        _session_manager = SessionManager(get_dao())
     return _session_manager
\ No newline at end of file